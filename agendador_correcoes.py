@@ -0,0 +1,553 @@
+"""
+Agendador Global de Correções
+Quebra todos os PDFs enviados (de um ou vários professores) em tarefas de página e as
+executa num único pool de processos, com limite de CPU e divisão justa entre professores
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import fitz
+
+from cache_leitura import CacheLeitura
+from corrigir_rapido import (DPI_CODIGOS, DPI_LEITURA, carregar_csv_alunos, contexto_processos, corrigir_pagina,
+                             corrigir_prova_montada, dados_cache, iniciar_processo_leitura, ler_pagina_pdf,
+                             parametros_leitura)
+from escritor_relatorios import EscritorRelatorios
+from fila_revisao import FilaRevisao
+from folhas_prova import MontadorProvas
+from leitor_gabarito import VERSAO_LEITOR, LeitorFinalV2
+from memoria_leitura import MEMORIA_MB, MonitorMemoria, workers_no_orcamento
+from perfil_execucao import PerfilExecucao
+from roteamento_gabaritos import RoteadorGabaritos, SeparadorGabaritos
+
+# Limite global de processos de leitura (padrão: número de CPUs)
+MAX_PROCESSOS = int(os.environ.get('GABARITO_MAX_PROCESSOS', 0)) or os.cpu_count() or 1
+
+# Lotes concluídos continuam consultáveis (progresso e logs) por um tempo, e no máximo
+# os MAX_LOTES_CONCLUIDOS mais recentes: um servidor ligado por semanas não os acumula
+RETENCAO_LOTES_HORAS = float(os.environ.get('GABARITO_RETENCAO_LOTES_HORAS', 24))
+MAX_LOTES_CONCLUIDOS = 200
+
+
+class AgendadorCorrecoes:
+    """
+    Uma thread despachante é dona de todo o estado: abre os PDFs, consulta o cache,
+    corrige as páginas lidas e atualiza o progresso. Só a leitura das bolhas e do QR
+    vai para o pool de processos, que nunca tem mais que max_processos páginas em voo,
+    não importa quantos envios cheguem.
+
+    Cada professor tem sua própria fila de páginas e as vagas do pool são distribuídas
+    em rodízio entre as filas, então um ZIP com 50 PDFs não segura a prova de 2 páginas
+    enviada logo depois por outro professor.
+
+    Em provas com várias folhas as páginas de um arquivo são lidas em paralelo, mas
+    chegam à correção na ordem do PDF, para as folhas de cada aluno serem juntadas.
+
+    Um lote pode misturar provas: os gabaritos do lote são carregados uma vez e cada
+    página vai para o seu (faixa de páginas, código da prova no QR ou gabarito padrão).
+
+    Com orçamento de memória (modo streaming), os processos cabem no orçamento, cada worker
+    libera o que guarda entre páginas quando passa da sua fatia e o pool é renovado se
+    isso não bastar.
+
+    Um lote enviado com perfil é medido (ver perfil_execucao) na thread despachante, só nos
+    eventos dele, e nos workers, página a página; as páginas são lidas de novo mesmo que
+    estejam no cache. O perfil é gravado ao lado dos relatórios quando o lote termina.
+    """
+
+    def __init__(self, max_processos: Optional[int] = None, usar_cache: bool = True,
+                 dpi_leitura: Optional[int] = None, dpi_codigos: Optional[int] = None,
+                 memoria_mb: Optional[int] = None):
+        """
+        Args:
+            max_processos: Máximo de páginas lidas ao mesmo tempo (padrão: GABARITO_MAX_PROCESSOS)
+            usar_cache: Usar o cache de leituras
+            dpi_leitura: Resolução da leitura das bolhas (padrão: GABARITO_DPI_LEITURA)
+            dpi_codigos: Resolução da leitura do QR/barcode (padrão: GABARITO_DPI_CODIGOS)
+            memoria_mb: Orçamento de memória em MB (padrão: GABARITO_MEMORIA_MB, 0 = sem orçamento)
+        """
+        self.max_processos = max_processos or MAX_PROCESSOS
+        self.memoria_mb = MEMORIA_MB if memoria_mb is None else memoria_mb
+        if self.memoria_mb:
+            self.max_processos = workers_no_orcamento(self.memoria_mb, self.max_processos)
+        self._memoria = MonitorMemoria(self.memoria_mb, self.max_processos)
+        self.usar_cache = usar_cache
+        self.dpi_leitura = dpi_leitura or DPI_LEITURA
+        self.dpi_codigos = dpi_codigos or DPI_CODIGOS
+
+        self._eventos = queue.Queue()
+        self._trava = threading.Lock()
+        self._thread = None
+
+        self._lotes = {}        # {lote_id: progresso público}
+        self._contextos = {}    # {lote_id: gabaritos, alunos, alternativas}
+        self._filas = {}        # {professor: deque de tarefas}, na ordem do rodízio
+        self._montagens = {}    # {(lote_id, indice): separador por gabarito e páginas lidas fora de ordem}
+        self._perfis = {}       # {lote_id: PerfilExecucao} dos lotes enviados com perfil
+        self._concluidos = {}   # {lote_id: instante do fim (monotonic)}, na ordem de conclusão
+        self._em_execucao = 0
+        self._geracao_pool = 0  # renovações do pool (leituras do pool antigo não o renovam de novo)
+
+    # ------------------------------------------------------------------
+    # API (chamada pelas threads do Flask)
+    # ------------------------------------------------------------------
+
+    def submeter(self, arquivos: List[str], caminho_gabarito: Optional[str], professor: str = 'anonimo',
+                 faixas: Optional[List] = None, por_codigo: bool = False, perfil: bool = False) -> str:
+        """
+        Agenda a correção de um ou mais PDFs
+
+        Args:
+            arquivos: Caminhos dos PDFs
+            caminho_gabarito: Gabarito oficial usado em todos os arquivos do lote (com faixas ou
+                por_codigo, só nas páginas que não caem em nenhuma regra; pode ser None)
+            professor: Quem enviou (unidade da divisão justa)
+            faixas: Gabarito por faixa de páginas, aplicado a cada arquivo
+                (ver roteamento_gabaritos.interpretar_faixas)
+            por_codigo: Escolher o gabarito de cada página pelo código da prova no QR
+            perfil: Medir a correção do lote (o resumo aparece em 'perfil' no progresso)
+
+        Returns:
+            lote_id
+        """
+        lote_id = str(uuid.uuid4())
+        lote = {
+            'id': lote_id,
+            'professor': professor,
+            'gabarito': str(caminho_gabarito) if caminho_gabarito else None,
+            'faixas': faixas,
+            'por_codigo': por_codigo,
+            'por_gabarito': {},
+            'status': 'processing',
+            'criado_em': datetime.now().isoformat(timespec='seconds'),
+            'arquivos': [
+                {'nome': os.path.basename(c), 'caminho': c, 'status': 'pendente',
+                 'paginas': 0, 'concluidas': 0, 'erros': 0, 'ignoradas': 0}
+                for c in arquivos
+            ],
+            'total_pages': 0,
+            'current_page': 0,
+            'ignoradas': 0,
+            'perfil': None,
+            'logs': []
+        }
+
+        with self._trava:
+            self._descartar_concluidos()
+            self._lotes[lote_id] = lote
+            if perfil:
+                self._perfis[lote_id] = PerfilExecucao()
+        self.iniciar()
+
+        self._eventos.put(('lote', lote_id))
+        return lote_id
+
+    def _descartar_concluidos(self):
+        """Esquece os lotes concluídos há mais de RETENCAO_LOTES_HORAS ou além dos MAX_LOTES_CONCLUIDOS"""
+        limite = time.monotonic() - RETENCAO_LOTES_HORAS * 3600
+        for lote_id, fim in list(self._concluidos.items()):
+            if fim > limite and len(self._concluidos) <= MAX_LOTES_CONCLUIDOS:
+                break
+            del self._concluidos[lote_id]
+            self._lotes.pop(lote_id, None)
+
+    def iniciar(self):
+        """
+        Inicia a thread despachante e o pool, com os workers já aquecidos (chamado pelo
+        primeiro envio ou, antes, na subida do servidor, para o primeiro envio não esperar)
+        """
+        with self._trava:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name='agendador-correcoes', daemon=True)
+                self._thread.start()
+
+    def progresso(self, lote_id: str) -> Optional[Dict]:
+        """Cópia do progresso de um lote (status, páginas, arquivos e logs) ou None"""
+        with self._trava:
+            lote = self._lotes.get(lote_id)
+            if lote is None:
+                return None
+            copia = dict(lote)
+            copia['arquivos'] = [dict(a) for a in lote['arquivos']]
+            copia['por_gabarito'] = dict(lote['por_gabarito'])
+            copia['logs'] = list(lote['logs'])
+            return copia
+
+    def estado(self) -> Dict:
+        """Carga atual do agendador: páginas em voo, páginas na fila por professor, lotes ativos"""
+        with self._trava:
+            return {
+                'max_processos': self.max_processos,
+                'em_execucao': self._em_execucao,
+                'na_fila': {professor: len(fila) for professor, fila in self._filas.items()},
+                'memoria': self._memoria.resumo(),
+                'lotes_ativos': [
+                    {'id': l['id'], 'professor': l['professor'],
+                     'current_page': l['current_page'], 'total_pages': l['total_pages']}
+                    for l in self._lotes.values() if l['status'] == 'processing'
+                ]
+            }
+
+    def encerrar(self):
+        """Espera as páginas em voo, grava os relatórios pendentes e encerra o pool"""
+        with self._trava:
+            thread = self._thread
+        if thread is None:
+            return
+        self._eventos.put(('fim', None))
+        thread.join()
+        with self._trava:
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    # Thread despachante
+    # ------------------------------------------------------------------
+
+    def _executar(self):
+        self._cache = CacheLeitura() if self.usar_cache else None
+        self._fila_revisao = FilaRevisao()
+        # forkserver (ou spawn): o servidor web tem várias threads, e fork com threads ativas
+        # é inseguro. Os workers nascem com as bibliotecas nativas carregadas e são criados
+        # todos já na partida, cada um com leitor, detector de QR e CLAHE prontos.
+        self._executor = self._novo_pool()
+        self._escritor = EscritorRelatorios()
+        self._escritor.iniciar()
+
+        try:
+            while True:
+                tipo, dados = self._eventos.get()
+                if tipo == 'fim':
+                    break
+                elif tipo == 'lote':
+                    with self._medir(dados):
+                        self._expandir(dados)
+                elif tipo == 'lida':
+                    with self._medir(dados[0][0]):
+                        self._concluir_leitura(*dados)
+                elif tipo == 'gravada':
+                    self._marcar_pagina(*dados)
+                self._despachar()
+
+            # Terminar o que já está em voo antes de fechar
+            while self._em_execucao:
+                tipo, dados = self._eventos.get()
+                if tipo == 'lida':
+                    with self._medir(dados[0][0]):
+                        self._concluir_leitura(*dados)
+                elif tipo == 'gravada':
+                    self._marcar_pagina(*dados)
+        finally:
+            self._executor.shutdown()
+            self._escritor.fechar()
+            while not self._eventos.empty():
+                tipo, dados = self._eventos.get_nowait()
+                if tipo == 'gravada':
+                    self._marcar_pagina(*dados)
+
+    def _novo_pool(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.max_processos, mp_context=contexto_processos(),
+                                       initializer=iniciar_processo_leitura)
+        for _ in range(self.max_processos):
+            executor.submit(os.getpid)
+        return executor
+
+    def _renovar_pool(self, memoria: Dict):
+        """Troca o pool por um novo: as páginas em voo terminam no antigo"""
+        print(f"💾 Worker {memoria['pid']} acima do limite de memória ({memoria['rss_mb']:.0f} MB): renovando o pool")
+        antigo, self._executor = self._executor, self._novo_pool()
+        antigo.shutdown(wait=False)
+        self._geracao_pool += 1
+        with self._trava:
+            self._memoria.renovacoes += 1
+
+    def _medir(self, lote_id: str):
+        """Trecho da thread despachante que trabalha para o lote (medido se o lote tem perfil)"""
+        perfil = self._perfis.get(lote_id)
+        return perfil.medir() if perfil else nullcontext()
+
+    def _log(self, lote_id: str, mensagem: str):
+        print(mensagem, flush=True)
+        with self._trava:
+            self._lotes[lote_id]['logs'].append(mensagem)
+
+    def _expandir(self, lote_id: str):
+        """Carrega os gabaritos e os alunos do lote e quebra cada PDF em tarefas de página"""
+        lote = self._lotes[lote_id]
+        log = lambda mensagem: self._log(lote_id, mensagem)
+
+        try:
+            roteador = RoteadorGabaritos(lote['gabarito'], lote['faixas'], lote['por_codigo'], log=log)
+        except ValueError as e:
+            self._log(lote_id, f"✗ {e}")
+            with self._trava:
+                for arquivo in lote['arquivos']:
+                    arquivo['status'] = 'failed'
+                lote['status'] = 'failed'
+            return
+        if len(roteador.gabaritos) > 1:
+            self._log(lote_id, f"📑 {len(roteador.gabaritos)} gabaritos carregados")
+
+        self._contextos[lote_id] = {
+            'roteador': roteador,
+            'alunos': carregar_csv_alunos(),
+            'alternativas': LeitorFinalV2().alternativas,
+            # Folhas de um aluno (e folhas sem código, que seguem o gabarito da anterior)
+            # precisam chegar na ordem do PDF
+            'em_ordem': roteador.varias_folhas
+        }
+
+        for indice, arquivo in enumerate(lote['arquivos']):
+            try:
+                tarefas = self._tarefas_arquivo(lote_id, indice)
+            except Exception as e:
+                self._log(lote_id, f"✗ Erro ao abrir {arquivo['nome']}: {e}")
+                with self._trava:
+                    arquivo['status'] = 'failed'
+                self._verificar_lote(lote_id)
+                continue
+
+            with self._trava:
+                if arquivo['paginas'] == 0:
+                    arquivo['status'] = 'completed'
+                elif tarefas:
+                    self._filas.setdefault(lote['professor'], deque()).extend(tarefas)
+            # As páginas deste arquivo já podem ir para o pool enquanto o próximo é aberto
+            self._despachar()
+
+        self._verificar_lote(lote_id)
+
+    def _tarefas_arquivo(self, lote_id: str, indice: int) -> List:
+        """Abre o PDF, conta as páginas e corrige direto as que já estão no cache"""
+        lote = self._lotes[lote_id]
+        contexto = self._contextos[lote_id]
+        arquivo = lote['arquivos'][indice]
+
+        pdf = fitz.open(arquivo['caminho'])
+        try:
+            num_paginas = len(pdf)
+            with self._trava:
+                arquivo['paginas'] = num_paginas
+                arquivo['status'] = 'processing'
+                lote['total_pages'] += num_paginas
+            self._log(lote_id, f"📄 {arquivo['nome']}: {num_paginas} páginas detectadas")
+            if num_paginas:
+                self._montagens[(lote_id, indice)] = {
+                    'separador': SeparadorGabaritos(contexto['roteador']), 'em_ordem': contexto['em_ordem'],
+                    'proxima': 0, 'prontas': {}, 'entregues': 0
+                }
+
+            tarefas = []
+            for page_num in range(num_paginas):
+                hash_pagina = CacheLeitura.hash_pagina_pdf(pdf, pdf[page_num])
+                chave_cache = None
+                if self._cache:
+                    parametros = parametros_leitura(alternativas=contexto['alternativas'], dpi_leitura=self.dpi_leitura,
+                                                    dpi_codigos=self.dpi_codigos,
+                                                    **contexto['roteador'].opcoes_leitura(page_num))
+                    chave_cache = CacheLeitura.chave(hash_pagina, VERSAO_LEITOR, parametros)
+                    # Com perfil, a página é lida de novo: o que interessa é medir a leitura
+                    leitura = self._cache.obter(chave_cache) if lote_id not in self._perfis else None
+                    if leitura is not None:
+                        self._entregar(lote_id, indice, page_num, hash_pagina, leitura)
+                        continue
+                tarefas.append((lote_id, indice, page_num, hash_pagina, chave_cache))
+        finally:
+            pdf.close()
+
+        return tarefas
+
+    def _despachar(self):
+        """Ocupa as vagas livres do pool, uma página de cada professor por vez"""
+        while True:
+            with self._trava:
+                if self._em_execucao >= self.max_processos or not self._filas:
+                    return
+                professor = next(iter(self._filas))
+                fila = self._filas.pop(professor)
+                tarefa = fila.popleft()
+                if fila:
+                    # Volta para o fim do rodízio
+                    self._filas[professor] = fila
+                self._em_execucao += 1
+
+            lote_id, indice, page_num, _, _ = tarefa
+            contexto = self._contextos[lote_id]
+            futuro = self._executor.submit(
+                ler_pagina_pdf, self._lotes[lote_id]['arquivos'][indice]['caminho'], page_num,
+                alternativas=contexto['alternativas'], dpi_leitura=self.dpi_leitura, dpi_codigos=self.dpi_codigos,
+                limite_mb=self._memoria.limite_mb, perfil=lote_id in self._perfis,
+                **contexto['roteador'].opcoes_leitura(page_num)
+            )
+            futuro.add_done_callback(lambda f, tarefa=tarefa, geracao=self._geracao_pool:
+                                     self._eventos.put(('lida', (tarefa, f, geracao))))
+
+    def _concluir_leitura(self, tarefa, futuro, geracao):
+        """Leitura de uma página voltou do pool: salva no cache e corrige"""
+        lote_id, indice, page_num, hash_pagina, chave_cache = tarefa
+        with self._trava:
+            self._em_execucao -= 1
+
+        try:
+            leitura = futuro.result()
+        except Exception as e:
+            self._log(lote_id, f"✗ Erro ao ler página {page_num + 1} de "
+                               f"{self._lotes[lote_id]['arquivos'][indice]['nome']}: {e}")
+            self._marcar_pagina(lote_id, indice, erro=True)
+            self._entregar(lote_id, indice, page_num, hash_pagina, None)
+            return
+
+        memoria = leitura.pop('memoria', None)
+        perfil = self._perfis.get(lote_id)
+        if perfil:
+            perfil.somar(leitura.pop('perfil', None))
+            perfil.registrar_leitura(leitura)
+        with self._trava:
+            acima = self._memoria.registrar(memoria)
+        if acima and geracao == self._geracao_pool:
+            self._renovar_pool(memoria)
+
+        if self._cache:
+            self._cache.salvar(chave_cache, dados_cache(leitura))
+        self._entregar(lote_id, indice, page_num, hash_pagina, leitura)
+
+    def _entregar(self, lote_id: str, indice: int, page_num: int, hash_pagina: str, leitura: Optional[Dict]):
+        """
+        Encaminha uma página lida para a correção (leitura None: página com erro, já contada)
+
+        Com várias folhas por aluno, segura as páginas que chegam fora de ordem. No fim do
+        arquivo, corrige as provas que ficaram sem alguma folha.
+        """
+        montagem = self._montagens[(lote_id, indice)]
+        separador = montagem['separador']
+        montagem['entregues'] += 1
+
+        if montagem['em_ordem']:
+            montagem['prontas'][page_num] = (hash_pagina, leitura)
+            while montagem['proxima'] in montagem['prontas']:
+                proxima = montagem['proxima']
+                hash_proxima, leitura_proxima = montagem['prontas'].pop(proxima)
+                montagem['proxima'] += 1
+                if leitura_proxima is not None:
+                    self._corrigir(lote_id, indice, proxima, hash_proxima, leitura_proxima, separador)
+        elif leitura is not None:
+            self._corrigir(lote_id, indice, page_num, hash_pagina, leitura, separador)
+
+        if montagem['entregues'] == self._lotes[lote_id]['arquivos'][indice]['paginas']:
+            del self._montagens[(lote_id, indice)]
+            for caminho, montador, prova in separador.pendentes():
+                self._corrigir_incompleta(lote_id, indice, caminho, montador, prova)
+
+    def _corrigir_incompleta(self, lote_id: str, indice: int, caminho: str, montador: MontadorProvas, prova: Dict):
+        """Corrige uma prova que chegou ao fim do arquivo sem todas as folhas"""
+        lote = self._lotes[lote_id]
+        contexto = self._contextos[lote_id]
+        arquivo = lote['arquivos'][indice]
+        try:
+            corrigir_prova_montada(prova, montador, arquivo['nome'].replace('.pdf', ''),
+                                   contexto['roteador'].corretor(caminho), contexto['alunos'], caminho,
+                                   self._escritor, self._fila_revisao,
+                                   log=lambda mensagem: self._log(lote_id, mensagem))
+        except Exception as e:
+            self._log(lote_id, f"✗ Erro ao corrigir prova incompleta de {arquivo['nome']}: {e}")
+            for funcao in prova['depois']:
+                funcao(e)
+
+    def _corrigir(self, lote_id: str, indice: int, page_num: int, hash_pagina: str, leitura: Dict,
+                  separador: SeparadorGabaritos):
+        """
+        Corrige uma página lida; a página conta como concluída quando o relatório estiver em
+        disco, ou com erro se a gravação falhar (o escritor segue gravando os lotes seguintes)
+        """
+        lote = self._lotes[lote_id]
+        contexto = self._contextos[lote_id]
+        arquivo = lote['arquivos'][indice]
+        nome_pdf = arquivo['nome'].replace('.pdf', '')
+        log = lambda mensagem: self._log(lote_id, mensagem)
+
+        self._log(lote_id, f"PROCESSANDO PÁGINA {page_num + 1}/{arquivo['paginas']} ({arquivo['nome']})")
+        if 'recortes' not in leitura:
+            self._log(lote_id, "✓ Página já lida anteriormente (cache)")
+
+        caminho, montador = None, None
+        if leitura.get('tipo_pagina', 'gabarito') == 'gabarito':
+            caminho, montador = separador.encaminhar(page_num, leitura, log)
+            if caminho is None:
+                self._marcar_pagina(lote_id, indice, erro=True)
+                return
+            with self._trava:
+                nome_gabarito = os.path.basename(caminho)
+                lote['por_gabarito'][nome_gabarito] = lote['por_gabarito'].get(nome_gabarito, 0) + 1
+
+        try:
+            corrigir_pagina(leitura, page_num, nome_pdf, hash_pagina,
+                            contexto['roteador'].corretor(caminho) if caminho else None, contexto['alunos'],
+                            caminho, self._escritor, self._fila_revisao, log=log,
+                            depois=lambda erro=None: self._eventos.put(('gravada', (lote_id, indice, erro is not None))),
+                            montador=montador)
+        except Exception as e:
+            self._log(lote_id, f"✗ Erro ao corrigir página {page_num + 1} de {arquivo['nome']}: {e}")
+            self._marcar_pagina(lote_id, indice, erro=True)
+            return
+
+        if leitura.get('tipo_pagina', 'gabarito') != 'gabarito':
+            # Pulada pela triagem: aparece à parte no progresso, não como página com erro
+            with self._trava:
+                arquivo['ignoradas'] += 1
+                lote['ignoradas'] += 1
+
+    def _marcar_pagina(self, lote_id: str, indice: int, erro: bool = False):
+        """Conta uma página como concluída (ou com erro) e atualiza os status"""
+        lote = self._lotes[lote_id]
+        arquivo = lote['arquivos'][indice]
+        with self._trava:
+            arquivo['concluidas'] += 1
+            arquivo['erros'] += erro
+            lote['current_page'] += 1
+            if arquivo['concluidas'] == arquivo['paginas']:
+                arquivo['status'] = 'failed' if arquivo['erros'] == arquivo['paginas'] else 'completed'
+        self._verificar_lote(lote_id)
+
+    def _verificar_lote(self, lote_id: str):
+        """Fecha o lote quando todos os arquivos terminaram"""
+        lote = self._lotes[lote_id]
+        with self._trava:
+            if lote['status'] != 'processing':
+                return
+            if any(a['status'] in ('pendente', 'processing') for a in lote['arquivos']):
+                return
+            falhas = sum(a['status'] == 'failed' for a in lote['arquivos'])
+            lote['status'] = 'failed' if falhas == len(lote['arquivos']) else 'completed'
+
+        self._contextos.pop(lote_id, None)
+        self._gravar_perfil(lote_id)
+        self._log(lote_id, f"✅ CONCLUÍDO! {lote['current_page']} páginas processadas "
+                           f"({len(lote['arquivos']) - falhas}/{len(lote['arquivos'])} arquivo(s))")
+        with self._trava:
+            self._concluidos[lote_id] = time.monotonic()
+
+    def _gravar_perfil(self, lote_id: str):
+        """Grava o perfil de um lote que terminou (se ele foi enviado com perfil)"""
+        perfil = self._perfis.pop(lote_id, None)
+        if perfil is None:
+            return
+        try:
+            resumo = perfil.gravar(lote_id)
+        except Exception as e:
+            self._log(lote_id, f"⚠ Erro ao gravar o perfil: {e}")
+            return
+        with self._trava:
+            self._lotes[lote_id]['perfil'] = resumo
+        contadores = ', '.join(f"{etapa}={n}" for etapa, n in resumo['contadores'].items())
+        criados = sum(c['criados'] for c in resumo['recursos_opencv'].values())
+        reusos = sum(c['reusos'] for c in resumo['recursos_opencv'].values())
+        self._log(lote_id, f"⚙ Perfil gravado: {resumo['arquivos']['prof']} ({contadores}; "
+                           f"recursos do OpenCV: {criados} criados, {reusos} reusos)")
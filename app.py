@@ -6,24 +6,31 @@ Sistema completo de upload, correção e visualização de relatórios
 
 from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 from werkzeug.utils import secure_filename
+import atexit
 import json
 import os
 from pathlib import Path
 from datetime import datetime
-import subprocess
 import sys
-from gerador_gabarito import GeradorGabarito
-# from gerar_gabaritos_personalizados import ler_csv_alunos, listar_turmas, gerar_gabaritos_turma
+import threading
+import time
 import csv
 import zipfile
 import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from urllib.parse import unquote
 
+# openpyxl (exportação para Excel), reportlab/qrcode (geração dos PDFs, via gerador_gabarito) e
+# OpenCV/PyMuPDF (agendador, fila de revisão e roteamento de gabaritos) são importados só onde
+# são usados: o servidor sobe mais rápido e fica menor
+
 # Configuração
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max
+app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max por requisição
+app.config['MAX_CHUNKED_UPLOAD_SIZE'] = 2 * 1024 * 1024 * 1024  # 2GB max no upload em partes
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024  # Tamanho sugerido de cada parte
+app.config['UPLOAD_PARCIAL_EXPIRA_HORAS'] = 24  # Uploads em partes parados há mais tempo são descartados
+app.config['MAX_ZIP_EXTRACTED_SIZE'] = 2 * 1024 * 1024 * 1024  # 2GB max descompactados por ZIP
+app.config['MAX_ARQUIVOS_LOTE'] = 500  # Máximo de PDFs por envio em lote
 app.config['UPLOAD_FOLDER'] = 'pdfs_para_corrigir'
 app.config['REPORTS_FOLDER'] = 'relatorios_correcao'
 app.config['GABARITOS_FOLDER'] = 'gabaritos'
@@ -38,14 +45,47 @@ Path(app.config['GABARITOS_FOLDER']).mkdir(exist_ok=True)
 Path(app.config['GABARITOS_PDF_FOLDER']).mkdir(exist_ok=True)
 Path(app.config['CSV_UPLOAD_FOLDER']).mkdir(exist_ok=True)
 Path(app.config['CSV_ALUNOS_FOLDER']).mkdir(exist_ok=True)
+Path(app.config['UPLOAD_FOLDER'], '.parciais').mkdir(exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'pdf'}
 ALLOWED_CSV_EXTENSIONS = {'csv'}
 GABARITO_OFICIAL = 'gabarito_oficial.json'
 
-# Armazenar progresso de correções em andamento
+# Todas as correções (envios avulsos e em lote) passam pelo mesmo agendador,
+# que limita a carga total da máquina e divide as vagas entre os professores;
+# criado no primeiro uso (obter_agendador)
+_agendador = None
+_fila_revisao = None
+trava_servicos = threading.Lock()
+
+# Job de envio avulso -> lote do agendador
 correction_progress = {}
 
+# Uploads em partes ainda não concluídos {upload_id: {...}}; o estado de cada um também fica
+# em .parciais/<upload_id>.json, ao lado do .part, para retomar depois de reiniciar o servidor
+uploads_em_andamento = {}
+trava_uploads = threading.Lock()
+travas_por_upload = {}  # {upload_id: Lock}: uma parte (ou a conclusão) de cada upload por vez
+
+def obter_agendador():
+    """Agendador de correções, criado (e registrado para encerrar na saída) no primeiro uso"""
+    global _agendador
+    with trava_servicos:
+        if _agendador is None:
+            from agendador_correcoes import AgendadorCorrecoes
+            _agendador = AgendadorCorrecoes()
+            atexit.register(_agendador.encerrar)
+        return _agendador
+
+def obter_fila_revisao():
+    """Questões e páginas de baixa confiança aguardando conferência"""
+    global _fila_revisao
+    with trava_servicos:
+        if _fila_revisao is None:
+            from fila_revisao import FilaRevisao
+            _fila_revisao = FilaRevisao()
+        return _fila_revisao
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -106,15 +146,10 @@ def upload_file():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Apenas arquivos PDF são permitidos'}), 400
 
-    # Obter gabarito selecionado
-    gabarito_nome = request.form.get('gabarito', '').strip()
-    if not gabarito_nome:
-        return jsonify({'error': 'Selecione um gabarito'}), 400
-
-    # Verificar se o gabarito existe
-    gabarito_path = Path(app.config['GABARITOS_FOLDER']) / f"{gabarito_nome}.json"
-    if not gabarito_path.exists():
-        return jsonify({'error': f'Gabarito "{gabarito_nome}" não encontrado'}), 404
+    # Obter gabarito(s) selecionado(s)
+    gabaritos, erro = gabaritos_do_envio(request.form)
+    if erro:
+        return erro
 
     # Salvar arquivo
     filename = secure_filename(file.filename)
@@ -123,59 +158,7 @@ def upload_file():
 
     # Corrigir PDF com o gabarito especificado
     try:
-        # Usar o python3 do venv atual
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        venv_python = os.path.join(base_dir, 'venv', 'bin', 'python3')
-        corrigir_script = os.path.join(base_dir, 'corrigir_rapido.py')
-
-        # Executar com output em tempo real
-        import threading
-        import queue
-        import uuid
-
-        job_id = str(uuid.uuid4())
-        correction_progress[job_id] = {
-            'status': 'processing',
-            'logs': [],
-            'current_page': 0,
-            'total_pages': 0
-        }
-
-        def run_correction():
-            process = subprocess.Popen(
-                [venv_python, corrigir_script, filepath, str(gabarito_path)],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
-            )
-
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    log_line = line.strip()
-                    correction_progress[job_id]['logs'].append(log_line)
-                    print(log_line, flush=True)  # Log no servidor também
-
-                    # Extrair informações do log
-                    if 'páginas detectadas' in log_line:
-                        import re
-                        match = re.search(r'(\d+) páginas', log_line)
-                        if match:
-                            correction_progress[job_id]['total_pages'] = int(match.group(1))
-                    elif 'PROCESSANDO PÁGINA' in log_line:
-                        import re
-                        match = re.search(r'PÁGINA (\d+)/(\d+)', log_line)
-                        if match:
-                            correction_progress[job_id]['current_page'] = int(match.group(1))
-                            correction_progress[job_id]['total_pages'] = int(match.group(2))
-
-            return_code = process.wait()
-            correction_progress[job_id]['status'] = 'completed' if return_code == 0 else 'failed'
-            correction_progress[job_id]['return_code'] = return_code
-
-        # Executar em thread separada
-        correction_thread = threading.Thread(target=run_correction)
-        correction_thread.start()
+        job_id = iniciar_correcao(filepath, gabaritos, identificar_professor(), perfil_do_envio(request.form))
 
         # Retornar imediatamente com job_id
         return jsonify({
@@ -187,21 +170,422 @@ def upload_file():
     except Exception as e:
         return jsonify({'error': f'Erro: {str(e)}'}), 500
 
+def identificar_professor():
+    """Quem está enviando: campo 'professor' do formulário ou, na falta dele, o IP"""
+    professor = (request.form.get('professor') or request.headers.get('X-Professor') or '').strip()
+    return professor or request.remote_addr or 'anonimo'
+
+def perfil_do_envio(dados):
+    """Se o envio pediu o perfil de execução (campo 'profile': 1, true, sim)"""
+    return str(dados.get('profile') or '').strip().lower() in ('1', 'true', 'sim', 'on')
+
+def gabaritos_do_envio(dados):
+    """
+    Gabarito(s) de um envio, dos campos 'gabarito' e 'faixas'
+
+    'gabarito' é o nome de um gabarito salvo, ou 'auto' para corrigir cada folha pelo
+    gabarito com o código da prova lido no QR. 'faixas' (opcional) atribui gabaritos a
+    faixas de páginas de cada PDF, ex: '1-30=matematica,31-60=portugues'; o gabarito
+    nomeado fica para as páginas fora das faixas.
+
+    Returns:
+        ({'caminho_gabarito', 'faixas', 'por_codigo'}, None) ou (None, resposta de erro)
+    """
+    gabarito_nome = (dados.get('gabarito') or '').strip()
+    faixas_texto = (dados.get('faixas') or '').strip()
+    if not gabarito_nome and not faixas_texto:
+        return None, (jsonify({'error': 'Selecione um gabarito'}), 400)
+
+    def caminho_gabarito(nome):
+        gabarito_path = Path(app.config['GABARITOS_FOLDER']) / f"{nome}.json"
+        if not gabarito_path.exists():
+            raise FileNotFoundError(nome)
+        return str(gabarito_path)
+
+    from roteamento_gabaritos import interpretar_faixas
+    por_codigo = gabarito_nome.lower() == 'auto'
+    try:
+        faixas = interpretar_faixas(faixas_texto, caminho_gabarito) if faixas_texto else None
+        gabarito_path = caminho_gabarito(gabarito_nome) if gabarito_nome and not por_codigo else None
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    except FileNotFoundError as e:
+        return None, (jsonify({'error': f'Gabarito "{e}" não encontrado'}), 404)
+
+    return {'caminho_gabarito': gabarito_path, 'faixas': faixas, 'por_codigo': por_codigo}, None
+
+def iniciar_correcao(filepath, gabaritos, professor='anonimo', perfil=False):
+    """
+    Agenda a correção de um PDF e retorna o job_id (gabaritos: ver gabaritos_do_envio;
+    perfil: medir a correção, ver /api/perfil/<job_id>)
+    """
+    import uuid
+
+    job_id = str(uuid.uuid4())
+    correction_progress[job_id] = obter_agendador().submeter([filepath], professor=professor, perfil=perfil, **gabaritos)
+    return job_id
+
+def extrair_pdfs_zip(arquivo, pasta_destino, nomes_usados):
+    """
+    Extrai só os PDFs de um ZIP enviado, achatando as pastas
+
+    Os nomes passam por secure_filename (nada sai de pasta_destino) e o total
+    descompactado é limitado, contando os bytes realmente lidos e não o tamanho
+    declarado no ZIP.
+
+    Returns:
+        Lista com os caminhos dos PDFs extraídos
+    """
+    limite = app.config['MAX_ZIP_EXTRACTED_SIZE']
+    total = 0
+    caminhos = []
+
+    with zipfile.ZipFile(arquivo) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not allowed_file(info.filename):
+                continue
+
+            nome = nome_unico(secure_filename(os.path.basename(info.filename)), nomes_usados)
+            if not nome:
+                continue
+
+            caminho = os.path.join(pasta_destino, nome)
+            with zf.open(info) as origem, open(caminho, 'wb') as destino:
+                while True:
+                    bloco = origem.read(1024 * 1024)
+                    if not bloco:
+                        break
+                    total += len(bloco)
+                    if total > limite:
+                        destino.close()
+                        os.remove(caminho)
+                        raise ValueError('Conteúdo do ZIP maior que o limite permitido')
+                    destino.write(bloco)
+            caminhos.append(caminho)
+
+    return caminhos
+
+def nome_unico(nome, nomes_usados):
+    """Evita que dois arquivos do mesmo lote (ex: pastas diferentes do ZIP) se sobrescrevam"""
+    if not nome:
+        return None
+    base, extensao = os.path.splitext(nome)
+    candidato, n = nome, 2
+    while candidato.lower() in nomes_usados:
+        candidato = f"{base}_{n}{extensao}"
+        n += 1
+    nomes_usados.add(candidato.lower())
+    return candidato
+
+def pasta_parciais():
+    return Path(app.config['UPLOAD_FOLDER'], '.parciais')
+
+def salvar_estado_upload(upload_id, upload):
+    """Grava o estado do upload ao lado do .part (os bytes recebidos são o tamanho do .part)"""
+    estado = {chave: valor for chave, valor in upload.items() if chave != 'recebido'}
+    caminho = pasta_parciais() / f'{upload_id}.json'
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False)
+
+def trava_do_upload(upload_id):
+    with trava_uploads:
+        return travas_por_upload.setdefault(upload_id, threading.Lock())
+
+def remover_upload_parcial(upload_id):
+    uploads_em_andamento.pop(upload_id, None)
+    travas_por_upload.pop(upload_id, None)
+    for extensao in ('.part', '.json'):
+        (pasta_parciais() / f'{upload_id}{extensao}').unlink(missing_ok=True)
+
+def carregar_uploads_parciais():
+    """
+    Refaz a lista de uploads em partes a partir de .parciais (na subida do servidor) e
+    descarta os parados há mais de UPLOAD_PARCIAL_EXPIRA_HORAS e os .part sem estado
+    """
+    limite = time.time() - app.config['UPLOAD_PARCIAL_EXPIRA_HORAS'] * 3600
+    for parcial in pasta_parciais().glob('*.part'):
+        upload_id = parcial.stem
+        try:
+            with open(parcial.with_suffix('.json'), 'r', encoding='utf-8') as f:
+                upload = json.load(f)
+        except (OSError, ValueError):
+            upload = None
+        if upload is None or parcial.stat().st_mtime < limite:
+            remover_upload_parcial(upload_id)
+            print(f"🗑 Upload parcial descartado: {upload_id}")
+            continue
+        upload['recebido'] = parcial.stat().st_size
+        uploads_em_andamento[upload_id] = upload
+
+    # Estados sem .part (upload concluído no meio da gravação)
+    for estado in pasta_parciais().glob('*.json'):
+        if not estado.with_suffix('.part').exists():
+            estado.unlink(missing_ok=True)
+
+def limpar_uploads_expirados():
+    """Descarta os uploads em partes parados há mais de UPLOAD_PARCIAL_EXPIRA_HORAS"""
+    limite = time.time() - app.config['UPLOAD_PARCIAL_EXPIRA_HORAS'] * 3600
+    for upload_id, upload in list(uploads_em_andamento.items()):
+        try:
+            parado = os.path.getmtime(upload['parcial']) < limite
+        except OSError:
+            parado = True
+        if parado:
+            remover_upload_parcial(upload_id)
+
+@app.route('/api/upload/lote', methods=['POST'])
+def upload_lote():
+    """Recebe vários PDFs e/ou ZIPs de PDFs numa requisição e agenda todos como um lote"""
+    arquivos = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not arquivos:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+
+    gabaritos, erro = gabaritos_do_envio(request.form)
+    if erro:
+        return erro
+
+    caminhos = []
+    ignorados = []
+    nomes_usados = set()
+    try:
+        for file in arquivos:
+            if file.filename.lower().endswith('.zip'):
+                caminhos += extrair_pdfs_zip(file.stream, app.config['UPLOAD_FOLDER'], nomes_usados)
+            elif allowed_file(file.filename):
+                filename = nome_unico(secure_filename(file.filename), nomes_usados)
+                if not filename:
+                    ignorados.append(file.filename)
+                    continue
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                file.save(filepath)
+                caminhos.append(filepath)
+            else:
+                ignorados.append(file.filename)
+
+            if len(caminhos) > app.config['MAX_ARQUIVOS_LOTE']:
+                raise ValueError(f"Máximo de {app.config['MAX_ARQUIVOS_LOTE']} PDFs por lote")
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'ZIP inválido'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413
+
+    if not caminhos:
+        return jsonify({'error': 'Nenhum PDF encontrado no envio'}), 400
+
+    lote_id = obter_agendador().submeter(caminhos, professor=identificar_professor(), perfil=perfil_do_envio(request.form),
+                                 **gabaritos)
+    return jsonify({
+        'success': True,
+        'lote_id': lote_id,
+        'arquivos': [os.path.basename(c) for c in caminhos],
+        'ignorados': ignorados,
+        'message': f'{len(caminhos)} PDF(s) na fila de correção'
+    })
+
+@app.route('/api/lote/<lote_id>')
+def get_lote_progress(lote_id):
+    """Progresso agregado de um lote: páginas, status de cada arquivo e logs"""
+    progresso = obter_agendador().progresso(lote_id)
+    if progresso is None:
+        return jsonify({'error': 'Lote não encontrado'}), 404
+
+    logs = progresso.pop('logs')
+    progresso.pop('gabarito', None)
+    progresso.pop('faixas', None)
+    for arquivo in progresso['arquivos']:
+        arquivo.pop('caminho', None)
+    progresso['logs'] = logs[-10:]
+    return jsonify(progresso)
+
+@app.route('/api/agendador')
+def get_agendador():
+    """Carga atual do agendador (páginas em execução e na fila de cada professor)"""
+    return jsonify(obter_agendador().estado())
+
+# Upload em partes (arquivos grandes / retomáveis)
+@app.route('/api/upload/iniciar', methods=['POST'])
+def iniciar_upload():
+    """Registra um upload em partes e retorna o upload_id"""
+    import uuid
+
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'Dados inválidos'}), 400
+
+    nome = data.get('nome', '')
+    try:
+        tamanho = int(data.get('tamanho'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Tamanho do arquivo ausente ou inválido'}), 400
+
+    if not nome or not allowed_file(nome):
+        return jsonify({'error': 'Apenas arquivos PDF são permitidos'}), 400
+
+    if tamanho <= 0:
+        return jsonify({'error': 'Arquivo vazio'}), 400
+
+    if tamanho > app.config['MAX_CHUNKED_UPLOAD_SIZE']:
+        return jsonify({'error': 'Arquivo maior que o limite permitido'}), 413
+
+    gabaritos, erro = gabaritos_do_envio(data)
+    if erro:
+        return erro
+
+    limpar_uploads_expirados()
+
+    upload_id = str(uuid.uuid4())
+    parcial = pasta_parciais() / f'{upload_id}.part'
+    parcial.touch()
+
+    upload = {
+        'nome': secure_filename(nome),
+        'tamanho': tamanho,
+        'recebido': 0,
+        'gabaritos': gabaritos,
+        'perfil': perfil_do_envio(data),
+        'professor': (data.get('professor') or '').strip() or request.remote_addr or 'anonimo',
+        'parcial': str(parcial)
+    }
+    salvar_estado_upload(upload_id, upload)
+    uploads_em_andamento[upload_id] = upload
+
+    return jsonify({
+        'success': True,
+        'upload_id': upload_id,
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
+    })
+
+@app.route('/api/upload/<upload_id>', methods=['GET'])
+def status_upload(upload_id):
+    """Retorna quantos bytes já foram recebidos (para retomar o upload)"""
+    upload = uploads_em_andamento.get(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+
+    return jsonify({'recebido': upload['recebido'], 'tamanho': upload['tamanho']})
+
+@app.route('/api/upload/<upload_id>/parte', methods=['PUT'])
+def receber_parte_upload(upload_id):
+    """Recebe uma parte do arquivo e grava direto no disco, sem carregar tudo na memória"""
+    upload = uploads_em_andamento.get(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+
+    # Partes repetidas pelo cliente (nova tentativa com a anterior ainda em andamento) não
+    # gravam no .part ao mesmo tempo: a segunda recebe 409 e retoma pelo 'recebido'
+    trava = trava_do_upload(upload_id)
+    if not trava.acquire(blocking=False):
+        return jsonify({'error': 'Outra parte deste upload está sendo recebida', 'recebido': upload['recebido']}), 409
+    try:
+        if uploads_em_andamento.get(upload_id) is not upload:
+            return jsonify({'error': 'Upload não encontrado'}), 404
+        return gravar_parte_upload(upload)
+    finally:
+        trava.release()
+
+def gravar_parte_upload(upload):
+    """Grava a parte da requisição no .part (com a trava do upload)"""
+    # A parte precisa começar exatamente onde a anterior terminou
+    try:
+        offset = int(request.headers['X-Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Cabeçalho X-Upload-Offset ausente ou inválido', 'recebido': upload['recebido']}), 400
+    if offset != upload['recebido']:
+        return jsonify({'error': 'Offset inválido', 'recebido': upload['recebido']}), 409
+
+    recebido = offset
+    with open(upload['parcial'], 'r+b') as f:
+        f.seek(offset)
+        while True:
+            bloco = request.stream.read(1024 * 1024)
+            if not bloco:
+                break
+            recebido += len(bloco)
+            if recebido > upload['tamanho']:
+                f.truncate(offset)
+                return jsonify({'error': 'Parte excede o tamanho declarado', 'recebido': offset}), 400
+            f.write(bloco)
+
+    upload['recebido'] = recebido
+    return jsonify({'recebido': recebido, 'tamanho': upload['tamanho']})
+
+@app.route('/api/upload/<upload_id>/concluir', methods=['POST'])
+def concluir_upload(upload_id):
+    """Finaliza o upload em partes e inicia a correção do PDF"""
+    upload = uploads_em_andamento.get(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+
+    trava = trava_do_upload(upload_id)
+    if not trava.acquire(blocking=False):
+        return jsonify({'error': 'Uma parte deste upload ainda está sendo recebida', 'recebido': upload['recebido']}), 409
+    try:
+        if uploads_em_andamento.get(upload_id) is not upload:
+            return jsonify({'error': 'Upload não encontrado'}), 404
+        if upload['recebido'] != upload['tamanho']:
+            return jsonify({'error': 'Upload incompleto', 'recebido': upload['recebido']}), 409
+
+        # Mesmo nome de um PDF já enviado: recebe um sufixo em vez de sobrescrevê-lo
+        with trava_uploads:
+            nomes_usados = {nome.lower() for nome in os.listdir(app.config['UPLOAD_FOLDER'])}
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], nome_unico(upload['nome'], nomes_usados) or f'{upload_id}.pdf')
+            os.replace(upload['parcial'], filepath)
+        remover_upload_parcial(upload_id)
+    finally:
+        trava.release()
+
+    try:
+        job_id = iniciar_correcao(filepath, upload['gabaritos'], upload['professor'], upload['perfil'])
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'message': 'Correção iniciada'
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erro: {str(e)}'}), 500
+
 @app.route('/api/correction-progress/<job_id>')
 def get_correction_progress(job_id):
     """Retorna o progresso de uma correção em andamento"""
-    if job_id not in correction_progress:
+    progress = obter_agendador().progresso(correction_progress.get(job_id, ''))
+    if progress is None:
         return jsonify({'error': 'Job não encontrado'}), 404
 
-    progress = correction_progress[job_id]
     return jsonify({
         'status': progress['status'],
         'current_page': progress['current_page'],
         'total_pages': progress['total_pages'],
         'logs': progress['logs'][-10:],  # Últimas 10 linhas
-        'all_logs': progress['logs']  # Todos os logs
+        'all_logs': progress['logs'],  # Todos os logs
+        'perfil': progress['perfil']  # Resumo do perfil, nos envios com profile=1
     })
 
+@app.route('/api/perfil/<job_id>')
+def get_perfil(job_id):
+    """Resumo do perfil de um envio feito com profile=1 (job_id do envio ou lote_id)"""
+    from perfil_execucao import arquivos_perfil
+    lote_id = correction_progress.get(job_id, job_id)
+    caminho = Path(arquivos_perfil(secure_filename(lote_id), app.config['REPORTS_FOLDER'])['resumo'])
+    if not caminho.exists():
+        return jsonify({'error': 'Perfil não encontrado (envio sem profile=1 ou ainda em andamento)'}), 404
+
+    with open(caminho, 'r', encoding='utf-8') as f:
+        resumo = json.load(f)
+    resumo['downloads'] = {formato: f'/api/perfil/{job_id}/{formato}' for formato in ('prof', 'pilhas')}
+    return jsonify(resumo)
+
+@app.route('/api/perfil/<job_id>/<formato>')
+def download_perfil(job_id, formato):
+    """Baixa o perfil: 'prof' (estatísticas do cProfile) ou 'pilhas' (formato do flame graph)"""
+    from perfil_execucao import arquivos_perfil
+    lote_id = correction_progress.get(job_id, job_id)
+    arquivos = arquivos_perfil(secure_filename(lote_id), app.config['REPORTS_FOLDER'])
+    if formato not in ('prof', 'pilhas'):
+        return jsonify({'error': 'Formato inválido (use prof ou pilhas)'}), 400
+    if not Path(arquivos[formato]).exists():
+        return jsonify({'error': 'Perfil não encontrado'}), 404
+    return send_file(Path(arquivos[formato]), as_attachment=True, download_name=os.path.basename(arquivos[formato]))
+
 @app.route('/api/report/<filename>')
 def get_report(filename):
     """Retorna dados de um relatório específico"""
@@ -222,6 +606,36 @@ def get_report(filename):
     except:
         return jsonify({'error': 'Erro ao ler relatório'}), 500
 
+@app.route('/api/revisao', methods=['GET'])
+def listar_revisao():
+    """Lista os itens de baixa confiança pendentes de conferência"""
+    itens = obter_fila_revisao().listar()
+    return jsonify({'total': len(itens), 'itens': itens})
+
+@app.route('/api/revisao/recorte/<nome>')
+def recorte_revisao(nome):
+    """Retorna o recorte (linha de bolhas ou miniatura da página) de um item"""
+    caminho = obter_fila_revisao().caminho_recorte(nome)
+    if not caminho:
+        return jsonify({'error': 'Recorte não encontrado'}), 404
+    return send_file(caminho)
+
+@app.route('/api/revisao/<item_id>', methods=['POST'])
+def resolver_revisao(item_id):
+    """Registra a decisão do operador e recorrige a página"""
+    dados = request.get_json(silent=True) or {}
+
+    try:
+        item = obter_fila_revisao().resolver(item_id, dados)
+    except KeyError:
+        return jsonify({'error': 'Item não encontrado'}), 404
+    except FileNotFoundError:
+        return jsonify({'error': 'Relatório do item não existe mais'}), 404
+    except Exception as e:
+        return jsonify({'error': f'Erro ao resolver item: {str(e)}'}), 500
+
+    return jsonify({'success': True, 'item': item})
+
 @app.route('/api/stats')
 def get_stats():
     """Retorna estatísticas gerais"""
@@ -230,7 +644,9 @@ def get_stats():
         'media_nota': 0,
         'maior_nota': 0,
         'menor_nota': 10,
-        'por_turma': {}
+        'por_turma': {},
+        # Páginas puladas pela triagem (em branco, capas...) não entram nas notas
+        'paginas_ignoradas': len(list(Path(app.config['REPORTS_FOLDER']).glob('*_ignorada.json')))
     }
 
     reports_path = Path(app.config['REPORTS_FOLDER'])
@@ -271,6 +687,19 @@ def get_stats():
 
     return jsonify(stats)
 
+@app.route('/api/paginas-ignoradas')
+def get_paginas_ignoradas():
+    """Páginas que a triagem pulou (em branco, capas, instruções), para conferência"""
+    paginas = []
+    for json_file in sorted(Path(app.config['REPORTS_FOLDER']).glob('*_ignorada.json')):
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                paginas.append(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    return jsonify({'total': len(paginas), 'paginas': paginas})
+
 @app.route('/api/envios')
 def get_envios():
     """Retorna envios agrupados por turma e data"""
@@ -346,6 +775,9 @@ def get_envios():
 @app.route('/api/envios/export/<turma>')
 def export_turma_excel(turma):
     """Exporta relatório da turma para Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
     try:
         # Decodificar nome da turma da URL
         turma_nome = unquote(turma)
@@ -513,6 +945,7 @@ def limpar_envios():
         # Contar arquivos antes de deletar
         json_files = list(reports_path.glob('*_relatorio.json'))
         html_files = list(reports_path.glob('*_relatorio.html'))
+        ignoradas = list(reports_path.glob('*_ignorada.json'))
 
         total_arquivos = len(json_files) + len(html_files)
 
@@ -524,6 +957,13 @@ def limpar_envios():
         for html_file in html_files:
             html_file.unlink()
 
+        # Registros das páginas puladas pela triagem
+        for registro in ignoradas:
+            registro.unlink()
+
+        # Itens de revisão apontam para os relatórios removidos
+        obter_fila_revisao().limpar()
+
         return jsonify({
             'success': True,
             'message': f'{total_arquivos} arquivos deletados com sucesso',
@@ -686,6 +1126,8 @@ def limpar_gabaritos():
 @app.route('/api/gabarito/gerar-pdf', methods=['POST'])
 def gerar_gabarito_pdf():
     """Gera um gabarito em PDF"""
+    from gerador_gabarito import GeradorGabarito
+
     data = request.get_json()
 
     if not data:
@@ -821,12 +1263,100 @@ def limpar_gabaritos_pdf():
 @app.route('/api/csv/upload', methods=['POST'])
 def upload_csv():
     """Faz upload de CSV e analisa turmas"""
-    return jsonify({'error': 'Funcionalidade temporariamente desabilitada'}), 501
+    from gerar_gabaritos_personalizados import ler_csv_alunos, listar_turmas
+
+    if 'file' not in request.files:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'Arquivo vazio'}), 400
+
+    if not allowed_csv_file(file.filename):
+        return jsonify({'error': 'Apenas arquivos CSV são permitidos'}), 400
+
+    filename = secure_filename(file.filename)
+    filepath = Path(app.config['CSV_UPLOAD_FOLDER']) / filename
+    file.save(filepath)
+
+    try:
+        alunos_por_turma = ler_csv_alunos(filepath)
+        if not alunos_por_turma:
+            return jsonify({'error': 'Nenhum aluno encontrado no CSV'}), 400
+
+        turmas = listar_turmas(alunos_por_turma)
+
+        return jsonify({
+            'success': True,
+            'arquivo': filename,
+            'total_alunos': sum(t['num_alunos'] for t in turmas),
+            'total_turmas': len(turmas),
+            'turmas': turmas
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erro ao processar CSV: {str(e)}'}), 500
 
 @app.route('/api/csv/gerar-gabaritos', methods=['POST'])
 def gerar_gabaritos_csv():
     """Gera gabaritos personalizados a partir do CSV"""
-    return jsonify({'error': 'Funcionalidade temporariamente desabilitada'}), 501
+    from gerar_gabaritos_personalizados import ler_csv_alunos, gerar_gabaritos_turmas
+
+    data = request.get_json()
+
+    if not data:
+        return jsonify({'error': 'Dados inválidos'}), 400
+
+    csv_path = Path(app.config['CSV_UPLOAD_FOLDER']) / secure_filename(data.get('csv_filename', ''))
+    if not csv_path.is_file():
+        return jsonify({'error': 'CSV não encontrado. Faça o upload novamente'}), 404
+
+    turmas_selecionadas = data.get('turmas', [])
+    if not turmas_selecionadas:
+        return jsonify({'error': 'Selecione pelo menos uma turma'}), 400
+
+    num_questoes = int(data.get('num_questoes', 40))
+    if num_questoes < 1 or num_questoes > 200:
+        return jsonify({'error': 'Número de questões deve estar entre 1 e 200'}), 400
+
+    alternativas = [a.strip().upper() for a in data.get('alternativas', 'A,B,C,D,E').split(',') if a.strip()]
+
+    # 'turma' = um PDF por turma; 'individual' = um PDF por aluno
+    modo = data.get('modo', 'turma')
+    if modo not in ('turma', 'individual'):
+        return jsonify({'error': 'Modo inválido'}), 400
+
+    configuracao = {
+        'titulo': data.get('titulo', '').strip() or 'GABARITO DE PROVA',
+        'disciplina': data.get('disciplina', '').strip() or None,
+        'professor': data.get('professor', '').strip() or None,
+        'codigo_prova': data.get('codigo_prova', '').strip() or None,
+        'num_questoes': num_questoes,
+        'alternativas': alternativas or ['A', 'B', 'C', 'D', 'E']
+    }
+
+    try:
+        alunos_por_turma = ler_csv_alunos(csv_path)
+        alunos_por_turma = {t: a for t, a in alunos_por_turma.items() if t in turmas_selecionadas}
+
+        if not alunos_por_turma:
+            return jsonify({'error': 'Nenhuma das turmas selecionadas foi encontrada no CSV'}), 404
+
+        arquivos = gerar_gabaritos_turmas(
+            alunos_por_turma, configuracao, app.config['GABARITOS_PDF_FOLDER'], modo
+        )
+
+        total_alunos = sum(len(a) for a in alunos_por_turma.values())
+        total_arquivos = sum(len(a) for a in arquivos.values())
+
+        return jsonify({
+            'success': True,
+            'message': f'{total_arquivos} PDF(s) gerado(s) com sucesso!',
+            'total_alunos': total_alunos,
+            'total_turmas': len(alunos_por_turma),
+            'total_arquivos': total_arquivos
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erro ao gerar gabaritos: {str(e)}'}), 500
 
 # Funções auxiliares para mapeamento de alunos
 def carregar_mapeamento_alunos():
@@ -1006,5 +1536,10 @@ def download_todos_pdfs():
     except Exception as e:
         return jsonify({'error': f'Erro ao criar ZIP: {str(e)}'}), 500
 
+# Uploads em partes interrompidos por uma reinicialização continuam de onde pararam
+carregar_uploads_parciais()
+
 if __name__ == '__main__':
+    # Workers de leitura sobem junto com o servidor, não no primeiro envio
+    obter_agendador().iniciar()
     app.run(debug=False, host='0.0.0.0', port=5000, use_reloader=False)
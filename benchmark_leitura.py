@@ -0,0 +1,671 @@
+#!/usr/bin/env python3
+"""
+Benchmark de Ida e Volta Gerador → Leitor
+Gera gabaritos com o GeradorGabarito, preenche as bolhas com padrões conhecidos,
+simula degradações de scanner e mede velocidade, memória e acurácia do leitor.
+
+Roda offline, só em CPU. Com --baseline compara com uma execução anterior e
+sai com código 1 se houver regressão de desempenho. Com --modos compara os modos
+de execução do corrigir_rapido (sequencial, threads, processos) num PDF de scanner.
+Com --inicializacao mede o custo de partida: imports, memória e a latência até a
+primeira página de um pool de workers novo (spawn × forkserver pré-carregado).
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import multiprocessing
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import cv2
+import fitz
+import numpy as np
+
+from gerador_gabarito import GeradorGabarito
+from leitor_gabarito import LeitorFinalV2
+import corrigir_rapido
+import recursos_opencv
+from corrigir_rapido import extrair_ra_da_imagem, renderizar_pagina_cinza
+
+ALTERNATIVAS = ['A', 'B', 'C', 'D', 'E']
+RA_TESTE = '000114154807'
+
+PADROES = ['simples', 'branco', 'dupla', 'lapis_claro']
+DEGRADACOES = ['contraste', 'ruido', 'desfoque', 'rotacao', 'inclinacao', 'jpeg', 'iluminacao']
+
+
+# ---------------------------------------------------------------------------
+# Folha base
+# ---------------------------------------------------------------------------
+
+def gerar_folha_base(pasta, num_questoes, escala, alternativas=ALTERNATIVAS, secoes=None):
+    """
+    Gera o PDF de um aluno e devolve (1ª página em escala de cinza, layout das bolhas, altura em pontos)
+
+    Com secoes ([{'tipo', 'num_questoes'}, ...]), a folha é um gabarito personalizado com
+    seções mistas (múltipla escolha e verdadeiro ou falso) em vez da grade da prova
+    """
+    caminho_pdf = os.path.join(pasta, 'benchmark_gabarito.pdf')
+    gerador = GeradorGabarito(caminho_pdf)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if secoes:
+            gerador.gerar_gabarito_personalizado({
+                'titulo': 'GABARITO DE PROVA', 'ra_aluno': RA_TESTE,
+                'secoes': [{**secao, 'alternativas': list(alternativas)} for secao in secoes]
+            })
+        else:
+            gerador.gerar_gabaritos_lote([{'nome': 'ALUNO BENCHMARK', 'ra': RA_TESTE}],
+                                         num_questoes=num_questoes, alternativas=list(alternativas))
+
+    pdf = fitz.open(caminho_pdf)
+    imagem = renderizar_pagina_cinza(pdf[0], escala).copy()
+    pdf.close()
+
+    layout = [q for q in gerador.layout_bolhas if q['pagina'] == 0]
+    return imagem, layout, gerador.altura
+
+
+# ---------------------------------------------------------------------------
+# Preenchimento sintético
+# ---------------------------------------------------------------------------
+
+def _ponto_para_pixel(x, y, altura, escala):
+    """Converte coordenadas do ReportLab (pontos, origem embaixo) para pixels da imagem"""
+    return int(round(x * escala)), int(round((altura - y) * escala))
+
+
+def preencher_folha(imagem, layout, altura, rng, escala):
+    """
+    Preenche as bolhas da folha sorteando um padrão por questão
+
+    Returns:
+        (imagem preenchida, {questao: (padrão, resposta esperada ou None)})
+    """
+    preenchida = imagem.copy()
+    esperado = {}
+
+    for questao in layout:
+        padrao = rng.choice(PADROES)
+        bolhas = questao['bolhas']
+        raio = int(questao['raio'] * escala * 0.8)
+
+        if padrao == 'branco':
+            marcadas, cor, resposta = [], 0, None
+        elif padrao == 'dupla':
+            marcadas, cor, resposta = rng.sample(range(len(bolhas)), 2), 20, None
+        elif padrao == 'lapis_claro':
+            idx = rng.randrange(len(bolhas))
+            marcadas, cor, resposta = [idx], rng.randint(110, 150), bolhas[idx][0]
+        else:
+            idx = rng.randrange(len(bolhas))
+            marcadas, cor, resposta = [idx], 20, bolhas[idx][0]
+
+        for idx in marcadas:
+            _, x, y = bolhas[idx]
+            centro = _ponto_para_pixel(x, y, altura, escala)
+            cv2.circle(preenchida, centro, raio, cor, -1, lineType=cv2.LINE_AA)
+
+        esperado[questao['questao']] = (padrao, resposta)
+
+    return preenchida, esperado
+
+
+# ---------------------------------------------------------------------------
+# Degradações de scanner
+# ---------------------------------------------------------------------------
+
+def _contraste(img, rng):
+    """Impressão clara ou escura: o preto sobe e o branco desce (toner fraco, papel reciclado)"""
+    preto, branco = rng.uniform(40, 110), rng.uniform(190, 245)
+    return (preto + img.astype(np.float32) * (branco - preto) / 255).astype(np.uint8)
+
+
+def _ruido(img, rng):
+    ruido = np.random.default_rng(rng.randrange(1 << 30)).normal(0, 12, img.shape)
+    return np.clip(img.astype(np.float32) + ruido, 0, 255).astype(np.uint8)
+
+
+def _desfoque(img, rng):
+    return cv2.GaussianBlur(img, (5, 5), rng.uniform(0.8, 1.6))
+
+
+def _rotacao(img, rng):
+    h, w = img.shape[:2]
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-2.0, 2.0), 1.0)
+    return cv2.warpAffine(img, m, (w, h), borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+
+def _inclinacao(img, rng):
+    h, w = img.shape[:2]
+    cisalhamento = rng.uniform(-0.02, 0.02)
+    m = np.float32([[1, cisalhamento, -cisalhamento * h / 2], [0, 1, 0]])
+    return cv2.warpAffine(img, m, (w, h), borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+
+def _jpeg(img, rng):
+    _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, rng.randint(25, 50)])
+    return cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+
+
+def _iluminacao(img, rng):
+    h, w = img.shape[:2]
+    minimo = rng.uniform(0.6, 0.85)
+    gradiente = np.linspace(minimo, 1.0, w, dtype=np.float32)
+    if rng.random() < 0.5:
+        gradiente = gradiente[::-1]
+    return (img.astype(np.float32) * gradiente[None, :]).astype(np.uint8)
+
+
+FUNCOES_DEGRADACAO = {
+    'contraste': _contraste,
+    'ruido': _ruido,
+    'desfoque': _desfoque,
+    'rotacao': _rotacao,
+    'inclinacao': _inclinacao,
+    'jpeg': _jpeg,
+    'iluminacao': _iluminacao,
+}
+
+
+def degradar(img, degradacoes, rng):
+    """Aplica as degradações na ordem em que um scanner as produziria"""
+    for nome in DEGRADACOES:
+        if nome in degradacoes:
+            img = FUNCOES_DEGRADACAO[nome](img, rng)
+    return img
+
+
+def perfis_degradacao(ativas):
+    """Perfis usados nas amostras: limpo, cada degradação isolada e todas combinadas"""
+    perfis = [()] + [(d,) for d in ativas]
+    if len(ativas) > 1:
+        perfis.append(tuple(ativas))
+    return perfis
+
+
+# ---------------------------------------------------------------------------
+# Métricas
+# ---------------------------------------------------------------------------
+
+def percentis(valores):
+    """p50/p90/p99 em milissegundos"""
+    if not valores:
+        return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0}
+    arr = np.array(valores) * 1000
+    return {p: round(float(np.percentile(arr, int(p[1:]))), 2) for p in ('p50', 'p90', 'p99')}
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo (ru_maxrss é em KB no Linux)"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def avaliar(respostas, esperado, acertos_padrao, total_padrao):
+    """Acumula acertos por padrão de preenchimento"""
+    for questao, (padrao, resposta) in esperado.items():
+        total_padrao[padrao] += 1
+        if respostas.get(str(questao)) == resposta:
+            acertos_padrao[padrao] += 1
+
+
+# ---------------------------------------------------------------------------
+# Execução
+# ---------------------------------------------------------------------------
+
+def medir_alocacao(leitor, paginas, dpi):
+    """
+    Memória alocada pelo Python e pelo NumPy/OpenCV (tracemalloc) durante a leitura de cada
+    página: o pico acima do que já estava alocado antes dela. Com os buffers da thread já
+    criados, sobra só o que a leitura aloca de novo a cada página.
+    """
+    picos = []
+    tracemalloc.start()
+    try:
+        for pagina in paginas:
+            antes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            with contextlib.redirect_stdout(io.StringIO()):
+                leitor.ler(pagina, dpi=dpi)
+                extrair_ra_da_imagem(pagina)
+            picos.append((tracemalloc.get_traced_memory()[1] - antes) / 2**20)
+    finally:
+        tracemalloc.stop()
+    return picos
+
+
+def executar_benchmark(num_paginas=30, num_questoes=40, degradacoes=DEGRADACOES, semente=42, aquecimento=2,
+                       dpi=LeitorFinalV2.DPI_REFERENCIA, alternativas=ALTERNATIVAS, secoes=None):
+    """Executa o benchmark e devolve um dicionário com os resultados"""
+    rng = random.Random(semente)
+    escala = dpi / 72
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_gabarito_') as pasta:
+        base, layout, altura = gerar_folha_base(pasta, num_questoes, escala, alternativas, secoes)
+        # O leitor fica com as alternativas padrão: o número delas vem da grade da folha
+        leitor = LeitorFinalV2(num_questoes=num_questoes)
+        # Folha com seções: lida pelo layout que o gerador grava junto do PDF
+        layout_secoes = {'altura': altura, 'questoes': layout} if secoes else None
+        perfis = perfis_degradacao(list(degradacoes))
+        recursos_opencv.zerar_estatisticas()
+
+        # Coletas do GC durante as páginas medidas (pressão de alocação)
+        gc_coletas, gc_inicio, gc_tempo = [0], [0.0], [0.0]
+
+        def cronometrar_gc(fase, info):
+            if fase == 'start':
+                gc_inicio[0] = time.perf_counter()
+            else:
+                gc_coletas[0] += 1
+                gc_tempo[0] += time.perf_counter() - gc_inicio[0]
+        amostras = []
+
+        tempos = {'leitura': [], 'ra': [], 'total': []}
+        # Etapas internas do leitor (carregamento, calibração, pré-processamento, círculos = Hough
+        # e grade, respostas = pontuação das bolhas), como ele mesmo as mede
+        etapas_leitura = {}
+        acertos_padrao = {p: 0 for p in PADROES}
+        total_padrao = {p: 0 for p in PADROES}
+        ra_corretos = 0
+        revisao = {'sinalizadas': 0, 'erros': 0, 'erros_sinalizados': 0}
+        por_perfil = {}
+
+        for i in range(aquecimento + num_paginas):
+            perfil = perfis[i % len(perfis)]
+            preenchida, esperado = preencher_folha(base, layout, altura, rng, escala)
+            pagina = degradar(preenchida, perfil, rng)
+
+            t1 = time.perf_counter()
+            leitura = leitor.ler(pagina, dpi=dpi, layout=layout_secoes)
+            respostas = leitura.respostas
+            t2 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                ra = extrair_ra_da_imagem(pagina)
+            t3 = time.perf_counter()
+
+            # Primeiras páginas só aquecem caches e bibliotecas nativas
+            if i < aquecimento:
+                continue
+            if i == aquecimento:
+                gc.callbacks.append(cronometrar_gc)
+            if len(amostras) < 5:
+                amostras.append(pagina)
+
+            tempos['leitura'].append(t2 - t1)
+            tempos['ra'].append(t3 - t2)
+            tempos['total'].append(t3 - t1)
+            for etapa, ms in leitura.tempos.items():
+                if etapa != 'total':
+                    etapas_leitura.setdefault(etapa, []).append(ms / 1000)
+
+            avaliar(respostas, esperado, acertos_padrao, total_padrao)
+            for q, (_, r) in esperado.items():
+                sinalizada = str(q) in leitura.revisao
+                erro = respostas.get(str(q)) != r
+                revisao['sinalizadas'] += sinalizada
+                revisao['erros'] += erro
+                revisao['erros_sinalizados'] += erro and sinalizada
+            ra_ok = ra == RA_TESTE
+            ra_corretos += ra_ok
+
+            nome_perfil = '+'.join(perfil) or 'limpo'
+            estat = por_perfil.setdefault(nome_perfil, {'paginas': 0, 'acertos': 0, 'questoes': 0, 'ra': 0})
+            estat['paginas'] += 1
+            estat['questoes'] += len(esperado)
+            estat['acertos'] += sum(1 for q, (_, r) in esperado.items() if respostas.get(str(q)) == r)
+            estat['ra'] += ra_ok
+
+        if cronometrar_gc in gc.callbacks:
+            gc.callbacks.remove(cronometrar_gc)
+        alocado = medir_alocacao(leitor, amostras, dpi)
+
+    total_questoes = sum(total_padrao.values())
+    tempo_total = sum(tempos['total'])
+
+    return {
+        'paginas': num_paginas,
+        'questoes_por_pagina': len(layout),
+        'alternativas': len(alternativas),
+        'secoes': secoes,
+        'dpi': dpi,
+        'semente': semente,
+        'paginas_por_segundo': round(num_paginas / tempo_total, 3) if tempo_total else 0.0,
+        'latencia_ms': {etapa: percentis(v) for etapa, v in tempos.items()},
+        'latencia_leitura_ms': {etapa: percentis(v) for etapa, v in etapas_leitura.items()},
+        'pico_rss_mb': pico_rss_mb(),
+        # Objetos do OpenCV criados e reaproveitados (inclui as páginas de aquecimento)
+        'recursos_opencv': recursos_opencv.estatisticas(),
+        'alocado_por_pagina_mb': {'p50': round(statistics.median(alocado), 2),
+                                  'max': round(max(alocado), 2)} if alocado else None,
+        'gc': {'coletas': gc_coletas[0], 'ms': round(gc_tempo[0] * 1000, 2)},
+        'acuracia_respostas': round(sum(acertos_padrao.values()) / total_questoes, 4) if total_questoes else 0.0,
+        'acuracia_por_padrao': {
+            p: round(acertos_padrao[p] / total_padrao[p], 4) if total_padrao[p] else None for p in PADROES
+        },
+        'acuracia_ra': round(ra_corretos / num_paginas, 4) if num_paginas else 0.0,
+        # Fração das questões enviadas à fila de revisão e fração dos erros que ela cobre
+        'taxa_revisao': round(revisao['sinalizadas'] / total_questoes, 4) if total_questoes else 0.0,
+        'erros_sinalizados': round(revisao['erros_sinalizados'] / revisao['erros'], 4) if revisao['erros'] else None,
+        'por_degradacao': {
+            nome: {
+                'paginas': e['paginas'],
+                'acuracia_respostas': round(e['acertos'] / e['questoes'], 4) if e['questoes'] else 0.0,
+                'acuracia_ra': round(e['ra'] / e['paginas'], 4),
+            }
+            for nome, e in por_perfil.items()
+        },
+    }
+
+
+def imprimir_resultado(resultado):
+    """Mostra o resultado em formato legível"""
+    print("=" * 70)
+    print("BENCHMARK GERADOR → LEITOR")
+    print("=" * 70)
+    print(f"Páginas: {resultado['paginas']} ({resultado['questoes_por_pagina']} questões cada, "
+          f"{resultado.get('alternativas', len(ALTERNATIVAS))} alternativas, {resultado['dpi']:.0f} DPI)")
+    print(f"Throughput: {resultado['paginas_por_segundo']:.2f} páginas/s")
+    print(f"Pico de RSS: {resultado['pico_rss_mb']:.1f} MB")
+    print("\nLatência por etapa (ms):")
+    print(f"  {'Etapa':<10} {'p50':>9} {'p90':>9} {'p99':>9}")
+    for etapa, p in resultado['latencia_ms'].items():
+        print(f"  {etapa:<10} {p['p50']:>9.1f} {p['p90']:>9.1f} {p['p99']:>9.1f}")
+    print("\nEtapas da leitura (ms; circulos = Hough e grade, respostas = pontuação):")
+    print(f"  {'Etapa':<16} {'p50':>9} {'p90':>9} {'p99':>9}")
+    for etapa, p in resultado.get('latencia_leitura_ms', {}).items():
+        print(f"  {etapa:<16} {p['p50']:>9.1f} {p['p90']:>9.1f} {p['p99']:>9.1f}")
+    print("\nObjetos do OpenCV (por thread):")
+    print(f"  {'Recurso':<24} {'Criados':>8} {'Reusos':>8}")
+    for nome, r in resultado['recursos_opencv'].items():
+        print(f"  {nome:<24} {r['criados']:>8} {r['reusos']:>8}")
+    if resultado['alocado_por_pagina_mb']:
+        print(f"Memória alocada por página: p50 {resultado['alocado_por_pagina_mb']['p50']:.1f} MB, "
+              f"máx. {resultado['alocado_por_pagina_mb']['max']:.1f} MB")
+    print(f"Coletas do GC: {resultado['gc']['coletas']} ({resultado['gc']['ms']:.1f} ms)")
+    print(f"\nAcurácia das respostas: {resultado['acuracia_respostas'] * 100:.1f}%")
+    for padrao, acc in resultado['acuracia_por_padrao'].items():
+        print(f"  {padrao:<12} {'-' if acc is None else f'{acc * 100:.1f}%'}")
+    print(f"Acurácia do RA: {resultado['acuracia_ra'] * 100:.1f}%")
+    cobertura = resultado['erros_sinalizados']
+    print(f"Enviadas para revisão: {resultado['taxa_revisao'] * 100:.1f}% das questões "
+          f"({'-' if cobertura is None else f'{cobertura * 100:.0f}%'} dos erros)")
+    print("\nPor degradação:")
+    for nome, e in resultado['por_degradacao'].items():
+        print(f"  {nome:<55} respostas {e['acuracia_respostas'] * 100:5.1f}%  RA {e['acuracia_ra'] * 100:5.1f}%")
+    print("=" * 70)
+
+
+# ---------------------------------------------------------------------------
+# Modos de execução do corrigir_rapido
+# ---------------------------------------------------------------------------
+
+def gerar_pdf_escaneado(caminho, paginas, dpi):
+    """Monta um PDF como o de um scanner: uma imagem JPEG em escala de cinza por página"""
+    pdf = fitz.open()
+    for imagem in paginas:
+        _, jpeg = cv2.imencode('.jpg', imagem, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        pagina = pdf.new_page(width=imagem.shape[1] * 72 / dpi, height=imagem.shape[0] * 72 / dpi)
+        pagina.insert_image(pagina.rect, stream=jpeg.tobytes())
+    pdf.save(caminho)
+    pdf.close()
+
+
+def comparar_modos(modos, num_paginas=16, num_questoes=40, semente=42, workers=None,
+                   dpi=LeitorFinalV2.DPI_REFERENCIA):
+    """Corrige o mesmo PDF em cada modo (sem cache) e mede o tempo de parede"""
+    rng = random.Random(semente)
+    escala = dpi / 72
+    workers = workers or os.cpu_count() or 1
+    tempos = {}
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_modos_') as pasta:
+        base, layout, altura = gerar_folha_base(pasta, num_questoes, escala)
+        paginas = [preencher_folha(base, layout, altura, rng, escala)[0] for _ in range(num_paginas)]
+        gerar_pdf_escaneado(os.path.join(pasta, 'lote.pdf'), paginas, dpi)
+        del paginas
+
+        with open(os.path.join(pasta, 'gabarito.json'), 'w') as f:
+            json.dump({str(q): 'A' for q in range(1, num_questoes + 1)}, f)
+        os.makedirs(os.path.join(pasta, 'relatorios_correcao'))
+
+        # O corrigir_rapido grava relatórios e fila de revisão em caminhos relativos
+        diretorio_original = os.getcwd()
+        os.chdir(pasta)
+        try:
+            for modo in modos:
+                inicio = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    corrigir_rapido.corrigir_rapido('lote.pdf', 'gabarito.json', usar_cache=False,
+                                                    dpi_leitura=dpi, dpi_codigos=dpi,
+                                                    modo=modo, workers=workers)
+                tempos[modo] = time.perf_counter() - inicio
+        finally:
+            os.chdir(diretorio_original)
+
+    referencia = tempos.get('sequencial')
+    return {
+        'paginas': num_paginas,
+        'workers': workers,
+        'cpus': os.cpu_count(),
+        'modos': {
+            modo: {
+                'segundos': round(t, 3),
+                'paginas_por_segundo': round(num_paginas / t, 3),
+                'aceleracao': round(referencia / t, 2) if referencia else None,
+            }
+            for modo, t in tempos.items()
+        },
+    }
+
+
+def imprimir_modos(resultado):
+    """Mostra a comparação dos modos de execução"""
+    print("=" * 70)
+    print("MODOS DE EXECUÇÃO DO CORRIGIR_RAPIDO")
+    print("=" * 70)
+    print(f"Páginas: {resultado['paginas']} • workers: {resultado['workers']} • CPUs: {resultado['cpus']}\n")
+    print(f"  {'Modo':<12} {'Tempo (s)':>10} {'Páginas/s':>10} {'Aceleração':>11}")
+    for modo, m in resultado['modos'].items():
+        aceleracao = '-' if m['aceleracao'] is None else f"{m['aceleracao']:.2f}x"
+        print(f"  {modo:<12} {m['segundos']:>10.2f} {m['paginas_por_segundo']:>10.2f} {aceleracao:>11}")
+
+
+# ---------------------------------------------------------------------------
+# Custo de partida (imports e workers)
+# ---------------------------------------------------------------------------
+
+def medir_import(modulo, repeticoes=3):
+    """Tempo de import e memória residente de um processo Python novo que só importa o módulo"""
+    codigo = ("import resource, time; t = time.perf_counter(); import {0}; "
+              "print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)").format(modulo)
+    tempos, rss = [], []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True, check=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        tempos.append(float(saida[-2]))
+        rss.append(int(saida[-1]) / 1024)
+    return {'segundos': round(statistics.median(tempos), 3), 'rss_mb': round(statistics.median(rss), 1)}
+
+
+def medir_pool(caminho_pdf, metodo, workers, num_questoes, dpi):
+    """
+    Sobe um pool novo e lê uma página por worker
+
+    Returns:
+        (segundos até a primeira página lida, segundos até todos os workers lerem uma página)
+    """
+    if metodo == 'forkserver':
+        opcoes = {'mp_context': corrigir_rapido.contexto_processos(),
+                  'initializer': corrigir_rapido.iniciar_processo_leitura,
+                  'initargs': (num_questoes, ALTERNATIVAS)}
+    else:
+        opcoes = {'mp_context': multiprocessing.get_context(metodo)}
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, **opcoes) as executor:
+        futuros = [executor.submit(corrigir_rapido.ler_pagina_pdf, caminho_pdf, 0, num_questoes,
+                                   ALTERNATIVAS, dpi, dpi) for _ in range(workers)]
+        wait(futuros, return_when='FIRST_COMPLETED')
+        primeira = time.perf_counter() - inicio
+        wait(futuros)
+        todas = time.perf_counter() - inicio
+        for futuro in futuros:
+            futuro.result()
+    return primeira, todas
+
+
+def medir_inicializacao(workers=None, num_questoes=40, repeticoes=3, semente=42, dpi=LeitorFinalV2.DPI_REFERENCIA):
+    """
+    Custo de partida do servidor web, do corrigir_rapido e dos pools de leitura
+
+    O primeiro pool forkserver inclui a subida do próprio servidor (que importa os módulos
+    uma vez); os seguintes, como os do agendador depois da partida, só fazem fork.
+    """
+    workers = workers or os.cpu_count() or 1
+    resultado = {
+        'workers': workers,
+        'imports': {modulo: medir_import(modulo, repeticoes) for modulo in ('app', 'corrigir_rapido')},
+        'pools': {}
+    }
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_partida_') as pasta:
+        escala = dpi / 72
+        base, layout, altura = gerar_folha_base(pasta, num_questoes, escala)
+        pagina = preencher_folha(base, layout, altura, random.Random(semente), escala)[0]
+        caminho_pdf = os.path.join(pasta, 'pagina.pdf')
+        gerar_pdf_escaneado(caminho_pdf, [pagina], dpi)
+
+        for metodo in ('spawn', 'forkserver'):
+            rodadas = [medir_pool(caminho_pdf, metodo, workers, num_questoes, dpi) for _ in range(repeticoes)]
+            resultado['pools'][metodo] = {
+                'primeira_pagina_s': [round(r[0], 3) for r in rodadas],
+                'todos_workers_s': [round(r[1], 3) for r in rodadas],
+            }
+
+    return resultado
+
+
+def imprimir_inicializacao(resultado):
+    """Mostra o custo de partida"""
+    print("=" * 70)
+    print("CUSTO DE PARTIDA")
+    print("=" * 70)
+    print(f"  {'Import':<18} {'Tempo (s)':>10} {'RSS (MB)':>10}")
+    for modulo, m in resultado['imports'].items():
+        print(f"  {modulo:<18} {m['segundos']:>10.3f} {m['rss_mb']:>10.1f}")
+
+    print(f"\nPool novo com {resultado['workers']} worker(s), uma página por worker (cada rodada):")
+    for metodo, m in resultado['pools'].items():
+        primeira = ' '.join(f"{t:.2f}" for t in m['primeira_pagina_s'])
+        todas = ' '.join(f"{t:.2f}" for t in m['todos_workers_s'])
+        print(f"  {metodo:<11} 1ª página: {primeira} s • todos os workers: {todas} s")
+
+
+def comparar_com_baseline(resultado, caminho_baseline, tolerancia):
+    """Retorna lista de regressões em relação a uma execução anterior"""
+    with open(caminho_baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    regressoes = []
+    limite = 1.0 - tolerancia
+
+    if resultado['paginas_por_segundo'] < baseline['paginas_por_segundo'] * limite:
+        regressoes.append(
+            f"throughput {resultado['paginas_por_segundo']:.2f} < "
+            f"{baseline['paginas_por_segundo']:.2f} páginas/s"
+        )
+    if resultado['acuracia_respostas'] < baseline['acuracia_respostas'] - 0.01:
+        regressoes.append(
+            f"acurácia {resultado['acuracia_respostas']:.4f} < {baseline['acuracia_respostas']:.4f}"
+        )
+    if resultado['acuracia_ra'] < baseline['acuracia_ra'] - 0.01:
+        regressoes.append(f"acurácia do RA {resultado['acuracia_ra']:.4f} < {baseline['acuracia_ra']:.4f}")
+
+    return regressoes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de ida e volta gerador → leitor')
+    parser.add_argument('--paginas', type=int, default=30, help='Número de páginas medidas')
+    parser.add_argument('--questoes', type=int, default=40, help='Questões da prova (mede a 1ª folha)')
+    parser.add_argument('--alternativas', default=''.join(ALTERNATIVAS),
+                        help='Alternativas impressas em cada questão (padrão: ABCDE)')
+    parser.add_argument('--secoes', default=None,
+                        help='Gabarito personalizado com seções, ex: multipla_escolha:20,verdadeiro_falso:10')
+    parser.add_argument('--dpi', type=float, default=LeitorFinalV2.DPI_REFERENCIA,
+                        help='Resolução das páginas sintéticas (padrão: 144)')
+    parser.add_argument('--semente', type=int, default=42, help='Semente dos padrões e degradações')
+    parser.add_argument('--degradacoes', default=','.join(DEGRADACOES),
+                        help=f'Lista separada por vírgula (disponíveis: {",".join(DEGRADACOES)})')
+    parser.add_argument('--json', help='Salva o resultado neste arquivo JSON')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior para detectar regressões')
+    parser.add_argument('--tolerancia', type=float, default=0.15,
+                        help='Queda de throughput aceita em relação ao baseline (padrão: 0.15)')
+    parser.add_argument('--modos', help='Compara modos do corrigir_rapido, ex: sequencial,threads,processos')
+    parser.add_argument('--workers', type=int, default=None, help='Workers dos modos paralelos (padrão: CPUs)')
+    parser.add_argument('--inicializacao', action='store_true',
+                        help='Mede imports, memória e a partida dos workers (spawn × forkserver)')
+    args = parser.parse_args()
+
+    if args.inicializacao:
+        resultado = medir_inicializacao(args.workers, args.questoes, semente=args.semente, dpi=args.dpi)
+        imprimir_inicializacao(resultado)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(resultado, f, indent=2, ensure_ascii=False)
+            print(f"✓ Resultado salvo: {args.json}")
+        sys.exit(0)
+
+    if args.modos:
+        modos = [m.strip() for m in args.modos.split(',') if m.strip()]
+        invalidos = [m for m in modos if m not in corrigir_rapido.MODOS_EXECUCAO]
+        if invalidos:
+            print(f"✗ Modos desconhecidos: {', '.join(invalidos)}")
+            sys.exit(2)
+
+        resultado = comparar_modos(modos, args.paginas, args.questoes, args.semente, args.workers, args.dpi)
+        imprimir_modos(resultado)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(resultado, f, indent=2, ensure_ascii=False)
+            print(f"✓ Resultado salvo: {args.json}")
+        sys.exit(0)
+
+    degradacoes = [d.strip() for d in args.degradacoes.split(',') if d.strip()]
+    invalidas = [d for d in degradacoes if d not in FUNCOES_DEGRADACAO]
+    if invalidas:
+        print(f"✗ Degradações desconhecidas: {', '.join(invalidas)}")
+        sys.exit(2)
+
+    secoes = None
+    if args.secoes:
+        secoes = [{'tipo': tipo.strip(), 'num_questoes': int(n)}
+                  for tipo, n in (item.split(':') for item in args.secoes.split(',') if item.strip())]
+    resultado = executar_benchmark(args.paginas, args.questoes, degradacoes, args.semente, dpi=args.dpi,
+                                   alternativas=[a for a in args.alternativas.upper() if a.isalnum()],
+                                   secoes=secoes)
+    imprimir_resultado(resultado)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"✓ Resultado salvo: {args.json}")
+
+    if args.baseline:
+        regressoes = comparar_com_baseline(resultado, args.baseline, args.tolerancia)
+        if regressoes:
+            print("✗ Regressões em relação ao baseline:")
+            for r in regressoes:
+                print(f"  - {r}")
+            sys.exit(1)
+        print("✓ Sem regressões em relação ao baseline")
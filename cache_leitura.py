@@ -0,0 +1,124 @@
+"""
+Cache de Leituras por Conteúdo
+Evita refazer o OCR de páginas já lidas (ex: o mesmo PDF enviado duas vezes)
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class CacheLeitura:
+    """
+    Cache em disco endereçado por conteúdo, com despejo LRU por tamanho
+
+    Cada entrada é um JSON com as respostas brutas, as questões com múltiplas
+    marcações e o RA de uma página. A chave é o SHA-256 dos streams da página
+    mais a versão e os parâmetros do leitor, então mudar o leitor invalida o cache.
+    """
+
+    def __init__(self, pasta: str = '.cache_leitura', tamanho_maximo: int = 256 * 1024 * 1024):
+        """
+        Args:
+            pasta: Diretório onde as entradas são gravadas
+            tamanho_maximo: Tamanho máximo do cache em bytes
+        """
+        self.pasta = Path(pasta)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.faltas = 0
+        self._tamanho_atual = sum(p.stat().st_size for p in self.pasta.glob('*.json'))
+
+    @staticmethod
+    def hash_pagina_pdf(pdf, pagina) -> str:
+        """
+        SHA-256 do conteúdo bruto de uma página do PDF (sem renderizar)
+
+        Inclui os content streams e os streams de todas as imagens e form XObjects
+        referenciados, já que em PDFs de scanner o content stream é igual em todas
+        as páginas e só a imagem muda.
+        """
+        h = hashlib.sha256()
+        h.update(f"{tuple(pagina.rect)}|{pagina.rotation}".encode())
+
+        for xref in pagina.get_contents():
+            h.update(pdf.xref_stream_raw(xref) or b'')
+
+        xrefs = sorted({img[0] for img in pagina.get_images(full=True)} |
+                       {xo[0] for xo in pagina.get_xobjects()})
+        for xref in xrefs:
+            h.update(pdf.xref_stream_raw(xref) or b'')
+
+        return h.hexdigest()
+
+    @staticmethod
+    def chave(hash_pagina: str, versao_leitor: str, parametros: Dict) -> str:
+        """Combina o hash da página com a versão e os parâmetros do leitor"""
+        h = hashlib.sha256()
+        h.update(hash_pagina.encode())
+        h.update(versao_leitor.encode())
+        h.update(json.dumps(parametros, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def obter(self, chave: str) -> Optional[Dict]:
+        """Retorna a leitura em cache ou None"""
+        caminho = self.pasta / f"{chave}.json"
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.faltas += 1
+            return None
+
+        # Marcar como usado recentemente (LRU pelo mtime)
+        try:
+            os.utime(caminho)
+        except OSError:
+            pass
+
+        self.acertos += 1
+        return dados
+
+    def salvar(self, chave: str, dados: Dict):
+        """Grava a leitura de uma página e despeja as entradas mais antigas se necessário"""
+        caminho = self.pasta / f"{chave}.json"
+        temporario = caminho.with_suffix('.tmp')
+
+        conteudo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        anterior = caminho.stat().st_size if caminho.exists() else 0
+
+        with open(temporario, 'wb') as f:
+            f.write(conteudo)
+        os.replace(temporario, caminho)
+
+        self._tamanho_atual += len(conteudo) - anterior
+        if self._tamanho_atual > self.tamanho_maximo:
+            self._despejar()
+
+    def _despejar(self):
+        """Remove as entradas usadas há mais tempo até caber no limite"""
+        entradas = []
+        for p in self.pasta.glob('*.json'):
+            try:
+                st = p.stat()
+                entradas.append((st.st_mtime, st.st_size, p))
+            except FileNotFoundError:
+                continue
+
+        self._tamanho_atual = sum(e[1] for e in entradas)
+        for _, tamanho, p in sorted(entradas, key=lambda e: e[0]):
+            if self._tamanho_atual <= self.tamanho_maximo:
+                break
+            try:
+                p.unlink()
+                self._tamanho_atual -= tamanho
+            except FileNotFoundError:
+                pass
+
+    def taxa_acerto(self) -> float:
+        """Fração de consultas atendidas pelo cache"""
+        total = self.acertos + self.faltas
+        return self.acertos / total if total else 0.0
@@ -4,16 +4,46 @@ Script Rápido para Corrigir PDFs
 Sem menu interativo - direto ao ponto
 """
 
+import os
 import sys
 import json
 import fitz
 import csv
 import cv2
+import queue
+import argparse
+import threading
+import multiprocessing
 import numpy as np
-from leitor_gabarito import LeitorFinalV2
-from corretor import Corretor
-from visualizar_relatorio import gerar_html_relatorio
-
+from contextlib import closing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from leitor_gabarito import LeitorFinalV2, VERSAO_LEITOR
+from cache_leitura import CacheLeitura
+from fila_revisao import FilaRevisao
+from escritor_relatorios import EscritorRelatorios
+from folhas_prova import decodificar_qr, questoes_da_folha
+from roteamento_gabaritos import RoteadorGabaritos, SeparadorGabaritos, interpretar_faixas
+from triagem_paginas import VERSAO_TRIAGEM, classificar_pagina
+import recursos_opencv
+from memoria_leitura import MEMORIA_MB, MonitorMemoria, controlar, workers_no_orcamento
+from perfil_execucao import PerfilExecucao
+
+# Resolução de trabalho (configurável por instalação): as bolhas são lidas bem em
+# resolução mais baixa; os códigos (QR/barcode) podem precisar de mais pixels
+DPI_LEITURA = float(os.environ.get('GABARITO_DPI_LEITURA', LeitorFinalV2.DPI_REFERENCIA))
+DPI_CODIGOS = float(os.environ.get('GABARITO_DPI_CODIGOS', LeitorFinalV2.DPI_REFERENCIA))
+
+# Execução das páginas: 'sequencial', 'threads' (pipeline; o OpenCV libera o GIL) ou 'processos'
+MODOS_EXECUCAO = ('sequencial', 'threads', 'processos')
+MODO_EXECUCAO = os.environ.get('GABARITO_MODO', 'sequencial')
+
+# Triagem na miniatura: páginas em branco, capas e instruções não passam pela leitura completa
+TRIAGEM_ATIVA = os.environ.get('GABARITO_TRIAGEM', '1') != '0'
+
+# Importados uma única vez no servidor do forkserver: os workers de leitura nascem por fork
+# dele já com OpenCV, NumPy, PyMuPDF e os módulos da correção carregados
+MODULOS_PRECARREGADOS = ['corrigir_rapido']
 
 def carregar_csv_alunos(caminho_csv='csv_alunos_referencia/alunos_referencia.csv'):
     """Carrega CSV com dados dos alunos e retorna dicionário {RA: dados}"""
@@ -47,11 +77,190 @@ def carregar_csv_alunos(caminho_csv='csv_alunos_referencia/alunos_referencia.csv
     return alunos
 
 
+def para_cinza(img):
+    """Retorna a imagem em escala de cinza (sem cópia se já estiver)"""
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def renderizar_pagina_cinza(pagina, escala=2):
+    """Renderiza uma página do PDF direto em escala de cinza (1 canal, sem PNG intermediário)"""
+    pix = pagina.get_pixmap(matrix=fitz.Matrix(escala, escala), colorspace=fitz.csGRAY)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+
+def extrair_imagem_escaneada(pdf, pagina):
+    """
+    Caminho rápido para PDFs de scanner: se a página for uma única imagem cobrindo
+    a página inteira, decodifica essa imagem na resolução nativa (sem rasterizar)
+
+    Returns:
+        (imagem em escala de cinza, DPI nativo) ou None se a página não for só uma imagem
+    """
+    try:
+        imagens = pagina.get_images(full=True)
+        if len(imagens) != 1:
+            return None
+
+        info = imagens[0]
+        xref, smask, filtro = info[0], info[1], info[8]
+        if smask:
+            return None
+
+        # Nada desenhado por cima (texto só se for invisível, ex: camada de OCR do scanner)
+        if pagina.get_drawings():
+            return None
+        if any(span['type'] != 3 for span in pagina.get_texttrace()):
+            return None
+
+        # Imagem deve cobrir a página e estar só escalada (sem giro/espelhamento)
+        bbox, matriz = pagina.get_image_bbox(info, transform=True)
+        area_pagina = pagina.cropbox.width * pagina.cropbox.height
+        if matriz.b != 0 or matriz.c != 0 or matriz.a <= 0 or matriz.d <= 0:
+            return None
+        if bbox.width * bbox.height < 0.95 * area_pagina:
+            return None
+
+        if filtro == 'DCTDecode':
+            # JPEG: o libjpeg decodifica só a luminância direto
+            dados = np.frombuffer(pdf.xref_stream_raw(xref), dtype=np.uint8)
+            cinza = cv2.imdecode(dados, cv2.IMREAD_GRAYSCALE)
+        else:
+            # CCITT, JBIG2, Flate, ...: decodificar com o próprio PyMuPDF
+            pix = fitz.Pixmap(pdf, xref)
+            if pix.n - pix.alpha != 1:
+                pix = fitz.Pixmap(fitz.csGRAY, pix)
+            if pix.alpha:
+                pix = fitz.Pixmap(pix, 0)
+            cinza = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+        if cinza is None:
+            return None
+
+        # Rotação da página (a imagem fica armazenada sem ela)
+        rotacoes = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+        if pagina.rotation in rotacoes:
+            cinza = cv2.rotate(cinza, rotacoes[pagina.rotation])
+
+        dpi = cinza.shape[1] / (bbox.width / 72) if pagina.rotation in (0, 180) else cinza.shape[1] / (bbox.height / 72)
+        return cinza, dpi
+    except Exception:
+        return None
+
+
+def carregar_pagina_cinza(pdf, pagina, dpi_alvo=144):
+    """
+    Obtém a página em escala de cinza: imagem embutida quando possível,
+    rasterização como fallback (páginas vetoriais ou mistas)
+
+    Returns:
+        (imagem em escala de cinza, DPI real da imagem, origem: 'imagem' ou 'render')
+    """
+    escaneada = extrair_imagem_escaneada(pdf, pagina)
+    if escaneada is not None:
+        cinza, dpi = escaneada
+        return cinza, dpi, 'imagem'
+
+    return renderizar_pagina_cinza(pagina, dpi_alvo / 72), dpi_alvo, 'render'
+
+
+def reduzir_dpi(cinza, dpi, dpi_max, destino=None):
+    """
+    Reduz a imagem para no máximo dpi_max (nunca amplia)
+
+    Args:
+        destino: Nome do buffer pré-alocado da thread onde gravar a imagem reduzida
+            (modo streaming); o conteúdo só vale até a próxima página
+
+    Returns:
+        (imagem, DPI resultante)
+    """
+    fator = dpi_max / dpi
+    if fator >= 0.98:
+        return cinza, dpi
+    buffer = None
+    if destino:
+        forma = (round(cinza.shape[0] * fator), round(cinza.shape[1] * fator))
+        buffer = recursos_opencv.buffer(destino, forma)
+    reduzida = cv2.resize(cinza, None, dst=buffer, fx=fator, fy=fator, interpolation=cv2.INTER_AREA)
+    return reduzida, dpi * reduzida.shape[1] / cinza.shape[1]
+
+
+def recortes_revisao(img, dpi, leitura):
+    """
+    Recortes pequenos para a fila de revisão: a linha de bolhas (com o número da questão)
+    de cada questão sinalizada e, se o RA não foi lido ou há questões não localizadas,
+    uma miniatura da página (chave 'pagina')
+    """
+    px_mm = dpi / 25.4
+    recortes = {}
+
+    for q in leitura['revisao']:
+        info = leitura['confianca'].get(q)
+        if info is None:
+            continue
+        x1, y1, x2, y2 = info['caixa']
+        x1 = max(0, int(x1 - 10 * px_mm))
+        y1, x2, y2 = max(0, int(y1 - 1.5 * px_mm)), int(x2 + 1.5 * px_mm), int(y2 + 1.5 * px_mm)
+        recortes[q] = img[y1:y2, x1:x2].copy()
+
+    if not leitura['ra'] or 'nao_localizada' in leitura['revisao'].values():
+        miniatura = reduzir_dpi(img, dpi, 50)[0]
+        recortes['pagina'] = miniatura if miniatura is not img else img.copy()
+
+    return recortes
+
+
+def itens_revisao(relatorio_path, caminho_gabarito, page_num, hash_pagina, leitura, incluir_pagina=True):
+    """
+    Itens da fila de revisão de uma página: as questões de baixa confiança e a página,
+    quando o RA não foi lido ou há questões não localizadas
+
+    Sem recortes (leitura vinda do cache) os já gravados são reaproveitados pelo hash.
+
+    Args:
+        incluir_pagina: Gerar o item da página (numa prova com várias folhas, só a
+            primeira folha o gera, com as questões não localizadas de todas)
+
+    Returns:
+        Lista de (item, recorte, nome do recorte) para FilaRevisao.adicionar
+    """
+    base = {'relatorio': relatorio_path, 'gabarito': caminho_gabarito, 'pagina': page_num + 1}
+    recortes = leitura.get('recortes') or {}
+    revisao, ra = leitura['revisao'], leitura['ra']
+    itens = []
+
+    for q, motivo in revisao.items():
+        info = leitura['confianca'].get(q)
+        if info is None:
+            continue
+        itens.append((dict(base, questao=int(q), motivo=motivo, scores=info['scores'],
+                           margem=info['margem'], resposta_lida=leitura['respostas'].get(q)),
+                      recortes.get(q), f"{hash_pagina[:20]}_q{int(q):03d}.png"))
+
+    nao_localizadas = sorted(int(q) for q, m in revisao.items() if m == 'nao_localizada')
+    if incluir_pagina and (not ra or nao_localizadas):
+        motivos = (['ra_nao_detectado'] if not ra else []) + (['questoes_nao_localizadas'] if nao_localizadas else [])
+        itens.append((dict(base, questao=None, motivo=motivos, ra_lido=ra,
+                           questoes_nao_localizadas=nao_localizadas),
+                      recortes.get('pagina'), f"{hash_pagina[:20]}_pagina.jpg"))
+
+    return itens
+
+
+def enfileirar_revisao(fila, relatorio_path, itens):
+    """Substitui os itens de revisão de um relatório (chamado depois que ele está em disco)"""
+    fila.remover_relatorio(relatorio_path)
+    for item, recorte, nome_recorte in itens:
+        fila.adicionar(item, recorte, nome_recorte)
+
+
 def corrigir_inclinacao(img):
     """Detecta e corrige pequenas inclinações na imagem"""
     try:
         # Converter para escala de cinza
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = para_cinza(img)
 
         # Detectar bordas
         edges = cv2.Canny(gray, 50, 150, apertureSize=3)
@@ -87,42 +296,57 @@ def corrigir_inclinacao(img):
 
 
 def preprocessar_imagem_para_codigo(img):
-    """Aplica múltiplos pré-processamentos para melhorar detecção de códigos (ordem otimizada)"""
-    processadas = []
+    """Aplica múltiplos pré-processamentos para melhorar detecção de códigos (ordem otimizada)
 
+    Todas as variantes são de 1 canal: os detectores de QR e barcode aceitam escala de cinza.
+    As variantes são geradas uma de cada vez, conforme a anterior falha, todas no mesmo
+    buffer da thread: cada uma só vale até a próxima, e as seguintes nem são calculadas
+    quando o código é encontrado antes.
+    """
     # Converter para escala de cinza uma vez (usado em vários métodos)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = para_cinza(img)
+    variante = recursos_opencv.buffer('codigo_variante', gray.shape)
 
     # Ordem otimizada: métodos mais rápidos e eficazes primeiro
 
-    # 1. Imagem original (mais rápido)
-    processadas.append(("original", img))
-
-    # 2. Escala de cinza simples (rápido)
-    processadas.append(("gray", cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)))
+    # 1. Imagem original em escala de cinza (mais rápido)
+    yield "gray", gray
 
-    # 3. Blur + threshold OTSU (muito eficaz para códigos)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    processadas.append(("otsu", cv2.cvtColor(thresh, cv2.COLOR_GRAY2BGR)))
+    # 2. Blur + threshold OTSU (muito eficaz para códigos), no próprio buffer
+    cv2.GaussianBlur(gray, (5, 5), 0, dst=variante)
+    cv2.threshold(variante, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=variante)
+    yield "otsu", variante
 
-    # 4. CLAHE - equalização adaptativa (muito bom para iluminação desigual)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    clahe_img = clahe.apply(gray)
-    processadas.append(("clahe", cv2.cvtColor(clahe_img, cv2.COLOR_GRAY2BGR)))
+    # 3. CLAHE - equalização adaptativa (muito bom para iluminação desigual)
+    yield "clahe", recursos_opencv.clahe(2.0).apply(gray, variante)
 
-    # 5. Adaptive threshold (bom para fundos variados)
-    adaptive = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                     cv2.THRESH_BINARY, 11, 2)
-    processadas.append(("adaptive", cv2.cvtColor(adaptive, cv2.COLOR_GRAY2BGR)))
+    # 4. Adaptive threshold (bom para fundos variados)
+    yield "adaptive", cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                            cv2.THRESH_BINARY, 11, 2, dst=variante)
 
     # Apenas se necessário (mais lentos):
-    # 6. Sharpen (aumenta processamento)
+    # 5. Sharpen (aumenta processamento)
     # kernel_sharpen = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-    # sharpened = cv2.filter2D(gray, -1, kernel_sharpen)
-    # processadas.append(("sharp", cv2.cvtColor(sharpened, cv2.COLOR_GRAY2BGR)))
+    # yield "sharp", cv2.filter2D(gray, -1, kernel_sharpen)
+
 
-    return processadas
+def rotacoes_da_imagem(img, destino=None):
+    """
+    Rotações de 90°, 180° e 270° da imagem, uma de cada vez (só a atual fica em memória)
+
+    Args:
+        destino: Nome do buffer pré-alocado da thread para as rotações (modo streaming)
+
+    Yields:
+        (ângulo, imagem rotacionada)
+    """
+    for angulo, codigo in ((90, cv2.ROTATE_90_CLOCKWISE), (180, cv2.ROTATE_180),
+                           (270, cv2.ROTATE_90_COUNTERCLOCKWISE)):
+        buffer = None
+        if destino:
+            forma = img.shape if angulo == 180 else img.shape[1::-1]
+            buffer = recursos_opencv.buffer(f"{destino}_{'180' if angulo == 180 else '90'}", forma)
+        yield angulo, cv2.rotate(img, codigo, dst=buffer)
 
 
 def detectar_barcode(img):
@@ -138,8 +362,8 @@ def detectar_barcode(img):
 
             for obj in decoded_objects:
                 data = obj.data.decode('utf-8').strip()
-                # Validar se parece com um RA (numérico, 10-12 dígitos)
-                if data.isdigit() and 10 <= len(data) <= 12:
+                # Validar se parece com um RA ou com o código de uma folha de prova
+                if decodificar_qr(data):
                     return data, f"{obj.type} ({nome_proc})"
 
         return None, None
@@ -150,32 +374,79 @@ def detectar_barcode(img):
         return None, None
 
 
-def detectar_qrcode_multiplas_tentativas(img, qr_detector):
-    """Tenta detectar QR code com múltiplos pré-processamentos"""
-    # Tentar com a imagem original primeiro
+def _decodificar_qrcode(img, qr_detector):
+    """
+    Conteúdo do QR do aluno na imagem, ou None
+
+    A primeira folha também pode ter o QR com o código da prova: se o QR encontrado
+    não for de aluno, procura entre todos os QR da imagem.
+    """
     data, bbox, _ = qr_detector.detectAndDecode(img)
-    if data and data.strip().isdigit() and 10 <= len(data.strip()) <= 12:
-        return data.strip(), "original"
+    if decodificar_qr(data):
+        return data.strip()
+    if data:
+        ok, textos, _, _ = qr_detector.detectAndDecodeMulti(img)
+        for texto in (textos if ok else ()):
+            if decodificar_qr(texto):
+                return texto.strip()
+    return None
+
 
-    # Tentar com diferentes pré-processamentos
+def detectar_qrcode_multiplas_tentativas(img, qr_detector):
+    """Tenta detectar QR code com múltiplos pré-processamentos"""
+    # Primeiro só o canto do rodapé onde o gerador imprime o QR do aluno (4cm de uma
+    # folha A4), ampliado: o QR das provas com várias folhas tem módulos menores
+    lado = int(img.shape[1] * 4 / 21)
+    canto = cv2.resize(img[-lado:, :lado], None, dst=recursos_opencv.buffer('codigo_canto', (2 * lado, 2 * lado)),
+                       fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+    data = _decodificar_qrcode(canto, qr_detector)
+    if data:
+        return data, "original"
+
+    # Depois a imagem inteira
+    data = _decodificar_qrcode(img, qr_detector)
+    if data:
+        return data, "original"
+
+    # Tentar com diferentes pré-processamentos (a variante "gray" é a própria
+    # imagem quando ela já está em escala de cinza, já testada acima)
     imagens_processadas = preprocessar_imagem_para_codigo(img)
 
     for nome_proc, img_proc in imagens_processadas:
-        data, bbox, _ = qr_detector.detectAndDecode(img_proc)
-        if data and data.strip().isdigit() and 10 <= len(data.strip()) <= 12:
-            return data.strip(), nome_proc
+        if img_proc is img:
+            continue
+        data = _decodificar_qrcode(img_proc, qr_detector)
+        if data:
+            return data, nome_proc
 
     return None, None
 
 
-def extrair_ra_da_imagem(imagem_path):
-    """Extrai RA do QR code/Barcode usando OpenCV - com suporte a rotações e correção de inclinação"""
+def extrair_ra_da_imagem(imagem):
+    """Extrai RA do QR code/Barcode (ver extrair_codigo_da_imagem)"""
+    codigo = decodificar_qr(extrair_codigo_da_imagem(imagem))
+    return codigo['ra'] if codigo else None
+
+
+def extrair_codigo_da_imagem(imagem, buffers=False):
+    """Extrai o conteúdo do QR code/Barcode usando OpenCV - com suporte a rotações e correção de inclinação
+
+    O conteúdo é o RA ou, nas provas com várias folhas, RA + prova + número da folha
+    (ver folhas_prova.decodificar_qr).
+
+    Args:
+        imagem: Caminho da imagem ou array NumPy (de preferência em escala de cinza)
+        buffers: Gravar as rotações em buffers pré-alocados da thread (modo streaming)
+    """
     try:
-        # Carregar imagem
-        img = cv2.imread(imagem_path)
+        # Carregar imagem (1 canal)
+        if isinstance(imagem, np.ndarray):
+            img = para_cinza(imagem)
+        else:
+            img = cv2.imread(imagem, cv2.IMREAD_GRAYSCALE)
 
-        # Criar detector de QR Code
-        qr_detector = cv2.QRCodeDetector()
+        # Detector de QR Code da thread (reaproveitado entre páginas)
+        qr_detector = recursos_opencv.detector_qr()
 
         # 1. Tentar detectar QR code com múltiplos pré-processamentos
         qr_data, qr_method = detectar_qrcode_multiplas_tentativas(img, qr_detector)
@@ -205,14 +476,8 @@ def extrair_ra_da_imagem(imagem_path):
                 print(f"  (Código de barras detectado após correção de inclinação: {angulo_correcao:.1f}° - tipo: {barcode_type})")
                 return barcode_data
 
-        # 4. Tentar com rotações de 90° (para páginas muito tortas)
-        rotacoes = [
-            (90, cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)),
-            (180, cv2.rotate(img, cv2.ROTATE_180)),
-            (270, cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE))
-        ]
-
-        for angulo, img_rotacionada in rotacoes:
+        # 4. Tentar com rotações de 90° (para páginas muito tortas), geradas sob demanda
+        for angulo, img_rotacionada in rotacoes_da_imagem(img, 'rotacao_codigo' if buffers else None):
             # Tentar QR code com múltiplos pré-processamentos
             qr_data, qr_method = detectar_qrcode_multiplas_tentativas(img_rotacionada, qr_detector)
             if qr_data:
@@ -242,19 +507,619 @@ def extrair_ra_da_imagem(imagem_path):
 
         return None
     except Exception as e:
-        print(f"⚠ Erro ao extrair RA: {e}")
+        print(f"⚠ Erro ao extrair código: {e}")
         return None
 
 
-def corrigir_rapido(caminho_pdf, caminho_gabarito='gabarito_oficial.json'):
-    """Corrige um PDF de forma rápida e automática - TODAS AS PÁGINAS"""
+def ler_pagina_imagem(cinza, dpi, leitor, dpi_leitura, dpi_codigos, num_questoes=None, questoes_por_prova=None,
+                      buffers=False, layout=None, layouts_por_prova=None):
+    """
+    Etapas pesadas de uma página já carregada: RA, bolhas e recortes de revisão
+
+    Quase todo o tempo fica dentro do OpenCV (que libera o GIL), então pode rodar em
+    várias threads com o mesmo leitor. Antes, a triagem descarta em poucos milissegundos
+    as páginas que não são folhas de resposta. O QR é lido antes das bolhas: nas provas
+    com várias folhas, o número da folha diz quantas questões ela tem.
+
+    Args:
+        num_questoes: Questões da prova desta página (padrão: as do leitor)
+        questoes_por_prova: {código da prova: questões}, para PDFs com provas diferentes;
+            o código lido no QR decide o tamanho da folha
+        buffers: Reduções e rotações em buffers pré-alocados da thread (modo streaming)
+        layout: Layout das seções do gabarito personalizado (seções mistas)
+        layouts_por_prova: {código da prova: layout}, como questoes_por_prova
+
+    Returns:
+        Dicionário com tipo_pagina, triagem, respostas, questoes_multiplas, confianca,
+        revisao, ra, turma, folha e recortes
+    """
+    tipo_pagina, triagem = classificar_pagina(cinza, dpi) if TRIAGEM_ATIVA else ('gabarito', {})
+    if tipo_pagina != 'gabarito':
+        return {
+            'tipo_pagina': tipo_pagina, 'triagem': triagem, 'respostas': {}, 'questoes_multiplas': [],
+            'confianca': {}, 'revisao': {}, 'ra': None, 'recortes': {}
+        }
+
+    # Com a mesma resolução para bolhas e códigos, uma redução só serve às duas leituras
+    img_leitura, dpi_img_leitura = reduzir_dpi(cinza, dpi, dpi_leitura, 'reducao_leitura' if buffers else None)
+    if dpi_codigos == dpi_leitura:
+        img_codigos = img_leitura
+    else:
+        img_codigos, _ = reduzir_dpi(cinza, dpi, dpi_codigos, 'reducao_codigos' if buffers else None)
+    codigo = decodificar_qr(extrair_codigo_da_imagem(img_codigos, buffers)) or {}
+    num_questoes = (questoes_por_prova or {}).get(codigo.get('prova')) or num_questoes or leitor.num_questoes
+    quantidade = questoes_da_folha(num_questoes, codigo)
+    layout = (layouts_por_prova or {}).get(codigo.get('prova')) or layout
+
+    if layout:
+        # Gabarito personalizado: as bolhas (e quantas são) vêm do layout da folha
+        pagina = (codigo.get('pagina') or 1) - 1
+        quantidade = sum(1 for q in layout['questoes'] if q['pagina'] == pagina)
+        leitura = leitor.ler(img_leitura, dpi=dpi_img_leitura, layout=layout, pagina=pagina).para_dict()
+    else:
+        leitura = leitor.ler(img_leitura, dpi=dpi_img_leitura, quantidade=quantidade).para_dict()
+    leitura['tipo_pagina'], leitura['triagem'] = tipo_pagina, triagem
+    leitura['ra'], leitura['turma'] = codigo.get('ra'), codigo.get('turma')
+    leitura['folha'] = {
+        'prova': codigo.get('prova'), 'pagina': codigo.get('pagina'),
+        'paginas': codigo.get('paginas'), 'quantidade': quantidade
+    }
+
+    leitura['recortes'] = recortes_revisao(img_leitura, dpi_img_leitura, leitura)
+    return leitura
+
+
+def _leituras_sequencial(pdf, num_paginas, buscar_cache, leitor, dpi_leitura, dpi_codigos, opcoes_pagina=None,
+                         limite_mb=None):
+    """Uma página de cada vez, tudo na thread principal"""
+    for page_num in range(num_paginas):
+        hash_pagina, chave_cache, leitura = buscar_cache(page_num)
+        if leitura is None:
+            cinza, dpi, origem = carregar_pagina_cinza(pdf, pdf[page_num], max(dpi_leitura, dpi_codigos))
+            opcoes = opcoes_pagina(page_num) if opcoes_pagina else {}
+            leitura = ler_pagina_imagem(cinza, dpi, leitor, dpi_leitura, dpi_codigos, buffers=bool(limite_mb), **opcoes)
+            leitura['origem'], leitura['dpi'] = origem, dpi
+            del cinza
+            leitura['memoria'] = controlar(limite_mb, liberar_recursos_leitura)
+        yield page_num, hash_pagina, chave_cache, leitura
+
+
+def _leituras_threads(pdf, num_paginas, buscar_cache, leitor, dpi_leitura, dpi_codigos, workers, opcoes_pagina=None,
+                      limite_mb=None):
+    """
+    Pipeline com threads: uma thread abre/renderiza as páginas (o fitz não é thread-safe)
+    e N threads leem bolhas e RA, ligadas por filas limitadas. As leituras saem na ordem
+    das páginas. Com limite de memória (modo streaming) só uma página renderizada espera
+    por worker.
+
+    Se quem consome parar antes do fim (erro na correção, close() do gerador), as threads
+    são avisadas e esperadas antes de sair: nenhuma fica presa numa fila cheia nem usa o
+    PDF depois de fechado.
+    """
+    fila_paginas = queue.Queue(maxsize=workers if limite_mb else workers * 2)
+    fila_leituras = queue.Queue(maxsize=workers * 2)
+    FIM = object()
+    parar = threading.Event()
+
+    def colocar(fila, item):
+        """put que desiste quando o consumidor parou; False se desistiu"""
+        while not parar.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def renderizar():
+        try:
+            for page_num in range(num_paginas):
+                if parar.is_set():
+                    return
+                hash_pagina, chave_cache, leitura = buscar_cache(page_num)
+                imagem = None
+                if leitura is None:
+                    imagem = carregar_pagina_cinza(pdf, pdf[page_num], max(dpi_leitura, dpi_codigos))
+                if not colocar(fila_paginas, (page_num, hash_pagina, chave_cache, leitura, imagem)):
+                    return
+        except Exception as e:
+            colocar(fila_leituras, (None, e))
+        finally:
+            for _ in range(workers):
+                colocar(fila_paginas, FIM)
+
+    def trabalhar():
+        while not parar.is_set():
+            try:
+                item = fila_paginas.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is FIM:
+                colocar(fila_leituras, FIM)
+                return
+            page_num, hash_pagina, chave_cache, leitura, imagem = item
+            try:
+                if leitura is None:
+                    cinza, dpi, origem = imagem
+                    opcoes = opcoes_pagina(page_num) if opcoes_pagina else {}
+                    leitura = ler_pagina_imagem(cinza, dpi, leitor, dpi_leitura, dpi_codigos,
+                                                buffers=bool(limite_mb), **opcoes)
+                    leitura['origem'], leitura['dpi'] = origem, dpi
+                    del cinza, imagem
+                    # Acima do limite, os buffers de todos os workers são descartados, não só os deste
+                    leitura['memoria'] = controlar(limite_mb, lambda: recursos_opencv.liberar(todas_as_threads=True))
+                item = (page_num, (hash_pagina, chave_cache, leitura))
+            except Exception as e:
+                item = (None, e)
+            if not colocar(fila_leituras, item):
+                return
+
+    threads = [threading.Thread(target=renderizar, daemon=True)]
+    threads += [threading.Thread(target=trabalhar, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+
+    # Reordenar: páginas podem terminar fora de ordem
+    prontas = {}
+    proxima = 0
+    ativos = workers
+    try:
+        while ativos:
+            item = fila_leituras.get()
+            if item is FIM:
+                ativos -= 1
+                continue
+            page_num, dados = item
+            if page_num is None:
+                raise dados
+            prontas[page_num] = dados
+            while proxima in prontas:
+                yield (proxima,) + prontas.pop(proxima)
+                proxima += 1
+    finally:
+        parar.set()
+        for t in threads:
+            t.join()
+
+
+# Por processo: PDFs abertos e leitores reaproveitados entre páginas (modo 'processos' e agendador)
+_pdfs_abertos = {}
+_leitores = {}
+
+
+def contexto_processos():
+    """
+    Contexto dos pools de processos de leitura
+
+    forkserver: é seguro com threads ativas (servidor web, escritor de relatórios), como o
+    spawn, mas cada worker nasce por fork de um processo que já importou os módulos pesados,
+    em vez de importar tudo do zero. Sem forkserver (Windows), spawn.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context('forkserver')
+        contexto.set_forkserver_preload(MODULOS_PRECARREGADOS)
+        return contexto
+    return multiprocessing.get_context('spawn')
+
+
+def iniciar_processo_leitura(num_questoes=40, alternativas=None):
+    """
+    Inicialização de cada worker de leitura (initializer do pool): cria o leitor, o detector
+    de QR e o CLAHE e passa uma imagem pequena por eles, para a primeira página do worker
+    não pagar a carga das estruturas internas do OpenCV
+    """
+    leitor = LeitorFinalV2(num_questoes=num_questoes, alternativas=list(alternativas) if alternativas else None)
+    _leitores.setdefault((num_questoes, tuple(leitor.alternativas)), leitor)
+
+    amostra = np.full((64, 64), 255, dtype=np.uint8)
+    recursos_opencv.detector_qr().detectAndDecode(amostra)
+    for clip_limit in (1.0, 2.0, 3.0):
+        recursos_opencv.clahe(clip_limit).apply(amostra)
+    cv2.GaussianBlur(amostra, (5, 5), 0)
+
+
+def liberar_recursos_leitura():
+    """Fecha os PDFs guardados no processo e descarta buffers e o cache de recursos do MuPDF"""
+    while _pdfs_abertos:
+        _pdfs_abertos.popitem()[1].close()
+    recursos_opencv.liberar()
+    fitz.TOOLS.store_shrink(100)
+
+
+def ler_pagina_pdf(caminho_pdf, page_num, num_questoes, alternativas, dpi_leitura, dpi_codigos,
+                   questoes_por_prova=None, limite_mb=None, layout=None, layouts_por_prova=None, perfil=False):
+    """
+    Lê uma página a partir do caminho do PDF, para rodar em outro processo: só o caminho,
+    o número da página e a leitura (pequena) trafegam entre os processos
+
+    Args:
+        limite_mb: Limite de memória do worker (modo streaming): acima dele, o worker
+            libera o que guarda entre páginas, e 'memoria' avisa se não bastou
+        perfil: Medir a leitura (cProfile e pilhas) e devolver o perfil em 'perfil'
+
+    Returns:
+        Leitura como em ler_pagina_imagem, mais 'origem', 'dpi' e 'memoria' (RSS do worker)
+    """
+    if perfil:
+        perfilador = PerfilExecucao()
+        with perfilador.medir():
+            leitura = ler_pagina_pdf(caminho_pdf, page_num, num_questoes, alternativas, dpi_leitura, dpi_codigos,
+                                     questoes_por_prova, limite_mb, layout, layouts_por_prova)
+        leitura['perfil'] = perfilador.exportar()
+        return leitura
+
+    st = os.stat(caminho_pdf)
+    chave_pdf = (os.path.abspath(caminho_pdf), st.st_mtime_ns, st.st_size)
+    pdf = _pdfs_abertos.get(chave_pdf)
+    if pdf is None:
+        # Poucos documentos abertos por processo (o agendador intercala arquivos)
+        while len(_pdfs_abertos) >= 4:
+            _pdfs_abertos.pop(next(iter(_pdfs_abertos))).close()
+        pdf = _pdfs_abertos[chave_pdf] = fitz.open(caminho_pdf)
+
+    chave_leitor = (num_questoes, tuple(alternativas))
+    leitor = _leitores.get(chave_leitor)
+    if leitor is None:
+        leitor = _leitores[chave_leitor] = LeitorFinalV2(num_questoes=num_questoes, alternativas=list(alternativas))
+
+    cinza, dpi, origem = carregar_pagina_cinza(pdf, pdf[page_num], max(dpi_leitura, dpi_codigos))
+    leitura = ler_pagina_imagem(cinza, dpi, leitor, dpi_leitura, dpi_codigos, questoes_por_prova=questoes_por_prova,
+                                buffers=bool(limite_mb), layout=layout, layouts_por_prova=layouts_por_prova)
+    leitura['origem'], leitura['dpi'] = origem, dpi
+    del cinza
+    leitura['memoria'] = controlar(limite_mb, liberar_recursos_leitura)
+    return leitura
+
+
+def _leituras_processos(caminho_pdf, num_paginas, buscar_cache, leitor, dpi_leitura, dpi_codigos, workers,
+                        opcoes_pagina=None, limite_mb=None, monitor=None):
+    """
+    Um processo por CPU, cada um com o PDF aberto: só o número da página e a leitura trafegam
+
+    Com limite de memória (modo streaming), um worker que continua acima do limite mesmo
+    depois de liberar o que guarda faz o pool ser renovado: as páginas em voo terminam
+    no pool antigo e as seguintes vão para workers novos.
+    """
+    def novo_pool():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=contexto_processos(),
+                                   initializer=iniciar_processo_leitura,
+                                   initargs=(leitor.num_questoes, leitor.alternativas))
+
+    pools = [novo_pool()]
+
+    def entregar(item):
+        page, hash_p, chave, leitura, geracao = item
+        if isinstance(leitura, Future):
+            leitura = leitura.result()
+            if (leitura.get('memoria') or {}).get('acima') and geracao == len(pools) - 1:
+                print(f"💾 Worker {leitura['memoria']['pid']} acima do limite de memória "
+                      f"({leitura['memoria']['rss_mb']:.0f} MB): renovando o pool")
+                pools.append(novo_pool())
+                pools[-2].shutdown(wait=False)
+                if monitor:
+                    monitor.renovacoes += 1
+        return page, hash_p, chave, leitura
+
+    try:
+        pendentes = deque()
+        for page_num in range(num_paginas):
+            hash_pagina, chave_cache, leitura = buscar_cache(page_num)
+            if leitura is None:
+                opcoes = opcoes_pagina(page_num) if opcoes_pagina else {'num_questoes': leitor.num_questoes}
+                leitura = pools[-1].submit(ler_pagina_pdf, caminho_pdf, page_num, alternativas=leitor.alternativas,
+                                           dpi_leitura=dpi_leitura, dpi_codigos=dpi_codigos, limite_mb=limite_mb,
+                                           **opcoes)
+            pendentes.append((page_num, hash_pagina, chave_cache, leitura, len(pools) - 1))
+
+            # Manter poucas páginas em voo e ir entregando na ordem
+            while len(pendentes) > workers * 2 or (pendentes and not isinstance(pendentes[0][3], Future)):
+                yield entregar(pendentes.popleft())
+
+        while pendentes:
+            yield entregar(pendentes.popleft())
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+
+def parametros_leitura(num_questoes, alternativas, dpi_leitura, dpi_codigos, questoes_por_prova=None, layout=None,
+                       layouts_por_prova=None):
+    """Parâmetros que mudam o resultado da leitura (entram na chave do cache)"""
+    parametros = {
+        'num_questoes': num_questoes,
+        'alternativas': list(alternativas),
+        'dpi_leitura': dpi_leitura,
+        'dpi_codigos': dpi_codigos,
+        'triagem': VERSAO_TRIAGEM if TRIAGEM_ATIVA else None
+    }
+    if questoes_por_prova:
+        parametros['questoes_por_prova'] = questoes_por_prova
+    if layout:
+        parametros['layout'] = layout
+    if layouts_por_prova:
+        parametros['layouts_por_prova'] = layouts_por_prova
+    return parametros
+
+
+def dados_cache(leitura):
+    """Parte da leitura guardada no cache (sem recortes, tempos e geometria)"""
+    return {
+        'tipo_pagina': leitura.get('tipo_pagina', 'gabarito'),
+        'triagem': leitura.get('triagem', {}),
+        'respostas': leitura['respostas'],
+        'questoes_multiplas': leitura['questoes_multiplas'],
+        'confianca': leitura['confianca'],
+        'revisao': leitura['revisao'],
+        'ra': leitura['ra'],
+        'turma': leitura.get('turma'),
+        'folha': leitura.get('folha')
+    }
+
+
+def identificar_aluno(ra, alunos_dict, nome_padrao, log=print, turma=None):
+    """
+    Identificação do aluno pelo RA lido no QR/barcode, com fallback para nome_padrao
+
+    Args:
+        turma: Turma lida no QR; vale mesmo quando o aluno não está no CSV
+    """
+    # Tentar encontrar aluno no CSV
+    dados_aluno = None
+    if ra:
+        # Primeiro tentar com RA completo; o QR code pode ter apenas os 12 primeiros
+        # dígitos (sem o dígito verificador, 0-9 ou X)
+        dados_aluno = alunos_dict.get(ra)
+        if dados_aluno is None:
+            for digito in '0123456789X':
+                dados_aluno = alunos_dict.get(ra + digito)
+                if dados_aluno:
+                    break
+
+    if dados_aluno:
+        # Encontrou o aluno no CSV
+        log(f"✓ Aluno identificado: {dados_aluno['nome']} (RA: {ra})")
+        return {
+            'nome': dados_aluno['nome'],
+            'matricula': ra,
+            'turma': turma or dados_aluno['turma']
+        }
+
+    # Fallback: usar nome do arquivo
+    if ra:
+        log(f"⚠ RA {ra} encontrado mas não está no CSV")
+    else:
+        log(f"⚠ QR/Barcode não detectado, usando nome do arquivo")
+    return {
+        'nome': nome_padrao,
+        'matricula': ra if ra else '',
+        'turma': turma or ''
+    }
+
+
+MOTIVOS_IGNORADA = {
+    'em_branco': 'em branco',
+    'outra': 'não é folha de resposta (capa, instruções...)'
+}
+
+
+def caminho_pagina_ignorada(relatorio_path):
+    """Registro de página ignorada: fica ao lado do relatório, fora do padrão *_relatorio.json"""
+    return relatorio_path.replace('_relatorio.json', '_ignorada.json')
+
+
+def _remover_arquivos(*caminhos):
+    for caminho in caminhos:
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+
+def registrar_pagina_ignorada(relatorio_path, fila, nome_pdf, page_num, tipo_pagina, triagem):
+    """
+    Grava o registro de uma página pulada pela triagem, separado dos relatórios (não entra
+    nas notas nem nas estatísticas da turma), e apaga o relatório e os itens de revisão que
+    uma correção anterior tenha gerado para ela
+    """
+    caminho = caminho_pagina_ignorada(relatorio_path)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    registro = {
+        'arquivo': nome_pdf,
+        'pagina': page_num + 1,
+        'tipo': tipo_pagina,
+        'motivo': MOTIVOS_IGNORADA[tipo_pagina],
+        'triagem': triagem
+    }
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(registro, f, ensure_ascii=False, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+    _remover_arquivos(relatorio_path, relatorio_path.replace('.json', '.html'))
+    fila.remover_relatorio(relatorio_path)
+
+
+def _gravar_correcao(leitura, relatorio_path, nome_padrao, itens, corretor, alunos_dict,
+                     escritor, fila, log=print, depois=None):
+    """Identificação, nota e relatório de uma prova já lida (de uma ou de várias folhas)"""
+    questoes_multiplas = leitura['questoes_multiplas']
+
+    # 4. Converter para formato esperado
+    respostas = {int(q): r for q, r in leitura['respostas'].items()}
+
+    # 5. Identificação do aluno
+    identificacao = identificar_aluno(leitura['ra'], alunos_dict, nome_padrao, log, leitura.get('turma'))
+
+    # 6. Corrigir
+    log("Corrigindo prova...")
+    resultado = corretor.corrigir_prova(identificacao, respostas)
+
+    # 6.5 Adicionar informação de múltiplas marcações e de baixa confiança
+    resultado['questoes_multiplas_marcacoes'] = questoes_multiplas
+    resultado['questoes_revisao'] = leitura['revisao']
+
+    # 7. Exibir resultado resumido
+    log(f"✓ Acertos: {resultado['acertos']}/{resultado['total_questoes']}")
+    log(f"🎯 Nota: {resultado['nota']:.1f}/100")
+    if questoes_multiplas:
+        log(f"⚠️  Múltiplas marcações detectadas em: {questoes_multiplas}")
+
+    # 8-9. Salvar relatório JSON + HTML em segundo plano (a próxima página já vai sendo lida)
+    # 10. Depois de gravado, a fila de revisão recebe os itens de baixa confiança
+    _remover_arquivos(caminho_pagina_ignorada(relatorio_path))
+
+    def gravado(erro=None):
+        if erro:
+            log(f"✗ Relatório não gravado ({relatorio_path}): {erro}")
+        else:
+            enfileirar_revisao(fila, relatorio_path, itens)
+        if depois:
+            depois(erro)
+
+    escritor.enviar(relatorio_path, resultado, gravado)
+
+    log(f"✓ Relatório agendado: {relatorio_path}")
+    if itens:
+        log(f"🔍 {len(itens)} item(ns) enviado(s) para revisão")
+
+    return resultado
+
+
+def corrigir_pagina(leitura, page_num, nome_pdf, hash_pagina, corretor, alunos_dict,
+                    caminho_gabarito, escritor, fila, log=print, depois=None, montador=None):
+    """
+    Correção de uma página já lida: identificação, nota, relatório (gravado em segundo
+    plano pelo escritor) e itens de revisão
+
+    Args:
+        log: Função que recebe as mensagens de progresso
+        depois: Função chamada quando o relatório estiver em disco: depois(), ou depois(erro)
+            se a gravação falhar
+        montador: MontadorProvas, em provas com várias folhas. As páginas devem chegar na
+            ordem do PDF; a prova é corrigida quando chega a última folha do aluno.
+
+    Returns:
+        Resultado da correção, ou None se a página não é uma folha de resposta ou é
+        uma folha de uma prova que ainda espera as demais
+    """
+    relatorio_path = f"relatorios_correcao/{nome_pdf}_pag{page_num + 1:03d}_relatorio.json"
+    tipo_pagina = leitura.get('tipo_pagina', 'gabarito')
+    if tipo_pagina != 'gabarito':
+        registrar_pagina_ignorada(relatorio_path, fila, nome_pdf, page_num, tipo_pagina, leitura.get('triagem', {}))
+        log(f"⏭ Página ignorada: {MOTIVOS_IGNORADA[tipo_pagina]}")
+        if depois:
+            depois()
+        return None
 
-    # 1. Carregar gabarito oficial
-    print(f"Carregando gabarito: {caminho_gabarito}")
-    corretor = Corretor()
-    if not corretor.carregar_gabarito_oficial(caminho_gabarito):
-        print(f"✗ Erro ao carregar gabarito: {caminho_gabarito}")
+    quantidade = (leitura.get('folha') or {}).get('quantidade') or len(corretor.gabarito_oficial)
+    if 'revisao' not in leitura:
+        # Leitura de um cache gravado antes de a revisão ir junto: as folhas lidas pelo layout
+        # mantêm a numeração impressa, que começa na primeira questão localizada
+        leitura['revisao'] = LeitorFinalV2.questoes_para_revisao(
+            leitura['respostas'], leitura['confianca'], quantidade,
+            min((int(q) for q in leitura['confianca']), default=1)
+        )
+    elif leitura.get('origem') == 'imagem':
+        log(f"✓ Imagem escaneada extraída ({leitura['dpi']:.0f} DPI nativo)")
+
+    log(f"✓ {len(leitura['respostas'])}/{quantidade} questões detectadas")
+
+    if montador is not None:
+        prova = montador.adicionar(leitura, page_num, hash_pagina, depois)
+        if prova is None:
+            folha = leitura['folha']
+            log(f"📄 Folha {folha['pagina'] or '?'}/{len(montador.blocos)} da prova"
+                f"{' do RA ' + leitura['ra'] if leitura['ra'] else ''}: aguardando as demais folhas")
+            return None
+        try:
+            return corrigir_prova_montada(prova, montador, nome_pdf, corretor, alunos_dict,
+                                          caminho_gabarito, escritor, fila, log)
+        except Exception as e:
+            # As outras folhas da prova não ficam esperando um relatório que não virá: recebem o
+            # erro. O depois desta página fica de fora: quem chamou cuida dela ao tratar a exceção
+            # (o agendador marca a página com erro em vez de esperar o 'gravada')
+            for funcao in prova['depois']:
+                if funcao is not depois:
+                    funcao(e)
+            raise
+
+    itens = itens_revisao(relatorio_path, caminho_gabarito, page_num, hash_pagina, leitura)
+    return _gravar_correcao(leitura, relatorio_path, f"{nome_pdf}_pagina_{page_num + 1}", itens,
+                            corretor, alunos_dict, escritor, fila, log, depois)
+
+
+def corrigir_prova_montada(prova, montador, nome_pdf, corretor, alunos_dict, caminho_gabarito,
+                           escritor, fila, log=print):
+    """
+    Correção de uma prova com várias folhas: junta as respostas de todas as folhas do
+    aluno e grava um único relatório, com o nome da primeira página da prova no PDF
+
+    Returns:
+        Resultado da correção
+    """
+    leitura = montador.juntar(prova)
+    primeira = leitura['folhas'][0][0]
+    relatorio_path = f"relatorios_correcao/{nome_pdf}_pag{primeira + 1:03d}_relatorio.json"
+
+    paginas = ', '.join(str(page_num + 1) for page_num, _, _ in leitura['folhas'])
+    log(f"📄 Prova montada com {len(leitura['folhas'])}/{len(montador.blocos)} folha(s) (páginas {paginas})")
+    if leitura['faltando']:
+        log(f"⚠ Folha(s) {leitura['faltando']} não encontrada(s): questões marcadas como não localizadas")
+
+    # Questões de cada folha com o recorte da própria página; o item da página uma vez só
+    itens = []
+    for indice, (page_num, hash_pagina, vista) in enumerate(leitura['folhas']):
+        if indice == 0:
+            vista = dict(vista, revisao=leitura['revisao'])
+        itens += itens_revisao(relatorio_path, caminho_gabarito, page_num, hash_pagina, vista,
+                               incluir_pagina=indice == 0)
+
+    def depois(erro=None):
+        for funcao in prova['depois']:
+            funcao(erro)
+
+    return _gravar_correcao(leitura, relatorio_path, f"{nome_pdf}_pagina_{primeira + 1}", itens,
+                            corretor, alunos_dict, escritor, fila, log, depois)
+
+
+def corrigir_rapido(caminho_pdf, caminho_gabarito='gabarito_oficial.json', usar_cache=True,
+                    dpi_leitura=None, dpi_codigos=None, modo=None, workers=None, faixas=None, por_codigo=False,
+                    memoria_mb=None):
+    """Corrige um PDF de forma rápida e automática - TODAS AS PÁGINAS
+
+    Args:
+        caminho_gabarito: Gabarito de todas as páginas ou, com faixas/por_codigo, das que não
+            caem em nenhuma regra (None: essas páginas não são corrigidas)
+        dpi_leitura: Resolução usada na leitura das bolhas (padrão: GABARITO_DPI_LEITURA)
+        dpi_codigos: Resolução usada na leitura do QR/barcode (padrão: GABARITO_DPI_CODIGOS)
+        modo: 'sequencial', 'threads' ou 'processos' (padrão: GABARITO_MODO)
+        workers: Threads/processos de leitura nos modos paralelos (padrão: número de CPUs)
+        faixas: Gabarito por faixa de páginas, ver roteamento_gabaritos.interpretar_faixas
+        por_codigo: Escolher o gabarito de cada página pelo código da prova no QR
+        memoria_mb: Orçamento de memória em MB (modo streaming; padrão: GABARITO_MEMORIA_MB,
+            0 = sem orçamento): limita os workers e a memória de cada um e reaproveita buffers
+    """
+    dpi_leitura = dpi_leitura or DPI_LEITURA
+    dpi_codigos = dpi_codigos or DPI_CODIGOS
+    modo = modo or MODO_EXECUCAO
+    workers = workers or os.cpu_count() or 1
+    if modo not in MODOS_EXECUCAO:
+        print(f"✗ Modo de execução inválido: {modo} (use {', '.join(MODOS_EXECUCAO)})")
         return
+    memoria_mb = MEMORIA_MB if memoria_mb is None else memoria_mb
+    if memoria_mb and modo != 'sequencial':
+        workers = workers_no_orcamento(memoria_mb, workers)
+    # Só os workers de processos têm memória própria; threads e sequencial dividem a do principal
+    monitor = MonitorMemoria(memoria_mb, workers if modo == 'processos' else 0)
+
+    # 1. Carregar o(s) gabarito(s), uma vez só para o PDF inteiro
+    print(f"Carregando gabarito: {caminho_gabarito or 'pelo código da prova'}")
+    try:
+        roteador = RoteadorGabaritos(caminho_gabarito, faixas, por_codigo)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return
+    if len(roteador.gabaritos) > 1:
+        print(f"📑 {len(roteador.gabaritos)} gabaritos carregados")
 
     # 1.5 Carregar CSV de alunos
     print(f"Carregando dados dos alunos...")
@@ -267,102 +1132,101 @@ def corrigir_rapido(caminho_pdf, caminho_gabarito='gabarito_oficial.json'):
         pdf = fitz.open(caminho_pdf)
         num_paginas = len(pdf)
         print(f"📄 {num_paginas} páginas detectadas\n")
-
-        num_questoes = len(corretor.gabarito_oficial)
-        leitor = LeitorFinalV2(num_questoes=num_questoes)
-
-        # Processar cada página
-        for page_num in range(num_paginas):
-            print(f"\n{'='*70}")
-            print(f"PROCESSANDO PÁGINA {page_num + 1}/{num_paginas}")
-            print(f"{'='*70}")
-
-            # Converter página em imagem
-            pagina = pdf[page_num]
-            pix = pagina.get_pixmap(matrix=fitz.Matrix(2, 2))
-            temp_path = f'/tmp/corrigir_scan_p{page_num}.png'
-            pix.save(temp_path)
-
-            # 3. Ler respostas com OCR
-            print("Detectando respostas...")
-            respostas = leitor.ler_gabarito(temp_path)
-            print(f"✓ {len(respostas)}/{num_questoes} questões detectadas")
-
-            # 4. Converter para formato esperado
-            respostas = {int(q): r for q, r in respostas.items()}
-
-            # 5. Identificação do aluno - extrair do QR code/barcode
-            print("Extraindo identificação do aluno...")
-            ra = extrair_ra_da_imagem(temp_path)
-
-            # Nome do PDF para usar no nome do arquivo de relatório
-            nome_pdf = caminho_pdf.split('/')[-1].replace('.pdf', '')
-
-            # Tentar encontrar aluno no CSV
-            dados_aluno = None
-            if ra:
-                # Primeiro tentar com RA completo
-                if ra in alunos_dict:
-                    dados_aluno = alunos_dict[ra]
-                else:
-                    # O QR code pode ter apenas os 12 primeiros dígitos (sem o dígito verificador)
-                    # Procurar por RA que comece com os 12 dígitos
-                    for ra_completo, aluno in alunos_dict.items():
-                        if ra_completo.startswith(ra):
-                            dados_aluno = aluno
-                            break
-
-            if dados_aluno:
-                # Encontrou o aluno no CSV
-                identificacao = {
-                    'nome': dados_aluno['nome'],
-                    'matricula': ra,
-                    'turma': dados_aluno['turma']
-                }
-                print(f"✓ Aluno identificado: {dados_aluno['nome']} (RA: {ra})")
-            else:
-                # Fallback: usar nome do arquivo
-                identificacao = {
-                    'nome': f"{nome_pdf}_pagina_{page_num + 1}",
-                    'matricula': ra if ra else '',
-                    'turma': ''
-                }
-                if ra:
-                    print(f"⚠ RA {ra} encontrado mas não está no CSV")
+        if modo != 'sequencial':
+            print(f"⚙ Modo {modo} com {workers} worker(s)\n")
+        if memoria_mb:
+            print(f"💾 Modo streaming: orçamento de {memoria_mb} MB ({monitor.limite_mb:.0f} MB por "
+                  f"{'worker' if modo == 'processos' else 'processo'})\n")
+
+        leitor = LeitorFinalV2(num_questoes=roteador.opcoes_leitura(0)['num_questoes'])
+
+        # Páginas separadas por gabarito; nas provas com várias folhas, as folhas de cada
+        # aluno são juntadas antes da correção
+        separador = SeparadorGabaritos(roteador)
+        if len(roteador.gabaritos) == 1 and roteador.varias_folhas:
+            print(f"📑 Prova com {roteador.folhas(roteador.gabaritos[0])} folhas por aluno\n")
+
+        # Cache de leituras: páginas já lidas pulam direto para a correção
+        cache = CacheLeitura() if usar_cache else None
+        fila = FilaRevisao()
+
+        def buscar_cache(page_num):
+            hash_pagina = CacheLeitura.hash_pagina_pdf(pdf, pdf[page_num])
+            if not cache:
+                return hash_pagina, None, None
+            parametros = parametros_leitura(alternativas=leitor.alternativas, dpi_leitura=dpi_leitura,
+                                            dpi_codigos=dpi_codigos, **roteador.opcoes_leitura(page_num))
+            chave_cache = CacheLeitura.chave(hash_pagina, VERSAO_LEITOR, parametros)
+            return hash_pagina, chave_cache, cache.obter(chave_cache)
+
+        opcoes_pagina = roteador.opcoes_leitura
+        if modo == 'threads':
+            leituras = _leituras_threads(pdf, num_paginas, buscar_cache, leitor, dpi_leitura, dpi_codigos,
+                                         workers, opcoes_pagina, monitor.limite_mb)
+        elif modo == 'processos':
+            leituras = _leituras_processos(caminho_pdf, num_paginas, buscar_cache, leitor,
+                                           dpi_leitura, dpi_codigos, workers, opcoes_pagina, monitor.limite_mb, monitor)
+        else:
+            leituras = _leituras_sequencial(pdf, num_paginas, buscar_cache, leitor, dpi_leitura, dpi_codigos,
+                                            opcoes_pagina, monitor.limite_mb)
+
+        # Corrigir cada página, na ordem, conforme as leituras ficam prontas
+        nome_pdf = os.path.basename(caminho_pdf).replace('.pdf', '')
+        ignoradas = sem_gabarito = 0
+        # closing: um erro na correção encerra a leitura (threads e pools) antes de fechar o PDF
+        with EscritorRelatorios() as escritor, closing(leituras):
+            for page_num, hash_pagina, chave_cache, leitura in leituras:
+                print(f"\n{'='*70}")
+                print(f"PROCESSANDO PÁGINA {page_num + 1}/{num_paginas}")
+                print(f"{'='*70}")
+
+                monitor.registrar(leitura.pop('memoria', None))
+                if 'recortes' not in leitura:
+                    print("✓ Página já lida anteriormente (cache)")
+                elif cache:
+                    cache.salvar(chave_cache, dados_cache(leitura))
+
+                caminho, montador = None, None
+                if leitura.get('tipo_pagina', 'gabarito') != 'gabarito':
+                    ignoradas += 1
                 else:
-                    print(f"⚠ QR/Barcode não detectado, usando nome do arquivo")
-
-            # 6. Corrigir
-            print("Corrigindo prova...")
-            resultado = corretor.corrigir_prova(identificacao, respostas)
-
-            # 6.5 Adicionar informação de múltiplas marcações
-            resultado['questoes_multiplas_marcacoes'] = leitor.questoes_multiplas
-
-            # 7. Exibir resultado resumido
-            acertos = resultado['acertos']
-            total = resultado['total_questoes']
-            nota = resultado['nota']
+                    caminho, montador = separador.encaminhar(page_num, leitura)
+                    if caminho is None:
+                        sem_gabarito += 1
+                        continue
 
-            print(f"✓ Acertos: {acertos}/{total}")
-            print(f"🎯 Nota: {nota:.1f}/100")
-            if leitor.questoes_multiplas:
-                print(f"⚠️  Múltiplas marcações detectadas em: {leitor.questoes_multiplas}")
+                corrigir_pagina(leitura, page_num, nome_pdf, hash_pagina,
+                                roteador.corretor(caminho) if caminho else None, alunos_dict,
+                                caminho, escritor, fila, montador=montador)
 
-            # 8. Salvar relatório
-            relatorio_path = f"relatorios_correcao/{nome_pdf}_pag{page_num + 1:03d}_relatorio.json"
-            with open(relatorio_path, 'w') as f:
-                json.dump(resultado, f, indent=2)
-
-            print(f"✓ Relatório salvo: {relatorio_path}")
-
-            # 9. Gerar HTML
-            gerar_html_relatorio(relatorio_path)
+            # Provas que terminaram o PDF sem todas as folhas
+            for caminho, montador, prova in separador.pendentes():
+                print(f"\n{'='*70}")
+                corrigir_prova_montada(prova, montador, nome_pdf, roteador.corretor(caminho), alunos_dict,
+                                       caminho, escritor, fila)
 
         pdf.close()
 
         print(f"\n{'='*70}")
         print(f"✅ CONCLUÍDO! {num_paginas} páginas processadas")
+        if len(roteador.gabaritos) > 1:
+            for caminho, paginas in separador.paginas.items():
+                print(f"📑 {os.path.basename(caminho)}: {paginas} página(s)")
+        if sem_gabarito:
+            print(f"✗ {sem_gabarito} página(s) sem gabarito (código da prova desconhecido ou ilegível)")
+        if ignoradas:
+            print(f"⏭ {ignoradas} página(s) ignorada(s) pela triagem (em branco ou sem gabarito)")
+        if cache:
+            print(f"📦 Cache de leituras: {cache.acertos} acerto(s), {cache.faltas} falta(s) "
+                  f"(taxa de acerto {cache.taxa_acerto() * 100:.0f}%)")
+        if memoria_mb:
+            resumo = monitor.resumo()
+            print(f"💾 Pico de RSS: {resumo['pico_principal_mb']:.0f} MB no processo principal"
+                  + ''.join(f", {pico:.0f} MB no worker {pid}" for pid, pico in resumo['pico_por_worker_mb'].items()
+                            if pid != os.getpid()))
+            if resumo['liberacoes'] or resumo['renovacoes']:
+                print(f"💾 Limite atingido: {resumo['liberacoes']} liberação(ões) de memória, "
+                      f"{resumo['renovacoes']} renovação(ões) do pool")
         print(f"{'='*70}\n")
 
     except Exception as e:
@@ -371,13 +1235,34 @@ def corrigir_rapido(caminho_pdf, caminho_gabarito='gabarito_oficial.json'):
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Uso: python3 corrigir_rapido.py <arquivo.pdf> [gabarito.json]")
-        print("\nExemplo:")
-        print("  python3 corrigir_rapido.py pdfs_para_corrigir/Documento35.pdf")
-        print("  python3 corrigir_rapido.py pdfs_para_corrigir/Documento35.pdf gabaritos/prova_A.json")
-        sys.exit(1)
-
-    caminho_pdf = sys.argv[1]
-    caminho_gabarito = sys.argv[2] if len(sys.argv) > 2 else 'gabarito_oficial.json'
-    corrigir_rapido(caminho_pdf, caminho_gabarito)
+    parser = argparse.ArgumentParser(
+        description='Corrige todas as páginas de um PDF de gabaritos',
+        epilog='Exemplo: python3 corrigir_rapido.py pdfs_para_corrigir/Documento35.pdf gabaritos/prova_A.json\n'
+               '         python3 corrigir_rapido.py pilha.pdf --faixas 1-30=gabaritos/mat.json,31-60=gabaritos/port.json\n'
+               '         python3 corrigir_rapido.py pilha.pdf --por-codigo',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('pdf', help='PDF com os gabaritos escaneados')
+    parser.add_argument('gabarito', nargs='?', default=None,
+                        help='Gabarito oficial (JSON/CSV/TXT); com --faixas/--por-codigo, o das páginas restantes '
+                             '(padrão: gabarito_oficial.json, se não houver --faixas/--por-codigo)')
+    parser.add_argument('--faixas', default=None, help='Gabarito por faixa de páginas: 1-30=arquivo,31-60=arquivo')
+    parser.add_argument('--por-codigo', action='store_true',
+                        help='Gabarito de cada página pelo código da prova no QR (gabaritos/<código>.json)')
+    parser.add_argument('--modo', choices=MODOS_EXECUCAO, default=None,
+                        help=f'Execução das páginas (padrão: GABARITO_MODO ou {MODO_EXECUCAO})')
+    parser.add_argument('--workers', type=int, default=None, help='Threads/processos de leitura (padrão: CPUs)')
+    parser.add_argument('--sem-cache', action='store_true', help='Não usar o cache de leituras')
+    parser.add_argument('--memoria-mb', type=int, default=None,
+                        help='Orçamento de memória em MB (modo streaming para PDFs muito grandes; '
+                             'padrão: GABARITO_MEMORIA_MB)')
+    args = parser.parse_args()
+
+    try:
+        faixas = interpretar_faixas(args.faixas) if args.faixas else None
+    except ValueError as e:
+        parser.error(str(e))
+    gabarito = args.gabarito or (None if faixas or args.por_codigo else 'gabarito_oficial.json')
+
+    corrigir_rapido(args.pdf, gabarito, usar_cache=not args.sem_cache, modo=args.modo, workers=args.workers,
+                    faixas=faixas, por_codigo=args.por_codigo, memoria_mb=args.memoria_mb)
@@ -0,0 +1,175 @@
+"""
+Gravação Assíncrona de Relatórios
+Grava os relatórios JSON/HTML numa thread separada, em lotes, enquanto a leitura
+das próximas páginas continua
+"""
+
+import json
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from visualizar_relatorio import montar_html_relatorio
+
+
+class EscritorRelatorios:
+    """
+    Estágio de gravação com fila limitada
+
+    Cada lote grava e sincroniza os arquivos temporários, renomeia todos de forma atômica
+    e sincroniza os diretórios. Um relatório nunca fica pela metade: ou existe a versão
+    anterior ou a nova completa. Quando a fila enche, enviar() bloqueia e a leitura espera
+    o disco (memória limitada).
+
+    Um erro de gravação vale só para o lote em que aconteceu: cada relatório do lote recebe
+    o erro no seu depois, e os lotes seguintes são gravados normalmente.
+    """
+
+    def __init__(self, tamanho_lote: int = 8, tamanho_fila: int = 32):
+        """
+        Args:
+            tamanho_lote: Máximo de relatórios por lote (uma sincronização de diretório por lote)
+            tamanho_fila: Máximo de relatórios aguardando gravação
+        """
+        self.tamanho_lote = tamanho_lote
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._erro = None       # erro de um relatório sem depois, levantado em fechar()
+        self._thread = None
+        self.gravados = 0
+        self.falhas = 0
+        self.lotes = 0
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        self.fechar()
+        return False
+
+    def iniciar(self):
+        """Inicia a thread de gravação"""
+        self._thread = threading.Thread(target=self._executar, name='escritor-relatorios', daemon=True)
+        self._thread.start()
+
+    def enviar(self, caminho_json: str, resultado: Dict, depois: Optional[Callable] = None):
+        """
+        Agenda a gravação de um relatório (JSON + HTML)
+
+        Args:
+            caminho_json: Caminho final do relatório JSON (o HTML fica ao lado)
+            resultado: Resultado da correção
+            depois: Função chamada na thread de gravação quando o relatório estiver em disco,
+                como depois(), ou com o erro, como depois(erro), se a gravação falhar
+        """
+        self._fila.put((caminho_json, resultado, depois))
+
+    def fechar(self):
+        """
+        Espera gravar tudo o que está na fila e encerra a thread
+
+        Raises:
+            O erro de gravação de um relatório enviado sem depois (quem enviou com depois
+            já recebeu o erro nele)
+        """
+        if self._thread is None:
+            return
+        self._fila.put(None)
+        self._thread.join()
+        self._thread = None
+        erro, self._erro = self._erro, None
+        if erro:
+            raise erro
+
+    def _executar(self):
+        while True:
+            tarefa = self._fila.get()
+            if tarefa is None:
+                return
+
+            # Juntar o que já estiver esperando, até o tamanho do lote
+            lote = [tarefa]
+            fim = False
+            while len(lote) < self.tamanho_lote:
+                try:
+                    proxima = self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if proxima is None:
+                    fim = True
+                    break
+                lote.append(proxima)
+
+            try:
+                self._gravar_lote(lote)
+                erro = None
+            except Exception as e:
+                print(f"✗ Erro ao gravar {len(lote)} relatório(s): {e}")
+                self.falhas += len(lote)
+                erro = e
+
+            for _, _, depois in lote:
+                if depois is None:
+                    self._erro = self._erro or erro
+                    continue
+                try:
+                    if erro:
+                        depois(erro)
+                    else:
+                        depois()
+                except Exception as e:
+                    print(f"✗ Erro ao concluir relatório gravado: {e}")
+
+            if fim:
+                return
+
+    def _gravar_lote(self, lote: List):
+        """Grava um lote: temporários sincronizados, renomeações atômicas, sync dos diretórios"""
+        renomear = []
+        try:
+            for caminho_json, resultado, _ in lote:
+                caminho_html = caminho_json.replace('.json', '.html')
+                Path(caminho_json).parent.mkdir(parents=True, exist_ok=True)
+
+                renomear.append((caminho_json + '.tmp', caminho_json))
+                with open(caminho_json + '.tmp', 'w') as f:
+                    json.dump(resultado, f, indent=2)
+                    _sincronizar(f)
+                renomear.append((caminho_html + '.tmp', caminho_html))
+                with open(caminho_html + '.tmp', 'w', encoding='utf-8') as f:
+                    f.write(montar_html_relatorio(resultado))
+                    _sincronizar(f)
+        except Exception:
+            # Sem temporários esquecidos: os relatórios anteriores continuam valendo
+            for origem, _ in renomear:
+                if os.path.exists(origem):
+                    os.remove(origem)
+            raise
+
+        for origem, destino in renomear:
+            os.replace(origem, destino)
+        _sincronizar_diretorios({os.path.dirname(os.path.abspath(d)) for _, d in renomear})
+
+        self.gravados += len(lote)
+        self.lotes += 1
+        print(f"💾 {len(lote)} relatório(s) gravado(s): {', '.join(c for c, _, _ in lote)}")
+
+
+def _sincronizar(arquivo):
+    """Leva ao disco só o arquivo gravado (não o sistema de arquivos inteiro, como os.sync)"""
+    arquivo.flush()
+    os.fsync(arquivo.fileno())
+
+
+def _sincronizar_diretorios(pastas):
+    """Persiste as renomeações (entradas de diretório); não suportado no Windows"""
+    if os.name != 'posix':
+        return
+    for pasta in pastas:
+        fd = os.open(pasta, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,199 @@
+"""
+Fila de Revisão Humana
+Guarda as questões e páginas lidas com baixa confiança, com recortes pequenos das bolhas,
+para que o operador confira só esses itens em vez de reescanear o lote
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+
+from corretor import Corretor
+from visualizar_relatorio import gerar_html_relatorio
+
+
+class FilaRevisao:
+    """
+    Fila persistente em disco: um JSON por item em itens/ e os recortes em recortes/
+
+    O id de cada item vem do relatório e da questão, então corrigir de novo o mesmo PDF
+    substitui os itens antigos em vez de duplicá-los. Os recortes são nomeados pelo hash
+    da página, para serem reaproveitados quando a leitura vem do cache.
+    """
+
+    def __init__(self, pasta: str = 'fila_revisao'):
+        """
+        Args:
+            pasta: Diretório da fila
+        """
+        self.pasta = Path(pasta)
+        self.pasta_itens = self.pasta / 'itens'
+        self.pasta_recortes = self.pasta / 'recortes'
+        self.pasta_itens.mkdir(parents=True, exist_ok=True)
+        self.pasta_recortes.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def id_item(relatorio: str, questao: Optional[int] = None) -> str:
+        """Id estável de um item: nome do relatório + questão (ou 'pagina')"""
+        base = Path(relatorio).stem.replace('_relatorio', '')
+        return f"{base}_q{questao:03d}" if questao is not None else f"{base}_pagina"
+
+    def _gravar(self, item: Dict):
+        """Grava o item de forma atômica"""
+        caminho = self.pasta_itens / f"{item['id']}.json"
+        temporario = caminho.with_suffix('.tmp')
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(item, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, caminho)
+
+    def adicionar(self, item: Dict, recorte=None, nome_recorte: Optional[str] = None) -> str:
+        """
+        Adiciona (ou substitui) um item pendente
+
+        Args:
+            item: Dados do item (relatorio, gabarito, pagina, questao, motivo, scores, ...)
+            recorte: Imagem da região (array NumPy) a gravar, opcional
+            nome_recorte: Nome do arquivo do recorte em recortes/
+
+        Returns:
+            Id do item
+        """
+        item = dict(item)
+        item['id'] = self.id_item(item['relatorio'], item.get('questao'))
+        item['status'] = 'pendente'
+        item['criado_em'] = datetime.now().isoformat(timespec='seconds')
+
+        item['recorte'] = None
+        if nome_recorte:
+            caminho_recorte = self.pasta_recortes / nome_recorte
+            if recorte is not None and not caminho_recorte.exists():
+                parametros = [cv2.IMWRITE_JPEG_QUALITY, 70] if nome_recorte.endswith('.jpg') else []
+                cv2.imwrite(str(caminho_recorte), recorte, parametros)
+            if caminho_recorte.exists():
+                item['recorte'] = nome_recorte
+
+        self._gravar(item)
+        return item['id']
+
+    def remover_relatorio(self, relatorio: str):
+        """Remove os itens de um relatório (antes de corrigi-lo de novo, que o sobrescreve)"""
+        prefixo = self.id_item(relatorio)[:-len('pagina')]
+        for caminho in self.pasta_itens.glob(f"{prefixo}*.json"):
+            try:
+                caminho.unlink()
+            except FileNotFoundError:
+                pass
+
+    def limpar(self) -> int:
+        """Remove todos os itens e recortes da fila. Retorna quantos itens foram removidos"""
+        removidos = 0
+        for caminho in list(self.pasta_itens.glob('*.json')) + list(self.pasta_recortes.iterdir()):
+            try:
+                caminho.unlink()
+                removidos += caminho.suffix == '.json'
+            except FileNotFoundError:
+                pass
+        return removidos
+
+    def obter(self, id_item: str) -> Optional[Dict]:
+        """Retorna um item pelo id ou None"""
+        try:
+            with open(self.pasta_itens / f"{id_item}.json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def listar(self, status: Optional[str] = 'pendente') -> List[Dict]:
+        """Lista os itens (por padrão só os pendentes), dos mais antigos para os mais novos"""
+        itens = []
+        for caminho in self.pasta_itens.glob('*.json'):
+            try:
+                with open(caminho, 'r', encoding='utf-8') as f:
+                    item = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            if status is None or item.get('status') == status:
+                itens.append(item)
+
+        return sorted(itens, key=lambda i: (i.get('criado_em', ''), i['id']))
+
+    def caminho_recorte(self, nome: str) -> Optional[Path]:
+        """Caminho de um recorte, sem permitir sair da pasta de recortes"""
+        caminho = self.pasta_recortes / Path(nome).name
+        return caminho if caminho.exists() else None
+
+    def resolver(self, id_item: str, dados: Dict) -> Dict:
+        """
+        Registra a decisão do operador e atualiza o relatório da página
+
+        Args:
+            id_item: Id do item
+            dados: Para questões, {'resposta': 'A'} ('' = em branco);
+                   para páginas, {'nome': ..., 'matricula': ..., 'respostas': {questao: resposta}}
+                   (todos opcionais; respostas das questões não localizadas)
+
+        Returns:
+            Item atualizado
+        """
+        item = self.obter(id_item)
+        if item is None:
+            raise KeyError(id_item)
+
+        atualizar_relatorio(item, dados)
+
+        item['status'] = 'resolvido'
+        item['resolucao'] = dados
+        item['resolvido_em'] = datetime.now().isoformat(timespec='seconds')
+        self._gravar(item)
+        return item
+
+
+def atualizar_relatorio(item: Dict, dados: Dict):
+    """Aplica a decisão da revisão ao relatório JSON, recorrige a página e refaz o HTML"""
+    caminho = item['relatorio']
+    with open(caminho, 'r', encoding='utf-8') as f:
+        relatorio = json.load(f)
+
+    identificacao = relatorio['identificacao']
+    respostas = {int(q): r for q, r in relatorio.get('respostas_completas', {}).items() if r}
+    revisao = dict(relatorio.get('questoes_revisao', {}))
+    multiplas = list(relatorio.get('questoes_multiplas_marcacoes', []))
+
+    questao = item.get('questao')
+    if questao is not None:
+        resposta = (dados.get('resposta') or '').strip().upper()
+        if resposta:
+            respostas[questao] = resposta
+        else:
+            respostas.pop(questao, None)
+        revisao.pop(str(questao), None)
+        if questao in multiplas:
+            multiplas.remove(questao)
+    else:
+        if dados.get('nome'):
+            identificacao['nome'] = dados['nome'].strip()
+        if dados.get('matricula'):
+            identificacao['matricula'] = dados['matricula'].strip()
+        for q, resposta in (dados.get('respostas') or {}).items():
+            if resposta and resposta.strip():
+                respostas[int(q)] = resposta.strip().upper()
+        revisao = {q: m for q, m in revisao.items() if m != 'nao_localizada'}
+
+    corretor = Corretor()
+    if not corretor.carregar_gabarito_oficial(item['gabarito']):
+        raise ValueError(f"Gabarito não encontrado: {item['gabarito']}")
+
+    resultado = corretor.corrigir_prova(identificacao, respostas)
+    resultado['questoes_multiplas_marcacoes'] = multiplas
+    resultado['questoes_revisao'] = revisao
+
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w') as f:
+        json.dump(resultado, f, indent=2)
+    os.replace(temporario, caminho)
+
+    gerar_html_relatorio(caminho, resultado)
@@ -0,0 +1,292 @@
+"""
+Folhas de Prova
+Divisão das questões entre as folhas e o conteúdo do QR Code de cada folha (aluno, turma,
+prova e número da folha), compartilhados entre o gerador (que imprime) e a correção (que
+lê, identifica e junta as folhas de cada aluno)
+"""
+
+import hashlib
+import math
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# Questões que cabem numa folha na grade que o leitor conhece (2 colunas de 20 linhas)
+QUESTOES_POR_FOLHA = 40
+
+
+def dividir_questoes(num_questoes: int) -> List[Tuple[int, int]]:
+    """
+    Divide as questões da prova entre as folhas, o mais equilibrado possível
+    (90 questões = 3 folhas de 30, e não 40 + 40 + 10)
+
+    Returns:
+        [(primeira questão, quantidade), ...], uma entrada por folha
+    """
+    folhas = max(1, math.ceil(num_questoes / QUESTOES_POR_FOLHA))
+    por_folha = math.ceil(num_questoes / folhas)
+    blocos = []
+    for inicio in range(1, num_questoes + 1, por_folha):
+        blocos.append((inicio, min(por_folha, num_questoes - inicio + 1)))
+    return blocos or [(1, 0)]
+
+
+def id_prova(codigo_prova: Optional[str], titulo: str, num_questoes: int) -> str:
+    """
+    Identificador curto da prova para o QR: o código da prova (só letras, números e -_.)
+    ou, sem código, um hash do título e do número de questões
+    """
+    if codigo_prova:
+        return re.sub(r'[^\w.-]', '', str(codigo_prova))[:16]
+    return hashlib.sha1(f"{titulo}|{num_questoes}".encode()).hexdigest()[:6]
+
+
+# Prefixo do conteúdo estruturado do QR (muda se os campos mudarem)
+VERSAO_QR = 'G1'
+
+# Tamanho máximo da turma no QR (o nome completo, ex: '8° ANO A TARDE ANUAL', cabe)
+MAX_TURMA_QR = 24
+
+
+def _soma_verificacao(texto: str) -> str:
+    """4 dígitos hexadecimais do CRC-32 do conteúdo"""
+    return f"{zlib.crc32(texto.encode('utf-8')) & 0xFFFF:04X}"
+
+
+def codificar_qr(ra: Optional[str], prova: str, pagina: int = 1, total_paginas: int = 1,
+                 turma: Optional[str] = None) -> str:
+    """
+    Conteúdo do QR de uma folha: 'G1|RA|TURMA|PROVA|PAGINA/TOTAL|CRC'
+
+    Leva tudo o que a correção precisa para identificar a folha sem consultar nada: RA,
+    turma, prova (gabarito) e número da folha, com versão e soma de verificação para que
+    um QR truncado ou de outra origem seja descartado. RA e turma podem vir vazios
+    (folha impressa sem aluno).
+    """
+    turma = re.sub(r'\s+', ' ', (turma or '').replace('|', ' ')).strip()[:MAX_TURMA_QR]
+    corpo = f"{VERSAO_QR}|{ra or ''}|{turma}|{prova}|{pagina}/{total_paginas}"
+    return f"{corpo}|{_soma_verificacao(corpo)}"
+
+
+def decodificar_qr(texto: str) -> Optional[Dict]:
+    """
+    Interpreta o conteúdo lido de um QR/código de barras
+
+    Aceita o conteúdo estruturado (codificar_qr) e o RA puro dos gabaritos antigos e do
+    código de barras.
+
+    Returns:
+        {'ra', 'turma', 'prova', 'pagina', 'paginas'} ou None se não for de um gabarito
+    """
+    texto = (texto or '').strip()
+    if texto.isdigit() and 10 <= len(texto) <= 12:
+        return {'ra': texto, 'turma': None, 'prova': None, 'pagina': 1, 'paginas': 1}
+
+    partes = texto.split('|')
+    if len(partes) != 6 or partes[0] != VERSAO_QR:
+        return None
+    corpo, soma = texto.rsplit('|', 1)
+    if soma != _soma_verificacao(corpo):
+        return None
+
+    _, ra, turma, prova, folha, _ = partes
+    m = re.fullmatch(r'(\d{1,2})/(\d{1,2})', folha)
+    if not m or (ra and not (ra.isdigit() and 10 <= len(ra) <= 12)) or not prova:
+        return None
+
+    pagina, paginas = int(m.group(1)), int(m.group(2))
+    if not 1 <= pagina <= paginas:
+        return None
+    return {'ra': ra or None, 'turma': turma or None, 'prova': prova, 'pagina': pagina, 'paginas': paginas}
+
+
+def questoes_da_folha(num_questoes: int, codigo: Optional[Dict]) -> int:
+    """
+    Quantas questões a folha tem, pelo número da folha lido no QR
+
+    Sem QR (ou com um QR de outra divisão) supõe a primeira folha, que é a maior; a
+    numeração é acertada depois pelo MontadorProvas.
+    """
+    blocos = dividir_questoes(num_questoes)
+    codigo = codigo or {}
+    if codigo.get('pagina') and codigo.get('paginas') == len(blocos):
+        return blocos[codigo['pagina'] - 1][1]
+    return blocos[0][1]
+
+
+def questoes_do_layout(layout: Dict) -> List[List[int]]:
+    """
+    Números impressos das questões de cada folha de um gabarito personalizado
+    (GeradorGabarito.layout_secoes), uma lista por folha
+    """
+    total = layout.get('paginas') or 1 + max((q['pagina'] for q in layout['questoes']), default=0)
+    folhas = [[] for _ in range(total)]
+    for q in layout['questoes']:
+        folhas[q['pagina']].append(q['questao'])
+    return [sorted(questoes) for questoes in folhas]
+
+
+def _numeracao(quantidade_lida: int, primeira: int, quantidade: int) -> Dict[str, str]:
+    """
+    Converte a numeração local da leitura (1..quantidade_lida, em 2 colunas) para a
+    numeração da prova, na folha que começa em 'primeira' e tem 'quantidade' questões
+    """
+    por_coluna_lida = (quantidade_lida + 1) // 2
+    por_coluna = (quantidade + 1) // 2
+    mapa = {}
+    for q in range(1, quantidade_lida + 1):
+        coluna, linha = (0, q - 1) if q <= por_coluna_lida else (1, q - por_coluna_lida - 1)
+        local = linha + 1 + coluna * por_coluna
+        if linha < por_coluna and local <= quantidade:
+            mapa[str(q)] = str(primeira + local - 1)
+    return mapa
+
+
+class MontadorProvas:
+    """
+    Junta as folhas de cada aluno numa prova com várias folhas
+
+    As folhas são ligadas pelo QR (RA + prova); uma folha sem QR legível é tida como a
+    continuação da folha anterior do PDF. A prova fica pronta quando chegam todas as folhas;
+    as que faltarem no fim do arquivo saem em pendentes(), com as questões das folhas
+    ausentes marcadas como não localizadas.
+    """
+
+    def __init__(self, num_questoes: int, layout: Optional[Dict] = None):
+        """
+        Args:
+            num_questoes: Número de questões da prova (todas as folhas)
+            layout: Layout de um gabarito personalizado: as folhas são as páginas do layout
+                e a leitura de cada uma já vem na numeração impressa
+        """
+        self.questoes_layout = questoes_do_layout(layout) if layout else None
+        if self.questoes_layout:
+            self.blocos = [(min(questoes, default=1), len(questoes)) for questoes in self.questoes_layout]
+        else:
+            self.blocos = dividir_questoes(num_questoes)
+        self._abertas = {}      # {chave: prova em montagem}, na ordem da primeira folha
+        self._ultima = None     # chave da última folha recebida
+
+    def adicionar(self, leitura: Dict, page_num: int, hash_pagina: str, depois=None) -> Optional[Dict]:
+        """
+        Recebe uma folha lida (na ordem das páginas do PDF)
+
+        Args:
+            leitura: Leitura da página, com 'revisao' e 'folha'
+            depois: Função a chamar quando o relatório da prova estiver em disco
+                (recebe o erro, se a gravação falhar)
+
+        Returns:
+            A prova, se esta folha a completou, ou None
+        """
+        folha = leitura.get('folha') or {}
+        ra, prova_id, pagina = leitura.get('ra'), folha.get('prova'), folha.get('pagina')
+        if folha.get('paginas') != len(self.blocos):
+            pagina = None
+        anterior = self._abertas.get(self._ultima)
+
+        chave = None
+        if pagina is None:
+            # Sem QR: continuação da folha anterior, se a prova dela ainda espera a seguinte
+            if anterior and anterior['ultima'] < len(self.blocos) and anterior['ultima'] + 1 not in anterior['folhas']:
+                chave, pagina = self._ultima, anterior['ultima'] + 1
+            else:
+                pagina = 1
+        elif ra and (ra, prova_id) in self._abertas:
+            chave = (ra, prova_id)
+        elif (anterior and anterior['prova'] in (None, prova_id) and anterior['ra'] in (None, ra)
+              and anterior['ultima'] + 1 == pagina and pagina not in anterior['folhas']):
+            # Continuação da prova anterior, que não tinha QR (ou tinha QR sem RA)
+            chave = self._ultima
+        elif ra:
+            chave = (ra, prova_id)
+
+        if chave is None:
+            chave = (ra, prova_id, page_num)
+
+        prova = self._abertas.get(chave)
+        if prova is None:
+            prova = self._abertas[chave] = {'ra': ra, 'turma': None, 'prova': prova_id, 'folhas': {},
+                                            'depois': [], 'ultima': 0}
+        # Folha repetida (reescaneada): vale a mais recente
+        prova['folhas'][pagina] = (page_num, hash_pagina, leitura)
+        prova['ultima'] = pagina
+        prova['ra'] = prova['ra'] or ra
+        prova['turma'] = prova['turma'] or leitura.get('turma')
+        prova['prova'] = prova['prova'] or prova_id
+        if prova['ra'] and chave != (prova['ra'], prova['prova']) and (prova['ra'], prova['prova']) not in self._abertas:
+            # A prova começou sem QR legível: passa a ser encontrada pelo RA
+            del self._abertas[chave]
+            chave = (prova['ra'], prova['prova'])
+            self._abertas[chave] = prova
+        if depois:
+            prova['depois'].append(depois)
+
+        if len(prova['folhas']) == len(self.blocos):
+            del self._abertas[chave]
+            self._ultima = None
+            return prova
+
+        self._ultima = chave
+        return None
+
+    def aguardando(self) -> bool:
+        """Se a prova da última folha recebida ainda espera a folha seguinte"""
+        anterior = self._abertas.get(self._ultima)
+        return bool(anterior) and anterior['ultima'] < len(self.blocos)
+
+    def pendentes(self) -> List[Dict]:
+        """Entrega as provas incompletas (fim do arquivo) e esvazia o montador"""
+        provas = sorted(self._abertas.values(), key=lambda p: min(f[0] for f in p['folhas'].values()))
+        self._abertas.clear()
+        self._ultima = None
+        return provas
+
+    def juntar(self, prova: Dict) -> Dict:
+        """
+        Junta as leituras das folhas na numeração da prova
+
+        Returns:
+            {'ra', 'turma', 'respostas', 'confianca', 'revisao', 'questoes_multiplas', 'faltando',
+             'folhas': [(página do PDF, hash, leitura da folha na numeração da prova), ...]}
+        """
+        total = {'ra': prova['ra'], 'turma': prova['turma'], 'respostas': {}, 'confianca': {}, 'revisao': {}, 'folhas': [], 'faltando': []}
+
+        for pagina, (primeira, quantidade) in enumerate(self.blocos, start=1):
+            if self.questoes_layout:
+                questoes = self.questoes_layout[pagina - 1]
+            else:
+                questoes = range(primeira, primeira + quantidade)
+            if pagina not in prova['folhas']:
+                total['faltando'].append(pagina)
+                for q in questoes:
+                    total['revisao'][str(q)] = 'nao_localizada'
+                continue
+
+            page_num, hash_pagina, leitura = prova['folhas'][pagina]
+            if self.questoes_layout:
+                # Leitura pelo layout: as questões já têm o número impresso
+                mapa = {str(q): str(q) for q in questoes}
+            else:
+                quantidade_lida = (leitura.get('folha') or {}).get('quantidade') or quantidade
+                mapa = _numeracao(quantidade_lida, primeira, quantidade)
+
+            recortes = leitura.get('recortes') or {}
+            vista = {
+                'ra': prova['ra'],
+                'respostas': {mapa[q]: r for q, r in leitura['respostas'].items() if q in mapa},
+                'confianca': {mapa[q]: c for q, c in leitura['confianca'].items() if q in mapa},
+                'revisao': {mapa[q]: m for q, m in leitura['revisao'].items() if q in mapa},
+                'recortes': {mapa.get(str(q), q): r for q, r in recortes.items() if q == 'pagina' or str(q) in mapa}
+            }
+            # Questões da folha que a leitura não numerou (grade incompleta)
+            for q in questoes:
+                if str(q) not in vista['confianca'] and str(q) not in vista['revisao']:
+                    vista['revisao'][str(q)] = 'nao_localizada'
+
+            for campo in ('respostas', 'confianca', 'revisao'):
+                total[campo].update(vista[campo])
+            total['folhas'].append((page_num, hash_pagina, vista))
+
+        total['questoes_multiplas'] = sorted(int(q) for q, m in total['revisao'].items() if m == 'multipla')
+        return total
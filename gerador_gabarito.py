@@ -8,11 +8,61 @@ from reportlab.lib.units import mm, cm
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from datetime import datetime
+from functools import lru_cache
+import json
+import os
 import qrcode
-from io import BytesIO
-from PIL import Image
 import barcode
-from barcode.writer import ImageWriter
+
+from folhas_prova import codificar_qr, dividir_questoes, id_prova
+
+
+def _agrupar_modulos(modulos):
+    """Agrupa módulos escuros consecutivos em (início, comprimento)"""
+    sequencias = []
+    inicio = None
+    for i, escuro in enumerate(modulos):
+        if escuro and inicio is None:
+            inicio = i
+        elif not escuro and inicio is not None:
+            sequencias.append((inicio, i - inicio))
+            inicio = None
+    if inicio is not None:
+        sequencias.append((inicio, len(modulos) - inicio))
+    return tuple(sequencias)
+
+
+@lru_cache(maxsize=4096)
+def _modulos_barcode(dados):
+    """
+    Codifica os dados em Code128 (memoizado por conteúdo)
+
+    Returns:
+        (total de módulos, barras como tuplas (início, largura))
+    """
+    modulos = barcode.get_barcode('code128', dados).build()[0]
+    return len(modulos), _agrupar_modulos([m == '1' for m in modulos])
+
+
+@lru_cache(maxsize=4096)
+def _modulos_qrcode(dados):
+    """
+    Codifica os dados em QR Code (memoizado por conteúdo)
+
+    Returns:
+        (tamanho da matriz em módulos, tuplas (linha, início, comprimento) dos módulos escuros)
+    """
+    qr = qrcode.QRCode(version=1, border=1)
+    qr.add_data(dados)
+    qr.make(fit=True)
+    matriz = qr.get_matrix()
+
+    sequencias = tuple(
+        (linha, inicio, comprimento)
+        for linha, modulos in enumerate(matriz)
+        for inicio, comprimento in _agrupar_modulos(modulos)
+    )
+    return len(matriz), sequencias
 
 
 class GeradorGabarito:
@@ -30,6 +80,27 @@ class GeradorGabarito:
         self.tamanho_pagina = tamanho_pagina
         self.largura, self.altura = tamanho_pagina
         self.c = canvas.Canvas(nome_arquivo, pagesize=tamanho_pagina)
+        self._formularios = None  # Nomes dos form XObjects quando gravando o layout fixo
+        self.pagina_atual = 0  # Página da folha que está sendo desenhada (0 = primeira)
+
+        # Posição de cada círculo desenhado (em pontos, origem no canto inferior esquerdo):
+        # [{'questao', 'tipo', 'pagina', 'raio', 'bolhas': [(alternativa, x, y), ...]}, ...]
+        self.layout_bolhas = []
+
+    def _nova_pagina(self):
+        """Inicia uma nova página (ou um novo formulário, se estiver gravando o layout fixo)"""
+        self.pagina_atual += 1
+        if self._formularios is not None:
+            self.c.endForm()
+            self._iniciar_formulario()
+        else:
+            self.c.showPage()
+
+    def _iniciar_formulario(self):
+        """Começa a gravar a próxima página do layout fixo como form XObject"""
+        nome = f"layout_fixo_{len(self._formularios)}"
+        self._formularios.append(nome)
+        self.c.beginForm(nome)
 
     def _desenhar_marcadores_ocr(self):
         """Desenha marcadores OCR (perspectiva, calibração, marcas de corte)"""
@@ -185,14 +256,33 @@ class GeradorGabarito:
         return y_base - 0.5*cm  # Retorna a posição Y para as próximas questões
 
     def _desenhar_questoes_multipla_escolha(self, num_questoes, alternativas, y_inicial,
-                                           colunas=2, tamanho_circulo=0.3*cm):
+                                           colunas=2, tamanho_circulo=0.3*cm, primeira=1):
         """
         Desenha as questões de múltipla escolha com instruções
 
+        Com 2 colunas, provas com mais de QUESTOES_POR_FOLHA questões são divididas em
+        folhas equilibradas (dividir_questoes), cada uma com a grade completa que o leitor
+        conhece; a correção junta as folhas pelo QR Code.
+
         Args:
             num_questoes: Número total de questões
             alternativas: Lista de alternativas (ex: ['A', 'B', 'C', 'D', 'E'])
+            primeira: Número impresso na primeira questão (seções seguintes de um gabarito
+                personalizado continuam a numeração)
         """
+        blocos = dividir_questoes(num_questoes) if colunas == 2 else [(1, num_questoes)]
+        for indice, (inicio, quantidade) in enumerate(blocos):
+            if indice > 0:
+                self._nova_pagina()
+                self._desenhar_cabecalho(titulo='GABARITO DE PROVA (continuação)')
+                y_inicial = self.altura - 5*cm
+            y_final = self._desenhar_bloco_questoes(primeira + inicio - 1, quantidade, alternativas, y_inicial,
+                                                    colunas, tamanho_circulo)
+        return y_final
+
+    def _desenhar_bloco_questoes(self, primeira, num_questoes, alternativas, y_inicial,
+                                 colunas, tamanho_circulo):
+        """Desenha as questões primeira..primeira+num_questoes-1 em colunas numa folha"""
         # Instruções
         self.c.setFont("Helvetica-Bold", 10)
         self.c.drawCentredString(self.largura / 2, y_inicial, "RESPOSTAS - Preencha completamente o círculo")
@@ -220,8 +310,8 @@ class GeradorGabarito:
 
         for col in range(colunas):
             x_base = margem_lateral + col * (largura_questao + 2.5*cm)
-            questao_inicial = col * questoes_por_coluna + 1
-            questao_final = min((col + 1) * questoes_por_coluna, num_questoes)
+            questao_inicial = primeira + col * questoes_por_coluna
+            questao_final = primeira + min((col + 1) * questoes_por_coluna, num_questoes) - 1
 
             y_temp = y
 
@@ -232,6 +322,7 @@ class GeradorGabarito:
 
                 # Alternativas
                 x_alt = x_base + 1.3*cm
+                bolhas = []
                 for alt in alternativas:
                     # Círculo com borda mais grossa para melhor detecção
                     self.c.setLineWidth(1.5)  # Borda mais grossa
@@ -242,20 +333,26 @@ class GeradorGabarito:
                     # Letra
                     self.c.setFont("Helvetica", 7)
                     self.c.drawCentredString(x_alt, y_temp + 0.1*cm, alt)
+                    bolhas.append((alt, x_alt, y_temp + 0.2*cm))
                     x_alt += 1.3*cm  # Espaçamento entre círculos
 
+                self.layout_bolhas.append({
+                    'questao': q, 'tipo': 'multipla_escolha', 'pagina': self.pagina_atual,
+                    'raio': tamanho_circulo, 'bolhas': bolhas
+                })
+
                 y_temp -= 0.7*cm  # Espaçamento entre linhas
 
                 # Verificar se precisa de nova página
                 if y_temp < 3*cm and q < questao_final:
-                    self.c.showPage()
+                    self._nova_pagina()
                     self._desenhar_cabecalho(titulo='GABARITO DE PROVA (continuação)')
                     y_temp = self.altura - 5*cm
 
         return y_temp
 
-    def _desenhar_questoes_verdadeiro_falso(self, num_questoes, y_inicial, colunas=2):
-        """Desenha questões de verdadeiro ou falso"""
+    def _desenhar_questoes_verdadeiro_falso(self, num_questoes, y_inicial, colunas=2, primeira=1):
+        """Desenha questões de verdadeiro ou falso, numeradas a partir de primeira"""
         self.c.setFont("Helvetica-Bold", 11)
         self.c.drawString(2*cm, y_inicial, "VERDADEIRO (V) ou FALSO (F)")
 
@@ -265,8 +362,8 @@ class GeradorGabarito:
 
         for col in range(colunas):
             x_base = 2*cm + col * largura_coluna
-            questao_inicial = col * questoes_por_coluna + 1
-            questao_final = min((col + 1) * questoes_por_coluna, num_questoes)
+            questao_inicial = primeira + col * questoes_por_coluna
+            questao_final = primeira + min((col + 1) * questoes_por_coluna, num_questoes) - 1
 
             y_temp = y
 
@@ -285,79 +382,63 @@ class GeradorGabarito:
                 self.c.circle(x_f, y_temp + 0.15*cm, 0.4*cm, stroke=1, fill=0)
                 self.c.drawCentredString(x_f, y_temp, "F")
 
+                self.layout_bolhas.append({
+                    'questao': q, 'tipo': 'verdadeiro_falso', 'pagina': self.pagina_atual,
+                    'raio': 0.4*cm, 'bolhas': [('V', x_v, y_temp + 0.15*cm), ('F', x_f, y_temp + 0.15*cm)]
+                })
+
                 y_temp -= 0.7*cm
 
         return y_temp
 
     def _adicionar_qrcode(self, dados, x, y, tamanho=2*cm):
-        """Adiciona um QR Code ao gabarito"""
+        """Adiciona um QR Code ao gabarito (desenhado como vetor, módulo a módulo)"""
         try:
-            qr = qrcode.QRCode(version=1, box_size=10, border=1)
-            qr.add_data(dados)
-            qr.make(fit=True)
-
-            img = qr.make_image(fill_color="black", back_color="white")
-
-            # Converter para formato que o ReportLab aceita
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            buffer.seek(0)
-
-            # Criar objeto ImageReader do ReportLab
-            from reportlab.lib.utils import ImageReader
-            img_reader = ImageReader(buffer)
-
-            self.c.drawImage(img_reader, x, y, width=tamanho, height=tamanho)
+            num_modulos, sequencias = _modulos_qrcode(str(dados))
+            modulo = tamanho / num_modulos
+
+            # Todos os módulos num único path (um só preenchimento no PDF)
+            path = self.c.beginPath()
+            for linha, inicio, comprimento in sequencias:
+                path.rect(x + inicio * modulo, y + tamanho - (linha + 1) * modulo,
+                          comprimento * modulo, modulo)
+            self.c.setFillColorRGB(0, 0, 0)
+            self.c.drawPath(path, stroke=0, fill=1)
         except Exception as e:
             # Se falhar, apenas não adiciona o QR code
             print(f"Aviso: Não foi possível adicionar QR code: {e}")
 
-    def _adicionar_barcode(self, dados, x, y, altura=1.2*cm):
-        """Adiciona um código de barras (Code128) ao gabarito como backup"""
+    def _adicionar_barcode(self, dados, x, y, altura=1.2*cm, largura=4*cm):
+        """Adiciona um código de barras (Code128) ao gabarito como backup (desenhado como vetor)"""
         try:
-            import tempfile
-            import os as os_module
-
             # Gerar código de barras (usar apenas números e caracteres válidos)
             dados_barcode = str(dados).replace("|", "").replace(" ", "")[:20]  # Limitar a 20 caracteres
 
-            # Criar arquivo temporário
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-                tmp_path = tmp.name
-
-            try:
-                # Gerar barcode com alta resolução (300 DPI)
-                writer = ImageWriter()
-                writer.dpi = 300  # Alta resolução
-                barcode_instance = barcode.get_barcode('code128', dados_barcode, writer=writer)
-                save_path = tmp_path.replace('.png', '')
-                barcode_instance.save(save_path)
-
-                # O arquivo real tem a extensão .png adicionada
-                png_path = save_path + '.png'
-
-                if os_module.path.exists(png_path):
-                    # Carregar a imagem
-                    from reportlab.lib.utils import ImageReader
-                    img_reader = ImageReader(png_path)
-
-                    # Desenhar o código de barras
-                    self.c.drawImage(img_reader, x, y, width=4*cm, height=altura)
-
-                    # Limpar arquivo PNG
-                    os_module.remove(png_path)
-            except Exception as e:
-                pass
+            num_modulos, barras = _modulos_barcode(dados_barcode)
+
+            # Zona de silêncio de 6.5 módulos de cada lado (igual ao ImageWriter)
+            modulo = largura / (num_modulos + 13)
+            x_barras = x + 6.5 * modulo
+
+            # Barras na parte de cima, texto legível embaixo
+            altura_texto = min(0.35*cm, altura * 0.3)
+            altura_barras = altura - altura_texto
+
+            path = self.c.beginPath()
+            for inicio, largura_barra in barras:
+                path.rect(x_barras + inicio * modulo, y + altura_texto,
+                          largura_barra * modulo, altura_barras)
+            self.c.setFillColorRGB(0, 0, 0)
+            self.c.drawPath(path, stroke=0, fill=1)
+
+            self.c.setFont("Courier", altura_texto * 0.8)
+            self.c.drawCentredString(x + largura / 2, y + altura_texto * 0.15, dados_barcode)
         except Exception as e:
             # Se falhar, apenas não adiciona o código de barras
             pass
 
     def _desenhar_rodape(self, nome_aluno=None, codigo_prova=None, ra_aluno=None):
         """Desenha o rodapé do gabarito com QR Code, assinatura e nome do aluno"""
-        # QR Code (lado esquerdo) - contém apenas o RA do aluno
-        if ra_aluno:
-            self._adicionar_qrcode(ra_aluno, 0.8*cm, 0.8*cm, 1.5*cm)
-
         # Campo de assinatura (centro/direita)
         x_assinatura = self.largura - 8*cm
         y_assinatura = 2.0*cm
@@ -368,16 +449,29 @@ class GeradorGabarito:
         # Linha para assinatura (abaixo do texto)
         self.c.line(x_assinatura, y_assinatura, x_assinatura + 6*cm, y_assinatura)
 
-        # Nome do aluno abaixo da linha de assinatura (com espaço maior)
-        if nome_aluno:
-            self.c.setFont("Helvetica", 7)
-            self.c.drawCentredString(x_assinatura + 3*cm, y_assinatura - 0.8*cm, nome_aluno.upper())
-
         # Data de geração (centro inferior)
         self.c.setFont("Helvetica", 7)
         self.c.drawCentredString(self.largura / 2, 0.5*cm,
                          f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
 
+        # QR Code e nome do aluno
+        self._desenhar_dados_aluno_rodape(nome_aluno, ra_aluno)
+
+    def _desenhar_dados_aluno_rodape(self, nome_aluno=None, ra_aluno=None, conteudo_qr=None):
+        """Desenha a parte do rodapé que muda a cada aluno (QR Code e nome)"""
+        # QR Code (lado esquerdo) - RA, turma, prova e número da folha
+        # (ver folhas_prova.codificar_qr) ou só o RA
+        conteudo_qr = conteudo_qr or ra_aluno
+        if conteudo_qr:
+            self._adicionar_qrcode(conteudo_qr, 0.8*cm, 0.8*cm, 2*cm)
+
+        # Nome do aluno abaixo da linha de assinatura (com espaço maior)
+        if nome_aluno:
+            x_assinatura = self.largura - 8*cm
+            y_assinatura = 2.0*cm
+            self.c.setFont("Helvetica", 7)
+            self.c.drawCentredString(x_assinatura + 3*cm, y_assinatura - 0.8*cm, nome_aluno.upper())
+
     def gerar_gabarito_padrao(self, num_questoes=30, alternativas=['A', 'B', 'C', 'D', 'E'],
                              titulo='GABARITO DE PROVA', disciplina=None, professor=None,
                              codigo_prova=None):
@@ -425,6 +519,13 @@ class GeradorGabarito:
         """
         Gera um gabarito com configuração personalizada
 
+        As questões são numeradas em sequência por todas as seções (múltipla escolha 1-20,
+        verdadeiro ou falso 21-30), para que um único gabarito oficial corrija a prova. A
+        posição de cada bolha é gravada junto do PDF (<nome>.layout.json): o leitor usa esse
+        layout para ler as seções mistas numa única passada (LeitorFinalV2.ler(layout=...)).
+        Cada folha leva o próprio QR (RA, turma, prova e número da folha), que diz ao leitor
+        qual página do layout ela é e à correção como juntar as folhas do aluno.
+
         Args:
             configuracao: Dicionário com as configurações
                 {
@@ -438,14 +539,26 @@ class GeradorGabarito:
                             'colunas': int (opcional)
                         }
                     ],
-                    'codigo_prova': str (opcional)
+                    'codigo_prova': str (opcional),
+                    'ra_aluno': str (opcional: código de barras e RA no QR de cada folha),
+                    'nome_aluno': str (opcional),
+                    'turma': str (opcional)
                 }
+
+        Returns:
+            Layout das seções (ver layout_secoes)
         """
+        # As páginas são gravadas como form XObjects: o QR de cada folha leva o total de
+        # folhas, que só se conhece depois de desenhar todas as seções
+        self._formularios = []
+        self._iniciar_formulario()
+
         # Cabeçalho
         self._desenhar_cabecalho(
             configuracao.get('titulo', 'GABARITO DE PROVA'),
             configuracao.get('info_adicional'),
-            configuracao.get('codigo_prova')
+            configuracao.get('codigo_prova'),
+            configuracao.get('ra_aluno')
         )
 
         # Campos de identificação
@@ -462,6 +575,7 @@ class GeradorGabarito:
 
         # Processar seções
         y -= 1.5*cm
+        primeira = 1
         for secao in configuracao.get('secoes', []):
             tipo = secao.get('tipo', 'multipla_escolha')
             num_questoes = secao.get('num_questoes', 10)
@@ -470,20 +584,144 @@ class GeradorGabarito:
                 alternativas = secao.get('alternativas', ['A', 'B', 'C', 'D', 'E'])
                 colunas = secao.get('colunas', 2)
                 y = self._desenhar_questoes_multipla_escolha(
-                    num_questoes, alternativas, y, colunas
+                    num_questoes, alternativas, y, colunas, primeira=primeira
                 )
             elif tipo == 'verdadeiro_falso':
                 colunas = secao.get('colunas', 2)
-                y = self._desenhar_questoes_verdadeiro_falso(num_questoes, y, colunas)
+                y = self._desenhar_questoes_verdadeiro_falso(num_questoes, y, colunas, primeira)
+            else:
+                continue
 
+            primeira += num_questoes
             y -= 1*cm
 
-        # Rodapé
+        # Rodapé (assinatura) na última folha
         self._desenhar_rodape()
+        self.c.endForm()
+        formularios, self._formularios = self._formularios, None
+
+        # QR de cada folha, como nas folhas em lote (RA vazio numa folha sem aluno)
+        titulo = configuracao.get('titulo', 'GABARITO DE PROVA')
+        prova = id_prova(configuracao.get('codigo_prova'), titulo, primeira - 1)
+        for idx, nome_formulario in enumerate(formularios):
+            self.c.doForm(nome_formulario)
+            self._desenhar_dados_aluno_rodape(
+                configuracao.get('nome_aluno'), configuracao.get('ra_aluno'),
+                codificar_qr(configuracao.get('ra_aluno'), prova, idx + 1, len(formularios),
+                             configuracao.get('turma'))
+            )
+            self.c.showPage()
 
         # Salvar
         self.c.save()
-        print(f"Gabarito personalizado gerado: {self.nome_arquivo}")
+        layout = self.layout_secoes()
+        caminho_layout = os.path.splitext(self.nome_arquivo)[0] + '.layout.json'
+        with open(caminho_layout, 'w', encoding='utf-8') as f:
+            json.dump(layout, f, ensure_ascii=False)
+        print(f"Gabarito personalizado gerado: {self.nome_arquivo} (layout: {caminho_layout})")
+        return layout
+
+    def layout_secoes(self):
+        """
+        Layout das bolhas desenhadas, no formato que o leitor consome
+
+        Returns:
+            {'largura', 'altura' (da página, em pontos), 'paginas' (folhas da prova),
+            'questoes': [{'questao', 'tipo', 'pagina', 'raio', 'bolhas': [[alternativa, x, y], ...]}, ...]}
+        """
+        return {
+            'largura': self.largura,
+            'altura': self.altura,
+            'paginas': self.pagina_atual + 1,
+            'questoes': [
+                {**q, 'bolhas': [[alt, x, y] for alt, x, y in q['bolhas']]} for q in self.layout_bolhas
+            ]
+        }
+
+    def _gravar_layout_fixo(self, num_questoes, alternativas, titulo, info_adicional, codigo_prova):
+        """
+        Desenha uma única vez tudo o que é igual para todos os alunos
+        (marcadores, cabeçalho, campos, questões e rodapé) como form XObjects
+
+        Returns:
+            Lista com o nome do formulário de cada página da folha
+        """
+        self._formularios = []
+        self._iniciar_formulario()
+
+        self._desenhar_cabecalho(titulo, info_adicional, codigo_prova)
+        y = self._desenhar_campo_identificacao(self.altura - 5*cm)
+
+        if codigo_prova:
+            self._adicionar_qrcode(codigo_prova, self.largura - 4*cm, self.altura - 9*cm, 2*cm)
+
+        self._desenhar_questoes_multipla_escolha(num_questoes, alternativas, y - 1*cm)
+        self._desenhar_rodape()
+
+        self.c.endForm()
+        formularios, self._formularios = self._formularios, None
+        return formularios
+
+    def gerar_gabaritos_lote(self, alunos, num_questoes=40, alternativas=['A', 'B', 'C', 'D', 'E'],
+                             titulo='GABARITO DE PROVA', disciplina=None, professor=None,
+                             codigo_prova=None, turma=None):
+        """
+        Gera gabaritos personalizados para vários alunos no mesmo PDF
+
+        O layout fixo é gravado uma vez como form XObject e reaproveitado em
+        todas as páginas; por aluno só são desenhados nome, código de barras e QR Code.
+        Cada folha leva o próprio QR (RA, turma, prova e número da folha): a correção
+        identifica o aluno e junta as folhas de cada um sem consultar o CSV da turma.
+
+        Args:
+            alunos: Lista de dicionários {'nome': str, 'ra': str, 'turma': str (opcional)}
+            num_questoes: Número de questões
+            alternativas: Lista de alternativas
+            titulo: Título do gabarito
+            disciplina: Nome da disciplina
+            professor: Nome do professor
+            codigo_prova: Código identificador da prova
+            turma: Turma dos alunos que não trazem a própria
+
+        Returns:
+            Número de alunos gerados
+        """
+        info_adicional = []
+        if disciplina:
+            info_adicional.append(f"Disciplina: {disciplina}")
+        if professor:
+            info_adicional.append(f"Professor(a): {professor}")
+        if codigo_prova:
+            info_adicional.append(f"Código: {codigo_prova}")
+
+        formularios = self._gravar_layout_fixo(
+            num_questoes, alternativas, titulo,
+            info_adicional if info_adicional else None, codigo_prova
+        )
+
+        prova = id_prova(codigo_prova, titulo, num_questoes)
+        total_folhas = len(formularios)
+
+        for aluno in alunos:
+            ra_aluno = aluno.get('ra') or None
+            for idx, nome_formulario in enumerate(formularios):
+                self.c.doForm(nome_formulario)
+
+                # Código de barras no cabeçalho da primeira página
+                if idx == 0 and ra_aluno:
+                    self._adicionar_barcode(ra_aluno, self.largura - 4.5*cm, self.altura - 2.5*cm, 1.5*cm)
+
+                # QR Code e nome no rodapé de cada folha
+                self._desenhar_dados_aluno_rodape(
+                    aluno.get('nome'), ra_aluno,
+                    codificar_qr(ra_aluno, prova, idx + 1, total_folhas, aluno.get('turma') or turma)
+                )
+
+                self.c.showPage()
+
+        self.c.save()
+        print(f"Gabaritos gerados: {len(alunos)} aluno(s) em {self.nome_arquivo}")
+        return len(alunos)
 
 
 if __name__ == '__main__':
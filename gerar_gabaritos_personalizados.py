@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Geração de Gabaritos Personalizados por Turma
+Lê o CSV de alunos e gera os gabaritos de turmas inteiras em paralelo
+"""
+
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def ler_csv_alunos(caminho_csv):
+    """
+    Lê o CSV exportado da secretaria e agrupa os alunos por turma
+
+    Returns:
+        Dicionário {turma: [{'nome': str, 'ra': str, 'digito': str}, ...]}
+    """
+    turmas = {}
+
+    with open(caminho_csv, 'r', encoding='utf-8-sig') as f:
+        linhas = f.readlines()
+
+    # Encontrar linha de cabeçalho (ignorar linhas vazias e cabeçalho de data)
+    idx_cabecalho = -1
+    for i, linha in enumerate(linhas):
+        if 'Aluno' in linha and 'Turma' in linha:
+            idx_cabecalho = i
+            break
+
+    if idx_cabecalho == -1:
+        return {}
+
+    cabecalho = [c.strip() for c in linhas[idx_cabecalho].strip().split(';')]
+    idx_aluno = cabecalho.index('Aluno')
+    idx_turma = cabecalho.index('Turma')
+    idx_ra = cabecalho.index('RA') if 'RA' in cabecalho else None
+    idx_digito = cabecalho.index('Digito') if 'Digito' in cabecalho else None
+
+    for linha in linhas[idx_cabecalho + 1:]:
+        linha = linha.strip()
+        if not linha:
+            continue
+
+        partes = linha.split(';')
+        if len(partes) <= max(idx_aluno, idx_turma):
+            continue
+
+        turma = partes[idx_turma].strip()
+        turmas.setdefault(turma, []).append({
+            'nome': partes[idx_aluno].strip(),
+            'ra': partes[idx_ra].strip() if idx_ra is not None and idx_ra < len(partes) else '',
+            'digito': partes[idx_digito].strip() if idx_digito is not None and idx_digito < len(partes) else ''
+        })
+
+    # Ordenar alunos por nome dentro de cada turma
+    for alunos in turmas.values():
+        alunos.sort(key=lambda a: a['nome'])
+
+    return turmas
+
+
+def listar_turmas(alunos_por_turma):
+    """Retorna a lista de turmas com número de alunos, ordenada por nome"""
+    return [
+        {'nome': turma, 'num_alunos': len(alunos)}
+        for turma, alunos in sorted(alunos_por_turma.items())
+    ]
+
+
+def _nome_seguro(texto):
+    """Converte texto em nome de arquivo/pasta seguro"""
+    texto = re.sub(r'[^\w\-]+', '_', texto.strip(), flags=re.UNICODE)
+    return texto.strip('_') or 'sem_nome'
+
+
+def gerar_gabaritos_turma(turma, alunos, configuracao, pasta_saida, modo='turma'):
+    """
+    Gera os gabaritos de uma turma
+
+    Args:
+        turma: Nome da turma
+        alunos: Lista de alunos da turma ({'nome', 'ra'})
+        configuracao: Dicionário com titulo, disciplina, professor, codigo_prova,
+                      num_questoes e alternativas
+        pasta_saida: Pasta base onde será criada a subpasta da turma
+        modo: 'turma' (um PDF com todas as páginas) ou 'individual' (um PDF por aluno)
+
+    Returns:
+        Lista com os caminhos dos PDFs gerados
+    """
+    # reportlab só é carregado aqui (ler o CSV e listar as turmas não precisam dele)
+    from gerador_gabarito import GeradorGabarito
+
+    pasta_turma = Path(pasta_saida) / _nome_seguro(turma)
+    pasta_turma.mkdir(parents=True, exist_ok=True)
+
+    parametros = {
+        'num_questoes': configuracao.get('num_questoes', 40),
+        'alternativas': configuracao.get('alternativas', ['A', 'B', 'C', 'D', 'E']),
+        'titulo': configuracao.get('titulo', 'GABARITO DE PROVA'),
+        'disciplina': configuracao.get('disciplina'),
+        'professor': configuracao.get('professor'),
+        'codigo_prova': configuracao.get('codigo_prova'),
+    }
+
+    arquivos = []
+    if modo == 'individual':
+        # O layout fixo é gravado uma vez só, num PDF com a turma toda (como no modo
+        # 'turma'), que depois é separado nos PDFs de cada aluno: sem redesenhar as
+        # questões de cada um num PDF novo
+        import fitz
+
+        if not alunos:
+            return arquivos
+        completo = pasta_turma / f".{_nome_seguro(turma)}_completo.pdf"
+        GeradorGabarito(str(completo)).gerar_gabaritos_lote(alunos, turma=turma, **parametros)
+        try:
+            with fitz.open(str(completo)) as pdf:
+                folhas = len(pdf) // len(alunos)
+                usados = set()
+                for indice, aluno in enumerate(alunos):
+                    # O RA pode faltar no CSV: homônimos da turma não podem sobrescrever o PDF um do outro
+                    base = _nome_seguro(f"{aluno['nome']}_{aluno['ra']}" if aluno['ra'] else aluno['nome'])
+                    nome, sufixo = base, 2
+                    while nome.lower() in usados:
+                        nome, sufixo = f"{base}_{sufixo}", sufixo + 1
+                    usados.add(nome.lower())
+                    nome_pdf = pasta_turma / f"{nome}.pdf"
+                    with fitz.open() as individual:
+                        individual.insert_pdf(pdf, from_page=indice * folhas, to_page=(indice + 1) * folhas - 1)
+                        individual.save(str(nome_pdf), garbage=3, deflate=True)
+                    arquivos.append(str(nome_pdf))
+        finally:
+            completo.unlink(missing_ok=True)
+    else:
+        nome_pdf = pasta_turma / f"{_nome_seguro(turma)}.pdf"
+        GeradorGabarito(str(nome_pdf)).gerar_gabaritos_lote(alunos, turma=turma, **parametros)
+        arquivos.append(str(nome_pdf))
+
+    return arquivos
+
+
+def gerar_gabaritos_turmas(alunos_por_turma, configuracao, pasta_saida, modo='turma', max_workers=None):
+    """
+    Gera os gabaritos de várias turmas em paralelo (um processo por turma)
+
+    Args:
+        alunos_por_turma: Dicionário {turma: [alunos]}
+        configuracao: Ver gerar_gabaritos_turma
+        pasta_saida: Pasta base dos PDFs
+        modo: 'turma' ou 'individual'
+        max_workers: Número máximo de processos (padrão: número de CPUs)
+
+    Returns:
+        Dicionário {turma: [caminhos dos PDFs]}
+    """
+    if not alunos_por_turma:
+        return {}
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(alunos_por_turma))
+
+    # Uma turma só não compensa o custo de subir processos
+    if max_workers == 1:
+        return {
+            turma: gerar_gabaritos_turma(turma, alunos, configuracao, pasta_saida, modo)
+            for turma, alunos in alunos_por_turma.items()
+        }
+
+    resultado = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {
+            executor.submit(gerar_gabaritos_turma, turma, alunos, configuracao, pasta_saida, modo): turma
+            for turma, alunos in alunos_por_turma.items()
+        }
+        for futuro, turma in futuros.items():
+            resultado[turma] = futuro.result()
+
+    return resultado
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Uso: python3 gerar_gabaritos_personalizados.py <alunos.csv> [pasta_saida] [turma|individual]")
+        print("\nExemplo:")
+        print("  python3 gerar_gabaritos_personalizados.py csv_alunos_referencia/alunos_referencia.csv gabaritos_gerados")
+        sys.exit(1)
+
+    caminho_csv = sys.argv[1]
+    pasta_saida = sys.argv[2] if len(sys.argv) > 2 else 'gabaritos_gerados'
+    modo = sys.argv[3] if len(sys.argv) > 3 else 'turma'
+
+    alunos_por_turma = ler_csv_alunos(caminho_csv)
+    for turma in listar_turmas(alunos_por_turma):
+        print(f"  {turma['nome']}: {turma['num_alunos']} alunos")
+
+    arquivos = gerar_gabaritos_turmas(alunos_por_turma, {}, pasta_saida, modo)
+    total = sum(len(a) for a in arquivos.values())
+    print(f"\n✓ {total} PDF(s) gerados em {pasta_saida}")
@@ -5,50 +5,405 @@ Funciona com PDFs impressos de qualidade variável
 
 import cv2
 import numpy as np
-from typing import Dict, Optional, Tuple
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
 import json
+import time
+
+from folhas_prova import dividir_questoes
+import recursos_opencv
+
+# Versão do algoritmo de leitura. Incrementar sempre que uma mudança puder
+# alterar as respostas detectadas ou o formato da leitura (invalida o cache de leituras)
+VERSAO_LEITOR = '2.9'
+
+
+@dataclass(frozen=True)
+class ResultadoLeitura:
+    """
+    Resultado imutável de uma leitura, seguro para compartilhar entre threads
+
+    Attributes:
+        respostas: {questao: alternativa} das questões com resposta única
+        questoes_multiplas: Questões com mais de uma bolha preenchida
+        confianca: {questao: {'scores', 'margem', 'caixa'}} de cada questão localizada
+        revisao: {questao: motivo} das questões de baixa confiança
+        tempos: Tempo de cada etapa em milissegundos
+        geometria: DPI, tamanho da imagem, círculos encontrados, questões localizadas e
+            alternativas por questão na grade, passadas do HoughCircles e níveis da faixa de calibração (None se não achada)
+    """
+    respostas: Mapping[str, str]
+    questoes_multiplas: Tuple[int, ...]
+    confianca: Mapping[str, Mapping[str, Any]]
+    revisao: Mapping[str, str]
+    tempos: Mapping[str, float]
+    geometria: Mapping[str, Any]
+
+    @classmethod
+    def criar(cls, respostas: Dict, confianca: Dict, revisao: Dict,
+              tempos: Dict, geometria: Dict) -> 'ResultadoLeitura':
+        """Monta o resultado congelando os dicionários internos"""
+        confianca_congelada = {
+            q: MappingProxyType({
+                'scores': MappingProxyType(dict(info['scores'])),
+                'margem': info['margem'],
+                'caixa': tuple(info['caixa'])
+            })
+            for q, info in confianca.items()
+        }
+        return cls(
+            respostas=MappingProxyType(dict(respostas)),
+            questoes_multiplas=tuple(sorted(int(q) for q, m in revisao.items() if m == 'multipla')),
+            confianca=MappingProxyType(confianca_congelada),
+            revisao=MappingProxyType(dict(revisao)),
+            tempos=MappingProxyType(dict(tempos)),
+            geometria=MappingProxyType(dict(geometria))
+        )
+
+    def para_dict(self) -> Dict:
+        """Cópia em dicionários e listas comuns (serializável em JSON)"""
+        return {
+            'respostas': dict(self.respostas),
+            'questoes_multiplas': list(self.questoes_multiplas),
+            'confianca': {
+                q: {'scores': dict(info['scores']), 'margem': info['margem'], 'caixa': list(info['caixa'])}
+                for q, info in self.confianca.items()
+            },
+            'revisao': dict(self.revisao),
+            'tempos': dict(self.tempos),
+            'geometria': dict(self.geometria)
+        }
 
 
 class LeitorFinalV2:
-    """Leitor adaptativo com detecção resiliente"""
+    """
+    Leitor adaptativo com detecção resiliente
+
+    O leitor só guarda configuração (questões, alternativas): ler() não altera o objeto,
+    então uma instância pode atender várias threads ao mesmo tempo.
+    """
+
+    # Resolução padrão das páginas (render fitz.Matrix(2, 2)), usada quando o DPI não é informado
+    DPI_REFERENCIA = 144
+
+    # Geometria em milímetros, a partir do layout do GeradorGabarito (círculos de 3mm de raio,
+    # 13mm entre alternativas, 7mm entre linhas). Convertida para pixels conforme o DPI da imagem.
+    CONFIGS_HOUGH_MM = [
+        {'minDist': 3.35, 'param1': 45, 'param2': 28, 'minRadius': 1.41, 'maxRadius': 3.70},
+        {'minDist': 3.53, 'param1': 40, 'param2': 25, 'minRadius': 1.41, 'maxRadius': 3.88},
+        {'minDist': 3.70, 'param1': 35, 'param2': 20, 'minRadius': 1.23, 'maxRadius': 4.06},
+        {'minDist': 3.18, 'param1': 50, 'param2': 30, 'minRadius': 1.59, 'maxRadius': 3.53},
+    ]
+    # Passada única: a configuração mais permissiva acha a grade inteira em quase todas as
+    # folhas. Só vale numa folha com a faixa de calibração e a grade completa; nas demais
+    # fica a escolha de sempre entre todas as configurações (a que acha mais círculos)
+    HOUGH_PRINCIPAL = 2
+    MINIMO_CIRCULOS_COLUNA = 3    # Círculos alinhados em X para haver uma coluna de alternativas
+    VARIACAO_PASSO_COLUNA = 0.25  # Desvio do passo entre alternativas que separa blocos de questões
+    PASSO_ALINHAMENTO_MM = 1.0    # Resolução da votação do deslocamento da folha (leitura pelo layout)
+    GIRO_MAXIMO_GRAUS = 3.0       # Giro da folha no scanner procurado ao alinhar o layout
+    PASSO_GIRO_GRAUS = 0.5
+    TOLERANCIA_LINHA_MM = 3.88    # Diferença máxima de Y para círculos da mesma linha
+    PASSO_LINHA_MM = 7.0          # Distância entre linhas de questões
+    MARGEM_ROI_MM = 0.35          # Margem em volta de cada círculo ao medir o preenchimento
+    DIAMETRO_BILATERAL_MM = 1.6   # Vizinhança do filtro bilateral
+    SIGMA_BLUR_MM = 0.265         # Desvio do blur gaussiano antes do Hough
+
+    # Limiares sobre o score de preenchimento (0 a 1) de cada alternativa
+    LIMIAR_MARCACAO = 0.10        # Score mínimo da melhor alternativa para haver resposta
+    LIMIAR_AMBIGUIDADE = 0.06     # Margem abaixo da qual a melhor alternativa não é aceita
+    LIMIAR_REVISAO = 0.12         # Margem abaixo da qual a resposta vai para revisão humana
+    # Bolhas vazias também pontuam (~0.3, contorno e letra impressos), então a classificação
+    # de cada alternativa é feita pela elevação sobre a mediana da página (bolha vazia típica)
+    LIMIAR_MARCADA = 0.15         # Elevação de uma bolha claramente preenchida
+    LIMIAR_MARCA_FRACA = 0.045    # Elevação de uma possível marca fraca (lápis claro, rasura)
+
+    # Faixa de calibração que o GeradorGabarito imprime no alto da folha, à esquerda: preto,
+    # cinza 50% e branco, 8 x 3 mm cada, a cada 10 mm, a 5 mm da borda esquerda e 9 mm do topo
+    CALIBRACAO_X_MM = 5.0
+    CALIBRACAO_Y_MM = 9.0
+    CALIBRACAO_PASSO_MM = 10.0
+    CALIBRACAO_LARGURA_MM = 8.0
+    CALIBRACAO_ALTURA_MM = 3.0
+    CALIBRACAO_BUSCA_MM = 15.0    # Deslocamento máximo da folha no scanner
+    CONTRASTE_MINIMO = 60         # Preto e branco da faixa mais próximos que isso: faixa inválida
+
+    # Limiares de pixel escuro na bolha, em fração da faixa preto → branco da folha. Sem
+    # calibração (preto 0 e branco 255) valem os limiares fixos de sempre, pixels abaixo de
+    # 115 e até 127; com a faixa medida dá para subir até o lápis claro sem confundir com
+    # o papel, porque o branco real da folha é conhecido
+    FRACAO_ESCURO = 115 / 255
+    FRACAO_BINARIA = 127 / 255
+    FRACAO_ESCURO_CALIBRADA = 145 / 255
+    FRACAO_BINARIA_CALIBRADA = 155 / 255
 
     def __init__(self, num_questoes: int = 40, alternativas: list = None):
         self.num_questoes = num_questoes
         self.alternativas = alternativas or ['A', 'B', 'C', 'D', 'E']
-        self.debug = False
-        self.questoes_multiplas = []  # Lista de questões com múltiplas marcações
 
-    def ler_gabarito(self, caminho_imagem: str, debug: bool = False) -> Dict:
-        """Lê gabarito com adaptação automática"""
+        # Última leitura feita por ler_gabarito (interface antiga, não usar com threads)
+        self.questoes_multiplas = []
+        self.confianca = {}
+        self.revisao = {}
+
+    def ler(self, imagem: Union[str, np.ndarray], dpi: Optional[float] = None,
+            quantidade: Optional[int] = None, layout: Optional[Dict] = None,
+            pagina: int = 0) -> ResultadoLeitura:
+        """
+        Lê gabarito com adaptação automática, sem alterar o leitor
+
+        Args:
+            imagem: Caminho da imagem ou array NumPy (de preferência já em escala de cinza)
+            dpi: Resolução real da imagem (padrão: DPI_REFERENCIA)
+            quantidade: Questões impressas nesta folha, em qualquer número de colunas (padrão:
+                as da primeira folha da prova). As questões são numeradas de 1 a quantidade na folha; em
+                provas com várias folhas a correção soma o deslocamento de cada folha.
+            layout: Layout das seções de um gabarito personalizado (GeradorGabarito.
+                layout_secoes, gravado em <pdf>.layout.json). Com ele, as bolhas de múltipla
+                escolha e de verdadeiro ou falso saem do layout, alinhado à folha, e as
+                questões mantêm a numeração impressa (quantidade é ignorada)
+            pagina: Página do layout que a imagem é (0 = primeira)
+        """
+        if layout is not None:
+            do_layout = [q for q in layout['questoes'] if q['pagina'] == pagina]
+            quantidade = len(do_layout)
+            primeira = min((q['questao'] for q in do_layout), default=1)
+        else:
+            quantidade = quantidade or dividir_questoes(self.num_questoes)[0][1]
+            primeira = 1
+        tempos = {}
+        inicio = marca = time.perf_counter()
 
-        self.debug = debug
-        self.questoes_multiplas = []  # Resetar a cada leitura
+        def etapa(nome):
+            nonlocal marca
+            agora = time.perf_counter()
+            tempos[nome] = round((agora - marca) * 1000, 2)
+            marca = agora
 
         # Carregar
-        imagem = cv2.imread(caminho_imagem)
-        if imagem is None:
-            raise ValueError(f"Erro: {caminho_imagem}")
+        cinza = self._carregar_cinza(imagem)
+        geo = self._geometria(dpi or self.DPI_REFERENCIA)
+        etapa('carregamento')
 
-        cinza = cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
+        # Níveis reais de preto e branco da folha, pela faixa de calibração impressa
+        calibracao = self._calibrar(cinza, geo)
+        etapa('calibracao')
 
         # Preprocessar
-        processada = self._preprocessar_adaptativo(cinza)
+        processada = self._preprocessar_adaptativo(cinza, geo)
+        etapa('preprocessamento')
+
+        # Detectar círculos e localizar as questões na grade: uma passada do Hough e, se
+        # faltar alguma questão ou a folha não tiver a faixa de calibração, as demais
+        # configurações, como antes da passada única. Com layout, a passada única só alinha
+        # o layout à folha
+        blur = self._suavizar(processada, geo)
+        tentativas = {self.HOUGH_PRINCIPAL: self._hough(blur, geo['configs_hough'][self.HOUGH_PRINCIPAL])}
+        circulos = tentativas[self.HOUGH_PRINCIPAL]
+        if layout is not None:
+            questoes = self._questoes_do_layout(circulos, do_layout, layout['altura'], geo)
+        else:
+            questoes = self._grade(circulos, geo, quantidade)
+        if layout is None and (len(questoes) < quantidade or calibracao is None):
+            circulos = self._detectar_circulos_robusto(blur, geo, tentativas)
+            questoes = self._grade(circulos, geo, quantidade)
+        etapa('circulos')
+
+        respostas, confianca = {}, {}
+        if questoes:
+            # Detectar respostas com múltiplos métodos, nos limiares da folha
+            respostas, confianca = self._detectar_com_ensemble(cinza, questoes, geo, calibracao)
+            etapa('respostas')
+
+        # Separar questões em branco das ambíguas e marcar as de baixa confiança
+        revisao = self.questoes_para_revisao(respostas, confianca, quantidade, primeira)
+        tempos['total'] = round((time.perf_counter() - inicio) * 1000, 2)
+
+        geometria = {
+            'dpi': geo['dpi'],
+            'largura': cinza.shape[1],
+            'altura': cinza.shape[0],
+            'circulos': 0 if circulos is None else len(circulos[0]),
+            'questoes_localizadas': len(questoes),
+            'alternativas': len(questoes[0][1]) if questoes else 0,
+            'hough': len(tentativas),
+            'calibracao': calibracao
+        }
+        if layout is not None:
+            geometria['secoes'] = {tipo: sum(1 for q in do_layout if q['tipo'] == tipo)
+                                   for tipo in sorted({q['tipo'] for q in do_layout})}
+        return ResultadoLeitura.criar(respostas, confianca, revisao, tempos, geometria)
+
+    def ler_gabarito(self, imagem: Union[str, np.ndarray], debug: bool = False,
+                     dpi: Optional[float] = None) -> Dict:
+        """
+        Interface antiga: retorna só as respostas e guarda o resto da leitura no leitor
+        (questoes_multiplas, confianca, revisao). Para uso concorrente, usar ler().
+
+        Args:
+            debug: Gravar debug_01_preprocessada.jpg e debug_circulos.jpg na pasta atual
+        """
+        resultado = self.ler(imagem, dpi)
+        detalhes = resultado.para_dict()
+        self.questoes_multiplas = detalhes['questoes_multiplas']
+        self.confianca = detalhes['confianca']
+        self.revisao = detalhes['revisao']
+        if debug:
+            self._salvar_debug(imagem, dpi, detalhes)
+        return detalhes['respostas']
+
+    def _salvar_debug(self, imagem: Union[str, np.ndarray], dpi: Optional[float], detalhes: Dict):
+        """
+        Imagens de conferência de uma leitura: a imagem pré-processada e a folha com a linha de
+        cada questão localizada (verde: lida, vermelho: vai para a revisão, cinza: em branco)
+        """
+        cinza = self._carregar_cinza(imagem)
+        geo = self._geometria(dpi or self.DPI_REFERENCIA)
+        cv2.imwrite('debug_01_preprocessada.jpg', self._preprocessar_adaptativo(cinza, geo))
+
+        folha = cv2.cvtColor(cinza, cv2.COLOR_GRAY2BGR)
+        for questao, info in detalhes['confianca'].items():
+            x1, y1, x2, y2 = (int(v) for v in info['caixa'])
+            resposta = detalhes['respostas'].get(questao)
+            if questao in detalhes['revisao']:
+                cor = (0, 0, 255)
+            elif resposta:
+                cor = (0, 200, 0)
+            else:
+                cor = (160, 160, 160)
+            cv2.rectangle(folha, (x1, y1), (x2, y2), cor, 2)
+            cv2.putText(folha, f"{questao}:{resposta or '-'}", (x2 + 4, (y1 + y2) // 2 + 4),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, cor, 1)
+        cv2.imwrite('debug_circulos.jpg', folha)
+        print("💾 Imagens de debug: debug_01_preprocessada.jpg, debug_circulos.jpg")
+
+    @staticmethod
+    def _carregar_cinza(imagem: Union[str, np.ndarray]) -> np.ndarray:
+        """Retorna a imagem em escala de cinza, convertendo só se necessário"""
+        if isinstance(imagem, np.ndarray):
+            if imagem.ndim == 2:
+                return imagem
+            return cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY, dst=recursos_opencv.buffer('leitor_cinza', imagem.shape[:2]))
+
+        cinza = cv2.imread(imagem, cv2.IMREAD_GRAYSCALE)
+        if cinza is None:
+            raise ValueError(f"Erro: {imagem}")
+        return cinza
 
-        # Detectar círculos
-        circulos = self._detectar_circulos_robusto(processada)
-        if circulos is None:
-            return {}
+    @classmethod
+    def _geometria(cls, dpi: float) -> Dict:
+        """Converte a geometria em milímetros para pixels na resolução da imagem"""
+        px_por_mm = dpi / 25.4
+        escala = dpi / cls.DPI_REFERENCIA
+
+        configs = []
+        for c in cls.CONFIGS_HOUGH_MM:
+            configs.append({
+                'minDist': max(1.0, c['minDist'] * px_por_mm),
+                'param1': c['param1'],
+                # Limiar do acumulador: escala linear com o DPI deixa passar muitos falsos
+                # círculos em baixa resolução; a raiz mantém a grade estável de 80 a 300 DPI
+                'param2': max(8, c['param2'] * escala ** 0.5),
+                'minRadius': max(2, int(round(c['minRadius'] * px_por_mm))),
+                'maxRadius': max(3, int(round(c['maxRadius'] * px_por_mm))),
+            })
+
+        sigma = cls.SIGMA_BLUR_MM * px_por_mm
+        return {
+            'dpi': dpi,
+            'configs_hough': configs,
+            'tolerancia_linha': cls.TOLERANCIA_LINHA_MM * px_por_mm,
+            'busca_alinhamento': cls.CALIBRACAO_BUSCA_MM * px_por_mm,
+            'passo_alinhamento': max(1.0, cls.PASSO_ALINHAMENTO_MM * px_por_mm),
+            'passo_linha': cls.PASSO_LINHA_MM * px_por_mm,
+            'margem_roi': max(1, int(round(cls.MARGEM_ROI_MM * px_por_mm))),
+            'diametro_bilateral': max(3, int(round(cls.DIAMETRO_BILATERAL_MM * px_por_mm))),
+            'sigma_blur': sigma,
+            'kernel_blur': max(3, 2 * int(round(sigma * 1.5)) + 1),
+        }
+
+    def _calibrar(self, cinza: np.ndarray, geo: Dict) -> Optional[Dict[str, float]]:
+        """
+        Mede o preto, o cinza e o branco reais da folha na faixa de calibração
+
+        Procura o retângulo preto perto da posição impressa (a folha pode estar deslocada
+        no scanner) e mede o miolo dos três retângulos, a partir dele.
+
+        Returns:
+            {'preto', 'cinza', 'branco'} ou None se a faixa não foi achada (folhas de outro
+            gerador, página girada) ou não é coerente
+        """
+        px_mm = geo['dpi'] / 25.4
+        largura, altura = self.CALIBRACAO_LARGURA_MM * px_mm, self.CALIBRACAO_ALTURA_MM * px_mm
+        busca = self.CALIBRACAO_BUSCA_MM * px_mm
+        regiao = cinza[:int((self.CALIBRACAO_Y_MM + self.CALIBRACAO_ALTURA_MM) * px_mm + busca),
+                       :int(self.CALIBRACAO_X_MM * px_mm + busca + largura)]
+        if regiao.size == 0:
+            return None
 
-        # Organizar
-        grade = self._organizar_grade(circulos)
+        _, escuros = cv2.threshold(regiao, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(escuros, connectivity=8)
 
-        # Detectar respostas com múltiplos métodos
-        respostas = self._detectar_com_ensemble(cinza, circulos, grade)
+        def nivel(x, y, w, h):
+            """Mediana do miolo de um retângulo (sem a borda)"""
+            miolo = cinza[int(y + h / 4):int(y + 3 * h / 4) + 1, int(x + w / 4):int(x + 3 * w / 4) + 1]
+            return float(np.median(miolo)) if miolo.size else None
 
-        return respostas
+        # Retângulo cheio do tamanho do preto; o cinza também pode passar no Otsu: vale o mais escuro
+        preto = None
+        for x, y, w, h, area in stats[1:]:
+            if not (0.65 * largura <= w <= 1.35 * largura and 0.55 * altura <= h <= 1.6 * altura):
+                continue
+            if area < 0.75 * w * h:
+                continue
+            valor = nivel(x, y, w, h)
+            if valor is not None and (preto is None or valor < preto[0]):
+                preto = (valor, x, y, w, h)
+        if preto is None:
+            return None
 
-    def _preprocessar_adaptativo(self, cinza: np.ndarray) -> np.ndarray:
-        """Preprocessamento adaptativo baseado na imagem"""
+        _, x, y, w, h = preto
+        passo = self.CALIBRACAO_PASSO_MM * px_mm
+        meio, branco = nivel(x + passo, y, w, h), nivel(x + 2 * passo, y, w, h)
+        if meio is None or branco is None or branco - preto[0] < self.CONTRASTE_MINIMO:
+            return None
+        if not 0.2 <= (meio - preto[0]) / (branco - preto[0]) <= 0.8:
+            return None
+        return {'preto': preto[0], 'cinza': meio, 'branco': branco}
+
+    @classmethod
+    def _limiares(cls, calibracao: Optional[Dict], branco_local: Optional[float] = None) -> Dict[str, float]:
+        """
+        Limiares da leitura das bolhas na faixa preto → branco da folha
+
+        Args:
+            branco_local: Branco do papel em volta da questão. A faixa fica num canto e a
+                iluminação do scanner pode variar pela folha: o preto medido na faixa é
+                escalado para o branco local (a iluminação multiplica os dois)
+        """
+        preto, branco = (calibracao['preto'], calibracao['branco']) if calibracao else (0.0, 255.0)
+        if calibracao and branco_local:
+            preto, branco = preto * branco_local / branco, branco_local
+        contraste = branco - preto
+        if calibracao:
+            escuro, binaria = cls.FRACAO_ESCURO_CALIBRADA, cls.FRACAO_BINARIA_CALIBRADA
+        else:
+            escuro, binaria = cls.FRACAO_ESCURO, cls.FRACAO_BINARIA
+        return {
+            'preto': preto,
+            'contraste': contraste,
+            'escuro': preto + escuro * contraste,
+            'binaria': preto + binaria * contraste
+        }
+
+    def _preprocessar_adaptativo(self, cinza: np.ndarray, geo: Dict) -> np.ndarray:
+        """
+        Preprocessamento adaptativo baseado na imagem
+
+        As etapas gravam em buffers do tamanho da página, da thread que lê (o leitor é
+        compartilhado entre threads), reaproveitados nas páginas seguintes do mesmo tamanho
+        """
 
         # 1. CLAHE adaptativo
         media = np.mean(cinza)
@@ -61,41 +416,48 @@ class LeitorFinalV2:
         else:
             clip_limit = 2.0
 
-        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(8, 8))
-        cinza = clahe.apply(cinza)
+        # Um CLAHE por clip limit, reaproveitado entre as páginas da thread
+        equalizada = recursos_opencv.clahe(clip_limit).apply(cinza, recursos_opencv.buffer('leitor_clahe', cinza.shape))
 
-        # 2. Bilateral filter
-        cinza = cv2.bilateralFilter(cinza, 9, 75, 75)
+        # 2. Bilateral filter (não aceita a mesma imagem como entrada e saída)
+        filtrada = cv2.bilateralFilter(equalizada, geo['diametro_bilateral'], 75, 75,
+                                       dst=recursos_opencv.buffer('leitor_bilateral', cinza.shape))
 
-        # 3. Normalizar
-        cinza = cv2.normalize(cinza, None, 0, 255, cv2.NORM_MINMAX)
+        # 3. Normalizar (no próprio buffer)
+        return cv2.normalize(filtrada, filtrada, 0, 255, cv2.NORM_MINMAX)
 
-        return cinza
+    @staticmethod
+    def _suavizar(imagem: np.ndarray, geo: Dict) -> np.ndarray:
+        """Blur antes do Hough (o buffer do CLAHE já foi usado pelo bilateral e fica livre)"""
+        k = geo['kernel_blur']
+        return cv2.GaussianBlur(imagem, (k, k), geo['sigma_blur'],
+                                dst=recursos_opencv.buffer('leitor_clahe', imagem.shape))
 
-    def _detectar_circulos_robusto(self, imagem: np.ndarray) -> Optional[np.ndarray]:
-        """Detecção robusta com múltiplas tentativas"""
+    @staticmethod
+    def _hough(blur: np.ndarray, config: Dict) -> Optional[np.ndarray]:
+        return cv2.HoughCircles(blur, cv2.HOUGH_GRADIENT, dp=1, **config)
 
-        # Blur
-        blur = cv2.GaussianBlur(imagem, (5, 5), 1.5)
+    def _detectar_circulos_robusto(self, blur: np.ndarray, geo: Dict,
+                                   tentativas: Optional[Dict] = None) -> Optional[np.ndarray]:
+        """
+        Detecção robusta com múltiplas tentativas
 
-        # Parâmetros múltiplos
-        configs = [
-            {'minDist': 19, 'param1': 45, 'param2': 28, 'minRadius': 8, 'maxRadius': 21},
-            {'minDist': 20, 'param1': 40, 'param2': 25, 'minRadius': 8, 'maxRadius': 22},
-            {'minDist': 21, 'param1': 35, 'param2': 20, 'minRadius': 7, 'maxRadius': 23},
-            {'minDist': 18, 'param1': 50, 'param2': 30, 'minRadius': 9, 'maxRadius': 20},
-        ]
+        Args:
+            tentativas: {índice da configuração: círculos} já calculados (não são refeitos);
+                recebe as passadas feitas aqui
+        """
+        tentativas = {} if tentativas is None else tentativas
+
+        # Parâmetros múltiplos (em pixels para o DPI da imagem)
+        configs = geo['configs_hough']
 
         melhores_circulos = None
         max_count = 0
 
-        for config in configs:
-            circ = cv2.HoughCircles(
-                blur,
-                cv2.HOUGH_GRADIENT,
-                dp=1,
-                **config
-            )
+        for i, config in enumerate(configs):
+            if i not in tentativas:
+                tentativas[i] = self._hough(blur, config)
+            circ = tentativas[i]
 
             if circ is not None and len(circ[0]) > max_count:
                 melhores_circulos = circ
@@ -103,120 +465,264 @@ class LeitorFinalV2:
 
         return melhores_circulos
 
-    def _organizar_grade(self, circulos: np.ndarray) -> Dict:
-        """Organiza em grade com robustez"""
-
-        circ_lista = [(int(x), int(y), int(r)) for x, y, r in circulos[0]]
-
-        # Agrupar por Y com melhor agrupamento
-        linhas = {}
-        circ_lista_sorted = sorted(circ_lista, key=lambda c: c[1])
-
-        for x, y, r in circ_lista_sorted:
-            encontrado = False
-            # Procurar linha mais próxima
-            min_dist = float('inf')
-            melhor_y = None
-
-            for y_g in linhas:
-                dist = abs(y - y_g)
-                if dist < 22 and dist < min_dist:
-                    min_dist = dist
-                    melhor_y = y_g
-                    encontrado = True
-
-            if encontrado:
-                linhas[melhor_y].append((x, y, r))
-            else:
-                linhas[y] = [(x, y, r)]
+    def _grade(self, circulos: Optional[np.ndarray], geo: Dict, quantidade: int) -> List[Tuple[int, list]]:
+        """
+        Localiza as bolhas de cada questão numa passada sobre todos os círculos da folha
 
-        # Ordenar por X e limpar duplicatas
-        for y_g in linhas:
-            # Remover duplicatas (círculos muito próximos)
-            linhas[y_g] = sorted(set((c[0], c[1], c[2]) for c in linhas[y_g]), key=lambda c: c[0])
+        As colunas de alternativas são os picos do histograma de X dos círculos; colunas
+        vizinhas no passo entre alternativas formam um bloco de questões e o número de
+        colunas do bloco é o de alternativas da prova. Dentro de
+        cada bloco, as linhas são indexadas pelo passo entre elas: uma linha não achada vira
+        uma questão não localizada, sem deslocar as de baixo. As questões seguem a ordem do
+        GeradorGabarito, bloco a bloco, de cima para baixo (N blocos × M linhas × K alternativas).
 
-        return linhas
+        Returns:
+            [(questão, [(x, y, r) de cada alternativa], letras)], em ordem de questão ([] sem grade)
+        """
+        if circulos is None:
+            return []
+        pontos = circulos[0]
+        tolerancia = geo['tolerancia_linha']
+
+        # Colunas de alternativas: os X ordenados se quebram onde o salto passa da tolerância
+        xs = np.sort(pontos[:, 0])
+        grupos = np.split(xs, np.flatnonzero(np.diff(xs) > tolerancia) + 1)
+        minimo = max(self.MINIMO_CIRCULOS_COLUNA, 0.5 * max(len(g) for g in grupos))
+        centros = np.array([g.mean() for g in grupos if len(g) >= minimo])
+        if len(centros) < 2:
+            return []
+
+        # Blocos de questões: sequências de colunas no passo regular entre alternativas (o
+        # espaço entre blocos, ou uma coluna de outra coisa, como os números, quebra a sequência)
+        saltos = np.diff(centros)
+        passo_coluna = np.median(saltos)
+        quebras = np.flatnonzero(np.abs(saltos - passo_coluna) > self.VARIACAO_PASSO_COLUNA * passo_coluna) + 1
+        blocos = np.split(np.arange(len(centros)), quebras)
+        tamanhos = [len(b) for b in blocos if 2 <= len(b) <= len(self.alternativas)]
+        if not tamanhos:
+            return []
+        alternativas = max(set(tamanhos), key=tamanhos.count)
+        blocos = [b for b in blocos if len(b) == alternativas]
+
+        # Rótulo de cada círculo (bloco e alternativa) pela coluna mais próxima
+        colunas = np.concatenate(blocos)
+        distancias = np.abs(pontos[:, 0, None] - centros[None, colunas])
+        coluna = distancias.argmin(axis=1)
+        dentro = distancias[np.arange(len(pontos)), coluna] <= tolerancia
+        bloco_circulo = coluna // alternativas
+        alternativa_circulo = coluna % alternativas
+        raio = int(round(float(np.median(pontos[dentro, 2])))) if dentro.any() else 1
+
+        por_bloco = -(-quantidade // len(blocos))
+        questoes = []
+        for b, indices in enumerate(blocos):
+            selecionados = np.flatnonzero(dentro & (bloco_circulo == b))
+            selecionados = selecionados[np.argsort(pontos[selecionados, 1])]
+            linha = np.concatenate([[0], np.cumsum(np.diff(pontos[selecionados, 1]) > tolerancia)])
+
+            # Linhas com as alternativas quase todas achadas (uma pode faltar)
+            linhas = []
+            for n in range(int(linha[-1]) + 1 if len(linha) else 0):
+                membros = selecionados[linha == n]
+                if len(set(alternativa_circulo[membros])) >= max(2, alternativas - 1):
+                    linhas.append((float(np.median(pontos[membros, 1])), membros))
+            if not linhas:
+                continue
 
-    def _detectar_com_ensemble(self, cinza: np.ndarray, circulos: np.ndarray,
-                               linhas: Dict) -> Dict:
-        """Detecta usando votação de múltiplos métodos"""
+            ys = np.array([y for y, _ in linhas])
+            passos = np.diff(ys)
+            passos = passos[passos < 1.5 * geo['passo_linha']]
+            passo = float(np.median(passos)) if len(passos) else geo['passo_linha']
+
+            vistas = set()
+            for y, membros in linhas:
+                indice = int(round((y - ys[0]) / passo))
+                questao = b * por_bloco + indice + 1
+                if indice in vistas or indice >= por_bloco or questao > quantidade:
+                    continue
+                vistas.add(indice)
+
+                # Um círculo por alternativa (o mais perto da coluna); a que faltar fica na
+                # coluna, com o deslocamento das achadas nesta linha (folha girada)
+                achados = {}
+                for i in membros[np.argsort(distancias[membros, coluna[membros]])]:
+                    achados.setdefault(int(alternativa_circulo[i]), pontos[i])
+                deslocamento = float(np.median([c[0] - centros[indices[k]] for k, c in achados.items()]))
+                bolhas = []
+                for k in range(alternativas):
+                    if k in achados:
+                        x, yc, r = achados[k]
+                        bolhas.append((int(x), int(yc), int(r)))
+                    else:
+                        bolhas.append((int(centros[indices[k]] + deslocamento), int(y), raio))
+                questoes.append((questao, bolhas, self.alternativas[:alternativas]))
+
+        return sorted(questoes)
+
+    def _questoes_do_layout(self, circulos: Optional[np.ndarray], questoes: List[Dict], altura: float,
+                            geo: Dict) -> List[Tuple[int, list, list]]:
+        """
+        Bolhas de cada questão pelo layout do gerador, de todas as seções da página
+
+        As posições do layout (pontos do ReportLab, origem embaixo) são convertidas para
+        pixels e alinhadas à folha pelos círculos achados (deslocamento e giro do scanner);
+        bolhas que o Hough não achou, como os círculos maiores do verdadeiro ou falso, são
+        lidas mesmo assim, na posição prevista.
+
+        Returns:
+            [(questão, [(x, y, r) de cada alternativa], letras)], como _grade
+        """
+        if not questoes:
+            return []
+        escala = geo['dpi'] / 72
+        previstos = np.array([(x * escala, (altura - y) * escala) for q in questoes for _, x, y in q['bolhas']],
+                             dtype=np.float32)
+        transformacao = self._alinhar(previstos, circulos, geo)
+        fator = 1.0
+        if transformacao is not None:
+            previstos = cv2.transform(previstos[None], transformacao)[0]
+            fator = float(np.sqrt(abs(np.linalg.det(transformacao[:, :2]))))
+
+        resultado, i = [], 0
+        for q in questoes:
+            raio = max(2, int(round(q['raio'] * escala * fator)))
+            bolhas = [(int(round(x)), int(round(y)), raio) for x, y in previstos[i:i + len(q['bolhas'])]]
+            resultado.append((q['questao'], bolhas, [b[0] for b in q['bolhas']]))
+            i += len(q['bolhas'])
+        return sorted(resultado, key=lambda q: q[0])
+
+    @classmethod
+    def _alinhar(cls, previstos: np.ndarray, circulos: Optional[np.ndarray], geo: Dict) -> Optional[np.ndarray]:
+        """
+        Transformação (deslocamento, giro e escala) que leva as bolhas do layout aos círculos
+        achados na folha, ou None sem círculos
+
+        A grade é periódica: o vizinho mais próximo pode ser a linha de cima e, com a folha
+        girada, o deslocamento muda ao longo da página. Para cada giro candidato, o
+        deslocamento é votado entre todos os pares próximos (só no giro certo os votos das
+        bolhas caem todos juntos); vale o candidato mais votado, e os pares dele ajustam a
+        transformação final (RANSAC descarta os círculos que não são bolhas).
+        """
+        if circulos is None or len(previstos) < 3:
+            return None
+        achados = circulos[0][:, :2].astype(np.float32)
+        centro = previstos.mean(axis=0)
+        passo, tolerancia = geo['passo_alinhamento'], geo['tolerancia_linha'] / 2
+        # Votos num histograma 2D de deslocamentos, achatado para um bincount
+        raio_busca = int(np.ceil(geo['busca_alinhamento'] / passo))
+        lado = 2 * raio_busca + 1
+
+        melhor = None
+        for angulo in np.radians(np.arange(-cls.GIRO_MAXIMO_GRAUS, cls.GIRO_MAXIMO_GRAUS + 1e-6, cls.PASSO_GIRO_GRAUS)):
+            giro = np.array([[np.cos(angulo), -np.sin(angulo)], [np.sin(angulo), np.cos(angulo)]], dtype=np.float32)
+            girados = (previstos - centro) @ giro.T + centro
+            celulas = np.rint((achados[None, :, :] - girados[:, None, :]).reshape(-1, 2) / passo).astype(np.int64)
+            celulas = celulas[np.abs(celulas).max(axis=1) <= raio_busca] + raio_busca
+            if not len(celulas):
+                continue
+            # Soma das células vizinhas: um deslocamento na divisa de duas células não perde votos
+            contagem = np.bincount(celulas[:, 0] * lado + celulas[:, 1], minlength=lado * lado)
+            contagem = cv2.boxFilter(contagem.reshape(lado, lado).astype(np.float32), -1, (3, 3), normalize=False,
+                                     borderType=cv2.BORDER_CONSTANT)
+            indice = int(contagem.argmax())
+            if melhor is None or contagem.flat[indice] > melhor[0]:
+                deslocamento = (np.array(divmod(indice, lado)) - raio_busca) * passo
+                melhor = (contagem.flat[indice], np.hstack([giro, (centro - giro @ centro + deslocamento)[:, None]]))
+        if melhor is None:
+            return None
 
-        # Preparar versões diferentes
-        _, binaria = cv2.threshold(cinza, 127, 255, cv2.THRESH_BINARY)
-        cinza_inv = 255 - cinza
+        transformacao = melhor[1].astype(np.float32)
+        alinhados = cv2.transform(previstos[None], transformacao)[0]
+        distancias = np.linalg.norm(alinhados[:, None, :] - achados[None, :, :], axis=2)
+        mais_perto = distancias.argmin(axis=1)
+        pares = distancias[np.arange(len(previstos)), mais_perto] <= tolerancia
+        if pares.sum() >= 3:
+            ajustada, _ = cv2.estimateAffinePartial2D(previstos[pares], achados[mais_perto[pares]],
+                                                      method=cv2.RANSAC, ransacReprojThreshold=passo * 2)
+            if ajustada is not None:
+                return ajustada
+        return transformacao
+
+    def _detectar_com_ensemble(self, cinza: np.ndarray, questoes: List[Tuple[int, list]], geo: Dict,
+                               calibracao: Optional[Dict] = None) -> Tuple[Dict, Dict]:
+        """
+        Detecta usando votação de múltiplos métodos
+
+        Args:
+            questoes: Bolhas e letras de cada questão localizada (ver _grade e _questoes_do_layout)
+            calibracao: Níveis da faixa de calibração (ver _calibrar); sem ela, os limiares
+                de uma folha com preto 0 e branco 255
+
+        Returns:
+            (respostas, confianca por questão)
+        """
+        # Todos os métodos medem direto o recorte em cinza de cada bolha, com os limiares da
+        # folha: nenhuma imagem inteira (binária, invertida) é montada só para isso
 
         respostas = {}
-        linhas_ord = sorted(linhas.items())
-
-        # Filtrar linhas válidas (devem ter ~10 círculos para questões)
-        linhas_validas = [(y_g, cl) for y_g, cl in linhas_ord if len(cl) >= 10]
-
-        for idx_l, (y_g, circ_linha) in enumerate(linhas_validas):
-            if idx_l >= 20:
-                break
-
-            # Esquerda
-            if len(circ_linha) >= 5:
-                q_esq = idx_l + 1
-                grupo_esq = circ_linha[:5]
-
-                resposta = self._ensemble_deteccao(cinza, binaria, cinza_inv, grupo_esq, q_esq)
-                if resposta:
-                    respostas[str(q_esq)] = resposta
-
-            # Direita - detectar gap
-            if len(circ_linha) >= 10:
-                x_coords = [c[0] for c in circ_linha]
-                diffs = [x_coords[i+1] - x_coords[i] for i in range(len(x_coords)-1)]
-
-                if diffs:
-                    gap_idx = diffs.index(max(diffs))
-                    grupo_dir = circ_linha[gap_idx+1:gap_idx+6]
-                else:
-                    grupo_dir = circ_linha[5:10]
-
-                q_dir = idx_l + 21
-                if len(grupo_dir) >= 5:
-                    resposta = self._ensemble_deteccao(cinza, binaria, cinza_inv, grupo_dir[:5], q_dir)
-                    if resposta:
-                        respostas[str(q_dir)] = resposta
-
-        return respostas
-
-    def _ensemble_deteccao(self, cinza: np.ndarray, binaria: np.ndarray,
-                          cinza_inv: np.ndarray, circulos_alt: list, num_questao: int) -> Optional[str]:
-        """Votação de múltiplos métodos para detectar resposta"""
-
-        votos = {alt: [] for alt in self.alternativas}
+        confianca = {}
+
+        for questao, bolhas, letras in questoes:
+            resposta, confianca[str(questao)] = self._ensemble_deteccao(cinza, calibracao, bolhas, geo, letras)
+            if resposta:
+                respostas[str(questao)] = resposta
+
+        return respostas, confianca
+
+    @staticmethod
+    def _branco_local(cinza: np.ndarray, circulos_alt: list, margem: int) -> Optional[float]:
+        """Branco do papel na linha de bolhas da questão (percentil 90: fora dos círculos)"""
+        raio = max(c[2] for c in circulos_alt) + margem
+        y1, y2 = max(0, min(c[1] for c in circulos_alt) - raio), max(c[1] for c in circulos_alt) + raio
+        x1, x2 = max(0, min(c[0] for c in circulos_alt) - raio), max(c[0] for c in circulos_alt) + raio
+        regiao = cinza[y1:y2, x1:x2]
+        return float(np.percentile(regiao, 90)) if regiao.size else None
+
+    def _ensemble_deteccao(self, cinza: np.ndarray, calibracao: Optional[Dict], circulos_alt: list,
+                           geo: Dict, letras: Optional[List[str]] = None) -> Tuple[Optional[str], Dict]:
+        """
+        Votação de múltiplos métodos para detectar resposta
+
+        Args:
+            letras: Alternativa de cada círculo (padrão: as do leitor, na ordem; V e F numa
+                questão de verdadeiro ou falso)
+
+        Returns:
+            (alternativa ou None, {'scores', 'margem', 'caixa'} da questão)
+        """
+
+        # Só as alternativas impressas na folha (uma prova de 4 alternativas não tem a E)
+        letras = list(letras or self.alternativas[:len(circulos_alt)])
+        votos = {alt: [] for alt in letras}
+        margem = geo['margem_roi']
+        limiares = self._limiares(calibracao, self._branco_local(cinza, circulos_alt, margem) if calibracao else None)
 
         for idx, (x, y, r) in enumerate(circulos_alt):
             # ROI
-            y1, y2 = max(0, y - r - 2), min(cinza.shape[0], y + r + 2)
-            x1, x2 = max(0, x - r - 2), min(cinza.shape[1], x + r + 2)
+            y1, y2 = max(0, y - r - margem), min(cinza.shape[0], y + r + margem)
+            x1, x2 = max(0, x - r - margem), min(cinza.shape[1], x + r + margem)
 
             roi_c = cinza[y1:y2, x1:x2]
-            roi_b = binaria[y1:y2, x1:x2]
-            roi_ci = cinza_inv[y1:y2, x1:x2]
 
             if roi_c.size == 0:
                 continue
 
-            alt = self.alternativas[idx]
+            alt = letras[idx]
 
             # Método 1: Pixels escuros em cinza (ajustado)
-            m1 = np.sum(roi_c < 115) / roi_c.size
+            m1 = np.count_nonzero(roi_c < limiares['escuro']) / roi_c.size
 
-            # Método 2: Pixels pretos em binária
-            m2 = np.sum(roi_b == 0) / roi_b.size
+            # Método 2: Pixels pretos na binarização pelo meio da faixa
+            m2 = np.count_nonzero(roi_c <= limiares['binaria']) / roi_c.size
 
-            # Método 3: Pixels claros em invertida
-            m3 = np.sum(roi_ci > 140) / roi_ci.size
+            # Método 3: Pixels claros na invertida (255 - cinza > 140) são os mesmos do método 1
+            m3 = m1
 
-            # Método 4: Desvio padrão (marcações têm mais variação)
-            m4 = min(np.std(roi_c) / 35, 1.0)
+            # Método 4: Desvio padrão (marcações têm mais variação), relativo ao contraste
+            m4 = min(np.std(roi_c) / (35 * limiares['contraste'] / 255), 1.0)
 
-            # Método 5: Média de intensidade
-            m5 = 1.0 - (np.mean(roi_c) / 255.0)
+            # Método 5: Média de intensidade na faixa preto → branco
+            m5 = 1.0 - min(max((np.mean(roi_c) - limiares['preto']) / limiares['contraste'], 0.0), 1.0)
 
             # Score final - pesos ajustados
             score = (m1 * 0.30 + m2 * 0.30 + m3 * 0.20 + m4 * 0.10 + m5 * 0.10)
@@ -227,28 +733,84 @@ class LeitorFinalV2:
         scores_finais = {}
         for alt, scores in votos.items():
             if scores:
-                scores_finais[alt] = np.mean(scores)
+                scores_finais[alt] = float(np.mean(scores))
             else:
                 scores_finais[alt] = 0.0
 
-        if not scores_finais or max(scores_finais.values()) < 0.10:
-            return None
+        # Guardar o vetor de scores, a margem e a região da linha (para o recorte de revisão)
+        scores_ord = sorted(scores_finais.values(), reverse=True)
+        raio_max = max(c[2] for c in circulos_alt) + margem
+        info = {
+            'scores': {alt: round(s, 4) for alt, s in scores_finais.items()},
+            'margem': round(scores_ord[0] - scores_ord[1], 4) if len(scores_ord) > 1 else round(scores_ord[0], 4),
+            'caixa': [
+                max(0, min(c[0] for c in circulos_alt) - raio_max),
+                max(0, min(c[1] for c in circulos_alt) - raio_max),
+                min(cinza.shape[1], max(c[0] for c in circulos_alt) + raio_max),
+                min(cinza.shape[0], max(c[1] for c in circulos_alt) + raio_max)
+            ]
+        }
+
+        if not scores_finais or scores_ord[0] < self.LIMIAR_MARCACAO:
+            return None, info
 
         # Melhor alternativa
         melhor = max(scores_finais, key=scores_finais.get)
         melhor_score = scores_finais[melhor]
 
         # Validar ambiguidade - DETECTAR MÚLTIPLAS MARCAÇÕES
-        scores_ord = sorted(scores_finais.values(), reverse=True)
         if len(scores_ord) > 1:
             diferenca = scores_ord[0] - scores_ord[1]
-            if diferenca < 0.06:  # Threshold mais relaxado
-                # Registrar que esta questão tem múltiplas marcações ambíguas
-                self.questoes_multiplas.append(num_questao)
-                return None
-
-        return melhor
+            if diferenca < self.LIMIAR_AMBIGUIDADE:  # Threshold mais relaxado
+                # Ambígua (em branco ou múltiplas marcações): classificada em questoes_para_revisao
+                return None, info
+
+        return melhor, info
+
+    @classmethod
+    def questoes_para_revisao(cls, respostas: Dict, confianca: Dict, num_questoes: int,
+                              primeira: int = 1) -> Dict[str, str]:
+        """
+        Classifica as questões de uma leitura que precisam de conferência humana
+
+        Args:
+            respostas: Respostas retornadas por ler_gabarito
+            confianca: Scores por questão da mesma leitura
+            num_questoes: Número de questões esperado na folha
+            primeira: Número da primeira questão da folha (folhas lidas pelo layout mantêm a
+                numeração impressa)
+
+        Returns:
+            Dicionário {questao: motivo}, com motivo 'multipla', 'margem_baixa',
+            'marca_fraca', 'nao_lida' ou 'nao_localizada'. Questões em branco não entram.
+        """
+        todos = [s for info in confianca.values() for s in info['scores'].values()]
+        referencia = float(np.median(todos)) if todos else 0.0
+
+        revisao = {}
+        for q in range(primeira, primeira + num_questoes):
+            chave = str(q)
+            info = confianca.get(chave)
+            if info is None:
+                revisao[chave] = 'nao_localizada'
+                continue
 
+            elevacoes = sorted((s - referencia for s in info['scores'].values()), reverse=True)
+            marcadas = sum(1 for e in elevacoes if e >= cls.LIMIAR_MARCADA)
+
+            if marcadas >= 2:
+                revisao[chave] = 'multipla'
+            elif chave in respostas:
+                if marcadas == 0:
+                    revisao[chave] = 'marca_fraca'
+                elif info['margem'] < cls.LIMIAR_REVISAO:
+                    revisao[chave] = 'margem_baixa'
+            elif marcadas == 1:
+                revisao[chave] = 'nao_lida'
+            elif elevacoes and elevacoes[0] >= cls.LIMIAR_MARCA_FRACA:
+                revisao[chave] = 'marca_fraca'
+
+        return revisao
 
 if __name__ == '__main__':
     leitor = LeitorFinalV2()
@@ -0,0 +1,115 @@
+"""
+Memória da Leitura
+Orçamento de memória do modo streaming (PDFs escaneados muito grandes): limite por worker,
+medição do RSS depois de cada página e devolução da memória ao sistema quando o limite
+é ultrapassado
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import os
+import resource
+import sys
+from typing import Dict, Optional
+
+# Orçamento total de memória da correção em MB (0: sem orçamento, modo normal)
+MEMORIA_MB = int(os.environ.get('GABARITO_MEMORIA_MB', 0))
+
+# Menor fatia do orçamento com que um worker consegue ler uma página A4 escaneada
+MEMORIA_MINIMA_WORKER_MB = 200
+
+_PAGINA = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c')) if sys.platform.startswith('linux') else None
+    _malloc_trim = _libc.malloc_trim if _libc is not None else None
+except (OSError, AttributeError):
+    _malloc_trim = None
+
+
+def rss_mb() -> float:
+    """Memória residente atual do processo (o pico, onde /proc não existe)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGINA / 2**20
+    except (OSError, IndexError, ValueError):
+        return pico_rss_mb()
+
+
+def pico_rss_mb() -> float:
+    """Pico de memória residente do processo (ru_maxrss: KB no Linux, bytes no macOS)"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == 'darwin' else pico / 1024
+
+
+def devolver_memoria():
+    """Coleta o lixo e devolve ao sistema as páginas livres do malloc (glibc)"""
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+def limite_por_worker(memoria_mb: float, workers: int) -> float:
+    """Fatia do orçamento de cada worker (o processo principal conta como mais um)"""
+    return memoria_mb / (workers + 1)
+
+
+def workers_no_orcamento(memoria_mb: float, workers: int) -> int:
+    """Quantos workers cabem no orçamento, cada um com pelo menos MEMORIA_MINIMA_WORKER_MB"""
+    return max(1, min(workers, int(memoria_mb // MEMORIA_MINIMA_WORKER_MB) - 1))
+
+
+def controlar(limite_mb: Optional[float], liberar=None) -> Dict:
+    """
+    Mede o RSS depois de uma página e, acima do limite, libera o que o processo guarda
+    entre páginas (liberar) e devolve a memória ao sistema
+
+    Returns:
+        {'pid', 'rss_mb', 'pico_mb', 'liberada', 'acima'}; 'acima' indica que o processo
+        continua acima do limite mesmo depois de liberar (o pool deve ser renovado)
+    """
+    rss = rss_mb()
+    liberada = False
+    if limite_mb and rss > limite_mb:
+        if liberar:
+            liberar()
+        devolver_memoria()
+        liberada = True
+        rss = rss_mb()
+    return {
+        'pid': os.getpid(),
+        'rss_mb': round(rss, 1),
+        'pico_mb': round(pico_rss_mb(), 1),
+        'liberada': liberada,
+        'acima': bool(limite_mb) and rss > limite_mb
+    }
+
+
+class MonitorMemoria:
+    """Pico de RSS de cada worker e renovações do pool, para o resumo da correção"""
+
+    def __init__(self, memoria_mb: float = 0, workers: int = 1):
+        self.memoria_mb = memoria_mb
+        self.limite_mb = limite_por_worker(memoria_mb, workers) if memoria_mb else None
+        self.picos = {}             # {pid: pico de RSS em MB}
+        self.liberacoes = 0
+        self.renovacoes = 0
+
+    def registrar(self, memoria: Optional[Dict]) -> bool:
+        """Registra a medição de uma página; True se o worker ficou acima do limite"""
+        if not memoria:
+            return False
+        self.picos[memoria['pid']] = max(self.picos.get(memoria['pid'], 0), memoria['pico_mb'])
+        self.liberacoes += memoria['liberada']
+        return memoria['acima']
+
+    def resumo(self) -> Dict:
+        return {
+            'orcamento_mb': self.memoria_mb or None,
+            'limite_por_worker_mb': round(self.limite_mb, 1) if self.limite_mb else None,
+            'pico_por_worker_mb': dict(self.picos),
+            'pico_principal_mb': round(pico_rss_mb(), 1),
+            'liberacoes': self.liberacoes,
+            'renovacoes': self.renovacoes
+        }
@@ -0,0 +1,249 @@
+"""
+Perfil de Execução
+Perfil opcional de um envio (campo profile=1 na API): o cProfile mede chamadas e tempos
+por função e um amostrador guarda as pilhas a intervalos fixos, para o flame graph. Mede
+as etapas do agendador daquele envio e a leitura de cada página dentro dos workers
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Os arquivos do perfil ficam ao lado dos relatórios
+PASTA_PERFIS = 'relatorios_correcao'
+
+# Intervalo entre duas amostras das pilhas
+INTERVALO_AMOSTRAS_MS = float(os.environ.get('GABARITO_PERFIL_INTERVALO_MS', 5))
+
+# Contadores por etapa, tirados das chamadas registradas pelo cProfile:
+# nome -> (arquivo, função, função que chama ou None para qualquer uma)
+ETAPAS = {
+    'hough': ('leitor_gabarito.py', '_hough', None),
+    'qr_pre_processamentos': ('corrigir_rapido.py', 'preprocessar_imagem_para_codigo',
+                              'detectar_qrcode_multiplas_tentativas'),
+    'ra_barcode': ('corrigir_rapido.py', 'detectar_barcode', None),
+    'ra_inclinacao': ('corrigir_rapido.py', 'corrigir_inclinacao', None),
+    'ra_rotacoes': ('~', 'rotate', 'rotacoes_da_imagem'),
+    'paginas_rotacionadas': ('~', 'rotate', 'extrair_imagem_escaneada'),
+}
+
+# Funções mais pesadas (tempo próprio) listadas no resumo
+FUNCOES_RESUMO = 25
+
+
+def arquivos_perfil(lote_id: str, pasta: str = PASTA_PERFIS) -> Dict[str, str]:
+    """Caminhos do perfil de um lote: estatísticas do cProfile, pilhas e resumo"""
+    base = os.path.join(pasta, f"perfil_{lote_id}")
+    return {'prof': base + '.prof', 'pilhas': base + '_pilhas.txt', 'resumo': base + '.json'}
+
+
+def _nome_funcao(nome: str) -> str:
+    """'<built-in method cv2.rotate>' ou '<rotate>' -> 'rotate'"""
+    return re.sub(r"^<(?:built-in method )?(?:\w+\.)*|>$", '', nome)
+
+
+def _rotulo(codigo) -> str:
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+class _Coletadas:
+    """Estatísticas brutas do cProfile vindas de outro processo, no formato que pstats aceita"""
+
+    def __init__(self, estatisticas: Dict):
+        self.stats = estatisticas
+
+    def create_stats(self):
+        pass
+
+
+class PerfilExecucao:
+    """
+    Perfil de um envio, ligado só nos trechos que trabalham para ele (medir)
+
+    O cProfile é por thread: cada trecho medido liga o perfilador na thread que o executa.
+    As amostras das pilhas vêm de uma thread à parte, que só olha as threads dentro de um
+    trecho medido. Os perfis das páginas lidas nos workers são somados com somar.
+    """
+
+    def __init__(self, intervalo_ms: float = INTERVALO_AMOSTRAS_MS):
+        self.intervalo = intervalo_ms / 1000
+        self.pilhas = Counter()
+        self.amostras = 0
+        self.paginas = 0
+        self.paginas_sem_ra = 0
+        self.recursos = {}      # {recurso do OpenCV: {'criados', 'reusos'}} nos trechos medidos
+        self._perfil = cProfile.Profile()
+        self._somadas = []
+        self._medindo = {}      # {id da thread: trechos abertos}
+        self._trava = threading.Lock()
+        self._parar = threading.Event()
+        self._amostrador = None
+        self._inicio = time.perf_counter()
+
+    @contextmanager
+    def medir(self):
+        """Mede o trecho no cProfile, nas amostras das pilhas e nos recursos do OpenCV usados pela thread"""
+        # Carregado só aqui: o servidor lê os resumos gravados sem subir o OpenCV
+        import recursos_opencv
+
+        thread = threading.get_ident()
+        with self._trava:
+            abertos = self._medindo.get(thread, 0)
+            self._medindo[thread] = abertos + 1
+            if self._amostrador is None:
+                self._amostrador = threading.Thread(target=self._amostrar, name='perfil-amostras', daemon=True)
+                self._amostrador.start()
+
+        ligado = False
+        antes = recursos_opencv.estatisticas(so_desta_thread=True) if not abertos else None
+        if not abertos:
+            try:
+                self._perfil.enable()
+                ligado = True
+            except ValueError:
+                # Outro perfilador já ativo (Python 3.12+): fica só com as amostras
+                pass
+        try:
+            yield self
+        finally:
+            if ligado:
+                self._perfil.disable()
+            if antes is not None:
+                depois = recursos_opencv.estatisticas(so_desta_thread=True)
+                self._somar_recursos({
+                    nome: {campo: n - antes.get(nome, {}).get(campo, 0) for campo, n in contador.items()}
+                    for nome, contador in depois.items()
+                })
+            with self._trava:
+                if abertos:
+                    self._medindo[thread] = abertos
+                else:
+                    del self._medindo[thread]
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            with self._trava:
+                threads = list(self._medindo)
+            quadros = sys._current_frames()
+            for thread in threads:
+                quadro = quadros.get(thread)
+                if quadro is None:
+                    continue
+                pilha = []
+                while quadro is not None:
+                    pilha.append(_rotulo(quadro.f_code))
+                    quadro = quadro.f_back
+                self.pilhas[';'.join(reversed(pilha))] += 1
+                self.amostras += 1
+
+    def registrar_leitura(self, leitura: Dict):
+        """Conta uma página lida (e se ficou sem RA) para o resumo"""
+        self.paginas += 1
+        if leitura.get('tipo_pagina', 'gabarito') == 'gabarito' and not leitura.get('ra'):
+            self.paginas_sem_ra += 1
+
+    def _somar_recursos(self, recursos: Dict[str, Dict[str, int]]):
+        with self._trava:
+            for nome, contador in recursos.items():
+                if not any(contador.values()):
+                    continue
+                total = self.recursos.setdefault(nome, {'criados': 0, 'reusos': 0})
+                for campo, n in contador.items():
+                    total[campo] += n
+
+    def somar(self, dados: Optional[Dict]):
+        """Soma o perfil exportado por outro processo (ver exportar)"""
+        if not dados:
+            return
+        self._somadas.append(dados['estatisticas'])
+        self.pilhas.update(dados['pilhas'])
+        self.amostras += dados['amostras']
+        self._somar_recursos(dados.get('recursos', {}))
+
+    def encerrar(self):
+        """Para o amostrador (os trechos já medidos continuam valendo)"""
+        self._parar.set()
+        if self._amostrador is not None and self._amostrador is not threading.current_thread():
+            self._amostrador.join()
+
+    def exportar(self) -> Dict:
+        """Perfil em tipos simples, para voltar de um worker junto da leitura"""
+        self.encerrar()
+        self._perfil.create_stats()
+        return {'estatisticas': self._perfil.stats, 'pilhas': dict(self.pilhas), 'amostras': self.amostras,
+                'recursos': self.recursos}
+
+    def estatisticas(self) -> pstats.Stats:
+        """Estatísticas deste processo somadas às dos workers"""
+        self._perfil.create_stats()
+        total = pstats.Stats()
+        for estatisticas in [dict(self._perfil.stats)] + self._somadas:
+            # Stats recusa um perfil vazio (processo em que o cProfile não chegou a ligar)
+            if estatisticas:
+                total.add(pstats.Stats(_Coletadas(estatisticas)))
+        return total
+
+    @staticmethod
+    def contadores(estatisticas: pstats.Stats) -> Dict[str, int]:
+        """Quantas vezes cada etapa de ETAPAS rodou"""
+        contagens = dict.fromkeys(ETAPAS, 0)
+        for (arquivo, _, funcao), (_, chamadas, _, _, chamadores) in estatisticas.stats.items():
+            for etapa, (arquivo_etapa, funcao_etapa, chamador) in ETAPAS.items():
+                if os.path.basename(arquivo) != arquivo_etapa or _nome_funcao(funcao) != funcao_etapa:
+                    continue
+                if chamador is None:
+                    contagens[etapa] += chamadas
+                else:
+                    contagens[etapa] += sum(c[1] for (_, _, f), c in chamadores.items() if f == chamador)
+        return contagens
+
+    def gravar(self, lote_id: str, pasta: str = PASTA_PERFIS) -> Dict:
+        """
+        Grava o perfil ao lado dos relatórios (ver arquivos_perfil)
+
+        - .prof: estatísticas do cProfile (pstats, snakeviz, ...)
+        - _pilhas.txt: pilhas no formato "colapsado" (flamegraph.pl, speedscope, ...)
+        - .json: contadores por etapa, criações e reusos dos recursos do OpenCV (CLAHE,
+          detector de QR, buffers) e as funções mais pesadas
+
+        Returns:
+            O resumo gravado no .json
+        """
+        self.encerrar()
+        estatisticas = self.estatisticas()
+        caminhos = arquivos_perfil(lote_id, pasta)
+        os.makedirs(pasta, exist_ok=True)
+
+        estatisticas.dump_stats(caminhos['prof'])
+        with open(caminhos['pilhas'], 'w', encoding='utf-8') as f:
+            for pilha, amostras in self.pilhas.most_common():
+                f.write(f"{pilha} {amostras}\n")
+
+        mais_pesadas = sorted(estatisticas.stats.items(), key=lambda item: item[1][2], reverse=True)
+        resumo = {
+            'lote_id': lote_id,
+            'duracao_s': round(time.perf_counter() - self._inicio, 3),
+            'paginas_lidas': self.paginas,
+            'paginas_sem_ra': self.paginas_sem_ra,
+            'amostras': self.amostras,
+            'intervalo_amostras_ms': self.intervalo * 1000,
+            'contadores': self.contadores(estatisticas),
+            'recursos_opencv': dict(sorted(self.recursos.items())),
+            'funcoes': [
+                {'funcao': f"{funcao} ({os.path.basename(arquivo)}:{linha})", 'chamadas': chamadas,
+                 'tempo_proprio_s': round(proprio, 4), 'tempo_total_s': round(total, 4)}
+                for (arquivo, linha, funcao), (_, chamadas, proprio, total, _) in mais_pesadas[:FUNCOES_RESUMO]
+            ],
+            'arquivos': {tipo: os.path.basename(caminho) for tipo, caminho in caminhos.items()}
+        }
+        with open(caminhos['resumo'], 'w', encoding='utf-8') as f:
+            json.dump(resumo, f, ensure_ascii=False, indent=2)
+        return resumo
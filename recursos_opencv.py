@@ -0,0 +1,107 @@
+"""
+Recursos Nativos do OpenCV
+Objetos do OpenCV criados uma vez por thread e reaproveitados em todas as páginas
+(CLAHE por parâmetros, detector de QR), em vez de um novo a cada página ou tentativa,
+e buffers pré-alocados para as imagens intermediárias do modo streaming
+"""
+
+import threading
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+# Um cache por thread: CLAHE e QRCodeDetector guardam estado interno durante o uso
+_locais = threading.local()
+
+# Contagem global de criações e reusos por recurso (aparece nas estatísticas do benchmark);
+# cada thread também conta as suas, para o perfil de um trecho (ver perfil_execucao)
+_trava = threading.Lock()
+_contadores = {}
+
+# Liberações pedidas para todas as threads: cada thread descarta o seu cache no próximo
+# uso quando a geração muda (o cache de uma thread só é mexido por ela mesma)
+_geracao = 0
+
+
+def _obter(chave: Tuple, criar):
+    """Objeto da thread para a chave, criado na primeira vez"""
+    cache = getattr(_locais, 'cache', None)
+    if cache is None or getattr(_locais, 'geracao', 0) != _geracao:
+        cache = _locais.cache = {}
+        _locais.geracao = _geracao
+
+    objeto = cache.get(chave)
+    criado = objeto is None
+    if criado:
+        objeto = cache[chave] = criar()
+
+    nome = _nome(chave)
+    campo = 'criados' if criado else 'reusos'
+    with _trava:
+        _contadores.setdefault(nome, {'criados': 0, 'reusos': 0})[campo] += 1
+    da_thread = getattr(_locais, 'contadores', None)
+    if da_thread is None:
+        da_thread = _locais.contadores = {}
+    da_thread.setdefault(nome, {'criados': 0, 'reusos': 0})[campo] += 1
+    return objeto
+
+
+def _nome(chave: Tuple) -> str:
+    tipo, *parametros = chave
+    texto = ', '.join('x'.join(map(str, p)) if isinstance(p, tuple) else str(p) for p in parametros)
+    return f"{tipo}({texto})" if parametros else tipo
+
+
+def clahe(clip_limit: float = 2.0, grade: Tuple[int, int] = (8, 8)):
+    """CLAHE da thread para estes parâmetros"""
+    return _obter(('clahe', float(clip_limit), tuple(grade)),
+                  lambda: cv2.createCLAHE(clipLimit=float(clip_limit), tileGridSize=tuple(grade)))
+
+
+def detector_qr():
+    """QRCodeDetector da thread"""
+    return _obter(('qr',), cv2.QRCodeDetector)
+
+
+def buffer(nome: str, forma: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+    """
+    Array pré-alocado da thread para uma imagem intermediária (saída 'dst' do OpenCV)
+
+    É o mesmo array em todas as páginas do mesmo tamanho: o conteúdo só vale até o
+    próximo uso do mesmo nome na thread.
+    """
+    atual = getattr(_locais, 'cache', {}).get(('buffer', nome))
+    if atual is not None and (atual.shape != tuple(forma) or atual.dtype != dtype):
+        # Página de outro tamanho: realoca
+        del _locais.cache[('buffer', nome)]
+    return _obter(('buffer', nome), lambda: np.empty(forma, dtype=dtype))
+
+
+def liberar(todas_as_threads: bool = False):
+    """
+    Descarta os objetos e buffers da thread (recriados no próximo uso)
+
+    Args:
+        todas_as_threads: Também os das outras threads do processo, que os descartam
+            no próximo uso (um array ainda em uso na página atual continua válido)
+    """
+    global _geracao
+    if todas_as_threads:
+        with _trava:
+            _geracao += 1
+    _locais.cache = {}
+    _locais.geracao = _geracao
+
+
+def estatisticas(so_desta_thread: bool = False) -> Dict[str, Dict[str, int]]:
+    """{recurso: {'criados', 'reusos'}} somando todas as threads do processo (ou só os da thread atual)"""
+    if so_desta_thread:
+        return {nome: dict(contador) for nome, contador in sorted(getattr(_locais, 'contadores', {}).items())}
+    with _trava:
+        return {nome: dict(contador) for nome, contador in sorted(_contadores.items())}
+
+
+def zerar_estatisticas():
+    with _trava:
+        _contadores.clear()
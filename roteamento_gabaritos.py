@@ -0,0 +1,254 @@
+"""
+Roteamento de Gabaritos
+Escolhe o gabarito de cada página quando um mesmo PDF traz provas de várias disciplinas
+(a escola escaneia a pilha inteira de uma vez): pelo código da prova no QR da folha ou por
+faixas de páginas informadas no envio
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from corretor import Corretor
+from folhas_prova import QUESTOES_POR_FOLHA, MontadorProvas, dividir_questoes, id_prova, questoes_do_layout
+
+# Onde ficam os gabaritos salvos pela interface (nome do arquivo = código da prova)
+PASTA_GABARITOS = 'gabaritos'
+
+# Layout das seções de um gabarito personalizado, gravado ao lado do gabarito
+SUFIXO_LAYOUT = '.layout.json'
+
+
+def interpretar_faixas(texto: str, caminho_gabarito: Callable[[str], str] = str) -> List[Tuple[int, int, str]]:
+    """
+    Lê as faixas de páginas de um envio: '1-20=matematica, 21-40=portugues, 41=ingles'
+
+    Args:
+        texto: Faixas separadas por vírgula ou ponto e vírgula (páginas a partir de 1)
+        caminho_gabarito: Converte o nome informado no caminho do gabarito
+
+    Returns:
+        [(primeira página, última página, caminho do gabarito), ...], com páginas a partir de 0
+
+    Raises:
+        ValueError: Faixa mal escrita ou que se sobrepõe a outra
+    """
+    faixas = []
+    for parte in re.split(r'[;,]', texto or ''):
+        parte = parte.strip()
+        if not parte:
+            continue
+        m = re.fullmatch(r'(\d+)\s*(?:-\s*(\d+))?\s*=\s*(.+)', parte)
+        if not m:
+            raise ValueError(f"Faixa inválida: '{parte}' (use, por exemplo, 1-20=matematica)")
+        primeira, ultima = int(m.group(1)), int(m.group(2) or m.group(1))
+        if primeira < 1 or ultima < primeira:
+            raise ValueError(f"Faixa inválida: '{parte}'")
+        faixas.append((primeira - 1, ultima - 1, caminho_gabarito(m.group(3).strip())))
+
+    faixas.sort()
+    for (_, ultima, _), (primeira, _, _) in zip(faixas, faixas[1:]):
+        if primeira <= ultima:
+            raise ValueError(f"Faixas sobrepostas na página {primeira + 1}")
+    return faixas
+
+
+class RoteadorGabaritos:
+    """
+    Gabaritos de um envio, carregados uma única vez, e a regra que escolhe o de cada página
+
+    Ordem da escolha: a faixa de páginas que contém a página; o código da prova lido no QR
+    (gabaritos/<código>.json); o gabarito padrão do envio. Com um só gabarito e sem
+    faixas, todas as páginas vão para ele, como antes.
+    """
+
+    def __init__(self, padrao: Optional[str] = None, faixas: Optional[List[Tuple[int, int, str]]] = None,
+                 por_codigo: bool = False, pasta: str = PASTA_GABARITOS, log=print):
+        """
+        Args:
+            padrao: Gabarito das páginas que não caem em nenhuma regra (opcional)
+            faixas: [(primeira, última página a partir de 0, caminho)], ver interpretar_faixas
+            por_codigo: Escolher pelo código da prova no QR (carrega todos os gabaritos da pasta)
+            pasta: Pasta dos gabaritos buscados pelo código da prova
+
+        Raises:
+            ValueError: Gabarito padrão ou de alguma faixa que não pôde ser carregado
+        """
+        self.padrao = str(padrao) if padrao else None
+        self.faixas = [(p, u, str(c)) for p, u, c in (faixas or [])]
+        self.por_codigo = por_codigo
+        self._corretores = {}       # {caminho: Corretor}
+        self._layouts = {}          # {caminho: layout das seções ou None}
+        self.por_prova = {}         # {código da prova no QR: caminho}
+
+        for caminho in ([self.padrao] if self.padrao else []) + [c for _, _, c in self.faixas]:
+            if self.carregar(caminho) is None:
+                raise ValueError(f"Erro ao carregar gabarito: {caminho}")
+
+        if por_codigo:
+            for arquivo in sorted(Path(pasta).glob('*.json')):
+                if arquivo.name.endswith(SUFIXO_LAYOUT):
+                    continue
+                if self.carregar(str(arquivo)) is not None:
+                    self.por_prova[id_prova(arquivo.stem, '', 0)] = str(arquivo)
+                else:
+                    log(f"⚠ Gabarito ignorado (não pôde ser lido): {arquivo}")
+
+        if not self._corretores:
+            raise ValueError("Nenhum gabarito para a correção")
+
+        # {código da prova: número de questões}, usado na leitura para saber o tamanho da folha
+        self.questoes_por_prova = {prova: self.num_questoes(c) for prova, c in self.por_prova.items()}
+        # {código da prova: layout}, só das provas personalizadas (seções mistas)
+        self.layouts_por_prova = {prova: self.layout(c) for prova, c in self.por_prova.items() if self.layout(c)}
+
+    def carregar(self, caminho: str) -> Optional[Corretor]:
+        """Corretor de um gabarito, carregado na primeira vez (None se não puder ser lido)"""
+        caminho = str(caminho)
+        if caminho not in self._corretores:
+            corretor = Corretor()
+            if not corretor.carregar_gabarito_oficial(caminho) or not corretor.gabarito_oficial:
+                return None
+            self._corretores[caminho] = corretor
+        return self._corretores[caminho]
+
+    def corretor(self, caminho: str) -> Corretor:
+        return self._corretores[caminho]
+
+    def num_questoes(self, caminho: str) -> int:
+        return len(self._corretores[caminho].gabarito_oficial)
+
+    def layout(self, caminho: str) -> Optional[Dict]:
+        """
+        Layout das seções de um gabarito personalizado: <gabarito>.layout.json ao lado do
+        gabarito (o arquivo gravado pelo gerador junto do PDF). None para as folhas comuns
+        """
+        if caminho not in self._layouts:
+            arquivo = os.path.splitext(caminho)[0] + SUFIXO_LAYOUT
+            try:
+                with open(arquivo, 'r', encoding='utf-8') as f:
+                    self._layouts[caminho] = json.load(f)
+            except (OSError, ValueError):
+                self._layouts[caminho] = None
+        return self._layouts[caminho]
+
+    def folhas(self, caminho: str) -> int:
+        """Folhas por aluno: as páginas do layout num gabarito personalizado, senão dividir_questoes"""
+        layout = self.layout(caminho)
+        if layout:
+            return len(questoes_do_layout(layout))
+        return len(dividir_questoes(self.num_questoes(caminho)))
+
+    @property
+    def gabaritos(self) -> List[str]:
+        """Caminhos de todos os gabaritos carregados"""
+        return list(self._corretores)
+
+    @property
+    def varias_folhas(self) -> bool:
+        """Se algum dos gabaritos é de uma prova com várias folhas"""
+        return any(self.folhas(c) > 1 for c in self._corretores)
+
+    def gabarito_da_faixa(self, page_num: int) -> Optional[str]:
+        for primeira, ultima, caminho in self.faixas:
+            if primeira <= page_num <= ultima:
+                return caminho
+        return None
+
+    def opcoes_leitura(self, page_num: int) -> Dict:
+        """
+        Parâmetros da leitura de uma página, decididos antes de ler o QR: o número de questões
+        da faixa (ou do padrão) e, quando vale o código do QR, o tamanho de cada prova. Os
+        layouts só entram quando há gabarito personalizado (as chaves do cache não mudam)
+        """
+        faixa = self.gabarito_da_faixa(page_num)
+        caminho = faixa or self.padrao
+        opcoes = {
+            'num_questoes': self.num_questoes(caminho) if caminho else QUESTOES_POR_FOLHA,
+            'questoes_por_prova': self.questoes_por_prova if self.por_codigo and not faixa else None
+        }
+        layout = self.layout(caminho) if caminho else None
+        if layout:
+            opcoes['layout'] = layout
+        if self.layouts_por_prova and not faixa:
+            opcoes['layouts_por_prova'] = self.layouts_por_prova
+        return opcoes
+
+    def resolver(self, page_num: int, prova: Optional[str] = None, continuacao: Optional[str] = None) -> Optional[str]:
+        """
+        Gabarito de uma página lida
+
+        Args:
+            prova: Código da prova lido no QR
+            continuacao: Gabarito da folha anterior, quando a prova dela espera a folha
+                seguinte (vale para uma folha sem código)
+
+        Returns:
+            Caminho do gabarito, ou None se nenhuma regra se aplica
+        """
+        faixa = self.gabarito_da_faixa(page_num)
+        if faixa:
+            return faixa
+        if self.por_codigo:
+            if prova in self.por_prova:
+                return self.por_prova[prova]
+            if not prova and continuacao:
+                return continuacao
+        return self.padrao
+
+
+class SeparadorGabaritos:
+    """
+    Separa as páginas de um arquivo por gabarito, na ordem do PDF
+
+    Cada gabarito de várias folhas tem o próprio MontadorProvas, então as folhas de provas
+    de disciplinas diferentes intercaladas no mesmo PDF não se misturam.
+    """
+
+    def __init__(self, roteador: RoteadorGabaritos):
+        self.roteador = roteador
+        self.montadores = {}        # {caminho: MontadorProvas}
+        self.paginas = {}           # {caminho: páginas corrigidas com ele}
+        self._ultimo = None         # gabarito da última página encaminhada
+
+    def encaminhar(self, page_num: int, leitura: Dict, log=print) -> Tuple[Optional[str], Optional[MontadorProvas]]:
+        """
+        Gabarito e montador de uma página lida
+
+        Returns:
+            (caminho do gabarito, montador ou None); caminho None se a página não pôde ser
+            atribuída a nenhum gabarito
+        """
+        prova = (leitura.get('folha') or {}).get('prova')
+        anterior = self.montadores.get(self._ultimo)
+        continuacao = self._ultimo if anterior and anterior.aguardando() else None
+
+        caminho = self.roteador.resolver(page_num, prova, continuacao)
+        if caminho is None:
+            log(f"✗ Nenhum gabarito para a página {page_num + 1}"
+                f"{f' (prova {prova} sem gabarito em {PASTA_GABARITOS}/)' if prova else ' (sem código da prova)'}")
+            return None, None
+        if prova and self.roteador.por_codigo and prova not in self.roteador.por_prova \
+                and not self.roteador.gabarito_da_faixa(page_num):
+            log(f"⚠ Prova {prova} sem gabarito em {PASTA_GABARITOS}/: usando {Path(caminho).stem}")
+
+        montador = self.montadores.get(caminho)
+        if montador is None and self.roteador.folhas(caminho) > 1:
+            montador = self.montadores[caminho] = MontadorProvas(self.roteador.num_questoes(caminho),
+                                                                 self.roteador.layout(caminho))
+
+        self._ultimo = caminho
+        self.paginas[caminho] = self.paginas.get(caminho, 0) + 1
+        if len(self.roteador.gabaritos) > 1:
+            log(f"📑 Gabarito: {Path(caminho).stem}")
+        return caminho, montador
+
+    def pendentes(self) -> List[Tuple[str, MontadorProvas, Dict]]:
+        """Provas incompletas de todos os gabaritos no fim do arquivo: [(caminho, montador, prova)]"""
+        provas = []
+        for caminho, montador in self.montadores.items():
+            provas += [(caminho, montador, prova) for prova in montador.pendentes()]
+        self._ultimo = None
+        return sorted(provas, key=lambda p: min(f[0] for f in p[2]['folhas'].values()))
@@ -7,6 +7,9 @@ const reportModal = document.getElementById('reportModal');
 const modalClose = document.querySelector('.modal-close');
 const reportContent = document.getElementById('reportContent');
 
+// Perfil de execução dos envios (abrir a página com ?perfil=1): gera .prof e pilhas por correção
+const perfilAtivo = new URLSearchParams(window.location.search).has('perfil');
+
 // Event Listeners para Tabs
 document.querySelectorAll('.tab-btn').forEach(btn => {
     btn.addEventListener('click', () => {
@@ -50,12 +53,12 @@ window.addEventListener('click', (e) => {
 
 // Funções
 // Função para monitorar progresso da correção em tempo real
-async function monitorarProgresso(jobId, fileName) {
+async function monitorarProgresso(jobId, fileName, url = `/api/correction-progress/${jobId}`) {
     let ultimosLogs = [];
 
     while (true) {
         try {
-            const response = await fetch(`/api/correction-progress/${jobId}`);
+            const response = await fetch(url);
             const progress = await response.json();
 
             if (!response.ok) {
@@ -78,6 +81,11 @@ async function monitorarProgresso(jobId, fileName) {
                 ultimosLogs = progress.logs;
             }
 
+            if (progress.perfil && progress.status !== 'processing') {
+                addLog(`⚙ Perfil de ${fileName}: /api/perfil/${jobId}/prof (cProfile), ` +
+                       `/api/perfil/${jobId}/pilhas (flame graph)`, 'info');
+            }
+
             // Verificar se terminou
             if (progress.status === 'completed') {
                 const msg = `✅ ${fileName} - Corrigido com sucesso!`;
@@ -113,21 +121,122 @@ async function handleFiles(files) {
         return;
     }
 
-    // Filtrar apenas PDFs
+    // Filtrar apenas PDFs e ZIPs de PDFs
     const pdfFiles = Array.from(files).filter(file => file.type === 'application/pdf');
+    const zipFiles = Array.from(files).filter(file => file.name.toLowerCase().endsWith('.zip'));
 
-    if (pdfFiles.length === 0) {
-        showStatus('✗ Nenhum arquivo PDF válido selecionado', 'error');
+    if (pdfFiles.length === 0 && zipFiles.length === 0) {
+        showStatus('✗ Nenhum arquivo PDF ou ZIP válido selecionado', 'error');
         return;
     }
 
-    if (pdfFiles.length !== files.length) {
-        showStatus(`⚠️ ${files.length - pdfFiles.length} arquivo(s) ignorado(s) (apenas PDFs são aceitos)`, 'error');
+    if (pdfFiles.length + zipFiles.length !== files.length) {
+        showStatus(`⚠️ ${files.length - pdfFiles.length - zipFiles.length} arquivo(s) ignorado(s) (apenas PDFs e ZIPs são aceitos)`, 'error');
         await sleep(2000);
     }
 
+    for (const zip of zipFiles) {
+        await enviarLote(zip, gabaritoSelecionado);
+    }
+
     // Processar múltiplos arquivos
-    await processarMultiplosArquivos(pdfFiles, gabaritoSelecionado);
+    if (pdfFiles.length > 0) {
+        await processarMultiplosArquivos(pdfFiles, gabaritoSelecionado);
+    }
+}
+
+// Envia um ZIP de PDFs: o servidor extrai e corrige todos como um lote só
+async function enviarLote(file, gabarito) {
+    showStatus(`⏳ Enviando ${file.name}...`, 'loading');
+    addLog(`⏳ Enviando ${file.name}...`, 'loading');
+
+    const formData = new FormData();
+    formData.append('files', file);
+    formData.append('gabarito', gabarito);
+    if (perfilAtivo) {
+        formData.append('profile', '1');
+    }
+
+    try {
+        const response = await fetch('/api/upload/lote', { method: 'POST', body: formData });
+        const data = await response.json();
+
+        if (!response.ok) {
+            const msg = `✗ ${file.name} - ${data.error || 'Erro desconhecido'}`;
+            showStatus(msg, 'error');
+            addLog(msg, 'error');
+            return;
+        }
+
+        addLog(`⏳ Corrigindo ${data.arquivos.length} PDF(s) de ${file.name}...`, 'loading');
+        await monitorarProgresso(data.lote_id, file.name, `/api/lote/${data.lote_id}`);
+    } catch (error) {
+        const msg = `✗ ${file.name} - Erro: ${error.message}`;
+        showStatus(msg, 'error');
+        addLog(msg, 'error');
+    }
+
+    setTimeout(() => {
+        loadReports();
+        loadStats();
+    }, 1000);
+}
+
+// Envia um arquivo em partes (grava direto no disco do servidor e pode ser retomado)
+async function enviarArquivoEmPartes(file, gabarito) {
+    const inicio = await fetch('/api/upload/iniciar', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ nome: file.name, tamanho: file.size, gabarito: gabarito, profile: perfilAtivo })
+    });
+    const upload = await inicio.json();
+    if (!inicio.ok) {
+        return { error: upload.error || `Erro no servidor (${inicio.status})` };
+    }
+
+    let offset = 0;
+    let tentativas = 0;
+
+    while (offset < file.size) {
+        const fim = Math.min(offset + upload.chunk_size, file.size);
+
+        try {
+            const response = await fetch(`/api/upload/${upload.upload_id}/parte`, {
+                method: 'PUT',
+                headers: { 'X-Upload-Offset': String(offset) },
+                body: file.slice(offset, fim)
+            });
+            const data = await response.json();
+
+            if (response.ok || response.status === 409) {
+                // 409: o servidor informa de onde continuar
+                offset = data.recebido;
+                tentativas = 0;
+            } else {
+                return { error: data.error || `Erro no servidor (${response.status})` };
+            }
+
+            const percentual = Math.round(offset / file.size * 100);
+            showStatus(`⏳ Enviando ${file.name}: ${percentual}%`, 'loading');
+        } catch (error) {
+            // Falha de rede: perguntar ao servidor quanto já chegou e retomar
+            if (++tentativas > 5) {
+                return { error: error.message };
+            }
+            await sleep(1000 * tentativas);
+            try {
+                const status = await fetch(`/api/upload/${upload.upload_id}`);
+                if (status.ok) {
+                    offset = (await status.json()).recebido;
+                }
+            } catch (e) {
+                // Servidor ainda indisponível, tentar de novo
+            }
+        }
+    }
+
+    const conclusao = await fetch(`/api/upload/${upload.upload_id}/concluir`, { method: 'POST' });
+    return await conclusao.json();
 }
 
 async function processarMultiplosArquivos(files, gabarito) {
@@ -135,41 +244,24 @@ async function processarMultiplosArquivos(files, gabarito) {
     let sucessos = 0;
     let erros = 0;
 
+    // A correção de cada arquivo começa assim que ele termina de chegar,
+    // enquanto os próximos continuam sendo enviados
+    const correcoes = [];
+
     for (let i = 0; i < files.length; i++) {
         const file = files[i];
         const atual = i + 1;
 
-        showStatus(`⏳ Corrigindo ${atual}/${total}: ${file.name}...`, 'loading');
-        addLog(`⏳ Corrigindo ${atual}/${total}: ${file.name}...`, 'loading');
+        showStatus(`⏳ Enviando ${atual}/${total}: ${file.name}...`, 'loading');
+        addLog(`⏳ Enviando ${atual}/${total}: ${file.name}...`, 'loading');
 
         try {
-            const formData = new FormData();
-            formData.append('file', file);
-            formData.append('gabarito', gabarito);
-
-            const response = await fetch('/api/upload', {
-                method: 'POST',
-                body: formData
-            });
+            const data = await enviarArquivoEmPartes(file, gabarito);
 
-            let data;
-            try {
-                data = await response.json();
-            } catch (e) {
-                // Se não conseguir fazer parse do JSON, capturar o texto
-                const text = await response.text();
-                data = { error: `Erro no servidor (${response.status})` };
-                console.error('Resposta não-JSON:', text);
-            }
-
-            if (response.ok && data.job_id) {
-                // Iniciar polling do progresso
-                const resultado = await monitorarProgresso(data.job_id, file.name);
-                if (resultado.sucesso) {
-                    sucessos++;
-                } else {
-                    erros++;
-                }
+            if (data.job_id) {
+                addLog(`⏳ Corrigindo ${atual}/${total}: ${file.name}...`, 'loading');
+                // Iniciar polling do progresso sem bloquear o próximo envio
+                correcoes.push(monitorarProgresso(data.job_id, file.name));
             } else {
                 erros++;
                 const msg = `✗ ${file.name} - ${data.error || 'Erro desconhecido'}`;
@@ -183,9 +275,14 @@ async function processarMultiplosArquivos(files, gabarito) {
             addLog(msg, 'error');
             console.error('Erro no upload:', error);
         }
+    }
 
-        // Pequena pausa entre arquivos para mostrar o status
-        await sleep(500);
+    for (const resultado of await Promise.all(correcoes)) {
+        if (resultado.sucesso) {
+            sucessos++;
+        } else {
+            erros++;
+        }
     }
 
     // Mostrar resumo final
@@ -400,7 +497,7 @@ function switchTab(tabName) {
 
     // Adicionar ativo à aba selecionada
     document.getElementById(`tab-${tabName}`).classList.add('active');
-    event.target.classList.add('active');
+    event.target.closest('.tab-btn').classList.add('active');
 
     // Se for gabaritos, carregar dados
     if (tabName === 'gabaritos') {
@@ -409,6 +506,10 @@ function switchTab(tabName) {
         loadPDFsGerados();
         setupQuestoesInputs();
     }
+
+    if (tabName === 'revisao') {
+        loadRevisao();
+    }
 }
 
 // Funções de Gabaritos
@@ -973,7 +1074,7 @@ async function loadGabaritosSelect() {
             const selected = gab.oficial ? 'selected' : '';
             const label = gab.oficial ? `${gab.nome} (Oficial) - ${gab.questoes} questões` : `${gab.nome} - ${gab.questoes} questões`;
             return `<option value="${gab.nome}" ${selected}>${label}</option>`;
-        }).join('');
+        }).join('') + '<option value="auto">Automático - gabarito pelo código da prova de cada folha</option>';
 
     } catch (error) {
         console.error('Erro ao carregar gabaritos:', error);
@@ -1433,6 +1534,162 @@ async function limparTodosEnvios() {
     }
 }
 
+// Fila de revisão
+const MOTIVOS_REVISAO = {
+    'multipla': 'Múltiplas marcações',
+    'margem_baixa': 'Resposta pouco destacada',
+    'marca_fraca': 'Marca fraca',
+    'nao_lida': 'Marca não reconhecida',
+    'ra_nao_detectado': 'RA não detectado',
+    'questoes_nao_localizadas': 'Questões não localizadas'
+};
+
+async function loadRevisao() {
+    const container = document.getElementById('revisaoContainer');
+
+    try {
+        const response = await fetch('/api/revisao');
+        const data = await response.json();
+
+        atualizarContadorRevisao(data.total);
+
+        if (data.total === 0) {
+            container.innerHTML = '<div class="empty-state">Nenhum item aguardando revisão</div>';
+            return;
+        }
+
+        container.innerHTML = data.itens.map(item =>
+            item.questao !== null ? renderItemQuestao(item) : renderItemPagina(item)
+        ).join('');
+    } catch (error) {
+        console.error('Erro ao carregar revisão:', error);
+        container.innerHTML = '<div class="empty-state">Erro ao carregar itens de revisão</div>';
+    }
+}
+
+async function atualizarContadorRevisao(total) {
+    if (total === undefined) {
+        try {
+            const response = await fetch('/api/revisao');
+            total = (await response.json()).total;
+        } catch (error) {
+            return;
+        }
+    }
+
+    const contador = document.getElementById('revisaoContador');
+    contador.textContent = total;
+    contador.style.display = total > 0 ? 'inline-block' : 'none';
+}
+
+function renderRecorte(item) {
+    if (!item.recorte) {
+        return '<div class="revisao-sem-recorte">Recorte indisponível</div>';
+    }
+    return `<img class="revisao-recorte" src="/api/revisao/recorte/${encodeURIComponent(item.recorte)}" alt="Recorte">`;
+}
+
+function renderItemQuestao(item) {
+    const alternativas = Object.keys(item.scores);
+    const maior = Math.max(...Object.values(item.scores), 0.01);
+
+    const scores = alternativas.map(alt => `
+        <div class="revisao-score">
+            <span>${alt}</span>
+            <div class="revisao-barra"><div style="width: ${(item.scores[alt] / maior * 100).toFixed(0)}%"></div></div>
+        </div>
+    `).join('');
+
+    const botoes = alternativas.map(alt => `
+        <button class="btn btn-small ${alt === item.resposta_lida ? 'btn-primary' : 'btn-secondary'}"
+                onclick="resolverRevisao('${item.id}', {resposta: '${alt}'})">${alt}</button>
+    `).join('');
+
+    return `
+        <div class="revisao-item" id="revisao-${item.id}">
+            <div class="revisao-titulo">
+                <strong>${item.relatorio.split('/').pop().replace('_relatorio.json', '')} • Questão ${item.questao}</strong>
+                <span class="revisao-motivo">${MOTIVOS_REVISAO[item.motivo] || item.motivo}</span>
+            </div>
+            ${renderRecorte(item)}
+            <div class="revisao-scores">${scores}</div>
+            <div class="revisao-acoes">
+                ${botoes}
+                <button class="btn btn-small btn-secondary" onclick="resolverRevisao('${item.id}', {resposta: ''})">Em branco</button>
+            </div>
+        </div>
+    `;
+}
+
+function renderItemPagina(item) {
+    const motivos = item.motivo.map(m => MOTIVOS_REVISAO[m] || m).join(' • ');
+    const questoes = (item.questoes_nao_localizadas || []).map(q => `
+        <label class="revisao-questao">${q}<input type="text" maxlength="1" data-questao="${q}"></label>
+    `).join('');
+
+    return `
+        <div class="revisao-item" id="revisao-${item.id}">
+            <div class="revisao-titulo">
+                <strong>${item.relatorio.split('/').pop().replace('_relatorio.json', '')} • Página ${item.pagina}</strong>
+                <span class="revisao-motivo">${motivos}</span>
+            </div>
+            ${renderRecorte(item)}
+            <div class="revisao-campos">
+                <input type="text" placeholder="Nome do aluno" data-campo="nome">
+                <input type="text" placeholder="RA" data-campo="matricula" value="${item.ra_lido || ''}">
+            </div>
+            ${questoes ? `<div class="revisao-questoes">${questoes}</div>` : ''}
+            <div class="revisao-acoes">
+                <button class="btn btn-small btn-primary" onclick="resolverPagina('${item.id}')">✓ Confirmar</button>
+            </div>
+        </div>
+    `;
+}
+
+function resolverPagina(itemId) {
+    const elemento = document.getElementById(`revisao-${itemId}`);
+    const dados = {respostas: {}};
+
+    elemento.querySelectorAll('[data-campo]').forEach(input => {
+        dados[input.dataset.campo] = input.value.trim();
+    });
+    elemento.querySelectorAll('[data-questao]').forEach(input => {
+        dados.respostas[input.dataset.questao] = input.value.trim().toUpperCase();
+    });
+
+    resolverRevisao(itemId, dados);
+}
+
+async function resolverRevisao(itemId, dados) {
+    try {
+        const response = await fetch(`/api/revisao/${encodeURIComponent(itemId)}`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(dados)
+        });
+        const data = await response.json();
+
+        if (!response.ok) {
+            alert(`❌ ${data.error}`);
+            return;
+        }
+
+        document.getElementById(`revisao-${itemId}`).remove();
+        const restantes = document.querySelectorAll('.revisao-item').length;
+        atualizarContadorRevisao(restantes);
+        if (restantes === 0) {
+            document.getElementById('revisaoContainer').innerHTML =
+                '<div class="empty-state">Nenhum item aguardando revisão</div>';
+        }
+
+        loadReports();
+        loadStats();
+    } catch (error) {
+        console.error('Erro ao resolver item:', error);
+        alert('❌ Erro ao salvar a revisão');
+    }
+}
+
 // Classificar nota por cor
 function getNotaClass(percentual) {
     if (percentual >= 70) return 'badge-success';
@@ -1465,6 +1722,7 @@ loadStats();
 loadEnvios();
 loadGabaritosSelect();
 atualizarStatusCSVRef();
+atualizarContadorRevisao();
 
 // Recarregar a cada 30 segundos
 setInterval(() => {
@@ -1473,4 +1731,5 @@ setInterval(() => {
     loadEnvios();
     loadGabaritosSelect();
     atualizarStatusCSVRef();
+    atualizarContadorRevisao();
 }, 30000);
@@ -6,6 +6,8 @@ import fitz
 import sys
 import numpy as np
 
+from folhas_prova import decodificar_qr
+
 def testar_qrcode_pagina(pdf_path, page_num=0):
     """Testa detecção de QR code em uma página específica"""
 
@@ -77,6 +79,7 @@ def testar_qrcode_pagina(pdf_path, page_num=0):
         print(f"  Tamanho: {len(data)} caracteres")
         print(f"  É numérico: {data.isdigit()}")
         print(f"  Tamanho válido para RA: {10 <= len(data) <= 12}")
+        print(f"  Campos: {decodificar_qr(data) or 'conteúdo não reconhecido (ou soma de verificação inválida)'}")
     else:
         print(f"✗ QR Code NÃO detectado")
         print(f"\nTentando com biblioteca pyzbar...")
@@ -0,0 +1,58 @@
+"""
+Testes do agendador de correções (conclusão das páginas e descarte dos lotes concluídos)
+"""
+
+import pytest
+
+import agendador_correcoes
+from agendador_correcoes import AgendadorCorrecoes
+
+
+@pytest.fixture
+def agendador(monkeypatch):
+    """Agendador sem a thread despachante: os eventos são simulados chamando os métodos"""
+    agendador = AgendadorCorrecoes(max_processos=1, usar_cache=False)
+    monkeypatch.setattr(agendador, 'iniciar', lambda: None)
+    return agendador
+
+
+def concluir(agendador, lote_id, erros=()):
+    """Marca as páginas do único arquivo do lote, com erro nas de índice em erros"""
+    arquivo = agendador._lotes[lote_id]['arquivos'][0]
+    arquivo['paginas'] = 2
+    arquivo['status'] = 'processing'
+    for pagina in range(2):
+        agendador._marcar_pagina(lote_id, 0, pagina in erros)
+
+
+@pytest.mark.unit
+class TestAgendador:
+    def test_relatorio_nao_gravado_conta_como_erro(self, agendador):
+        lote_id = agendador.submeter(['prova.pdf'], 'gabarito.json')
+        concluir(agendador, lote_id, erros=(0, 1))
+
+        progresso = agendador.progresso(lote_id)
+        assert progresso['arquivos'][0]['status'] == 'failed'
+        assert progresso['status'] == 'failed'
+        assert progresso['current_page'] == 2
+
+    def test_lotes_concluidos_alem_do_maximo_sao_descartados(self, agendador, monkeypatch):
+        monkeypatch.setattr(agendador_correcoes, 'MAX_LOTES_CONCLUIDOS', 2)
+        concluidos = [agendador.submeter(['prova.pdf'], 'gabarito.json') for _ in range(3)]
+        for lote_id in concluidos:
+            concluir(agendador, lote_id)
+        em_andamento = agendador.submeter(['prova.pdf'], 'gabarito.json')
+
+        assert agendador.progresso(concluidos[0]) is None
+        assert agendador.progresso(concluidos[1])['status'] == 'completed'
+        assert agendador.progresso(em_andamento)['status'] == 'processing'
+
+    def test_lotes_concluidos_expiram(self, agendador, monkeypatch):
+        lote_id = agendador.submeter(['prova.pdf'], 'gabarito.json')
+        concluir(agendador, lote_id)
+        agendador.submeter(['prova.pdf'], 'gabarito.json')
+        assert agendador.progresso(lote_id) is not None
+
+        monkeypatch.setattr(agendador_correcoes, 'RETENCAO_LOTES_HORAS', 0)
+        agendador.submeter(['prova.pdf'], 'gabarito.json')
+        assert agendador.progresso(lote_id) is None
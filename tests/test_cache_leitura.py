@@ -0,0 +1,71 @@
+"""
+Testes do cache de leituras (chave por conteúdo e despejo LRU)
+"""
+
+import os
+
+import pytest
+
+from cache_leitura import CacheLeitura
+
+
+@pytest.mark.unit
+class TestChave:
+    def test_deterministica(self):
+        parametros = {'dpi_leitura': 150, 'alternativas': ['A', 'B', 'C', 'D', 'E']}
+        assert CacheLeitura.chave('abc', '2.9', parametros) == CacheLeitura.chave('abc', '2.9', dict(parametros))
+
+    def test_ordem_dos_parametros_nao_importa(self):
+        assert CacheLeitura.chave('abc', '2.9', {'a': 1, 'b': 2}) == CacheLeitura.chave('abc', '2.9', {'b': 2, 'a': 1})
+
+    @pytest.mark.parametrize('hash_pagina, versao, parametros', [
+        ('abd', '2.9', {'a': 1}),
+        ('abc', '3.0', {'a': 1}),
+        ('abc', '2.9', {'a': 2}),
+        ('abc', '2.9', {'a': 1, 'layout': None}),
+    ])
+    def test_muda_com_pagina_versao_e_parametros(self, hash_pagina, versao, parametros):
+        assert CacheLeitura.chave(hash_pagina, versao, parametros) != CacheLeitura.chave('abc', '2.9', {'a': 1})
+
+
+@pytest.mark.unit
+class TestCache:
+    def test_salvar_e_obter(self, tmp_path):
+        cache = CacheLeitura(str(tmp_path))
+        leitura = {'respostas': {'1': 'A'}, 'ra': '000111222333'}
+        cache.salvar('k1', leitura)
+        assert cache.obter('k1') == leitura
+        assert cache.obter('k2') is None
+        assert (cache.acertos, cache.faltas) == (1, 1)
+        assert cache.taxa_acerto() == 0.5
+
+    def test_entrada_corrompida_conta_como_falta(self, tmp_path):
+        cache = CacheLeitura(str(tmp_path))
+        (tmp_path / 'k1.json').write_text('{')
+        assert cache.obter('k1') is None
+        assert cache.faltas == 1
+
+    def test_tamanho_recalculado_ao_abrir(self, tmp_path):
+        CacheLeitura(str(tmp_path)).salvar('k1', {'x': 1})
+        assert CacheLeitura(str(tmp_path))._tamanho_atual == os.path.getsize(tmp_path / 'k1.json')
+
+    def test_despeja_as_usadas_ha_mais_tempo(self, tmp_path):
+        dados = {'x': 'a' * 100}
+        tamanho = len(b'{"x": "') + 100 + 2
+        cache = CacheLeitura(str(tmp_path), tamanho_maximo=3 * tamanho)
+
+        for i, chave in enumerate(['k1', 'k2', 'k3']):
+            cache.salvar(chave, dados)
+            os.utime(tmp_path / f'{chave}.json', (1000 + i, 1000 + i))
+        # k1 volta a ser usada: a mais antiga passa a ser k2
+        assert cache.obter('k1') == dados
+
+        cache.salvar('k4', dados)
+        assert sorted(p.stem for p in tmp_path.glob('*.json')) == ['k1', 'k3', 'k4']
+        assert cache._tamanho_atual <= cache.tamanho_maximo
+
+    def test_sobrescrever_nao_conta_duas_vezes(self, tmp_path):
+        cache = CacheLeitura(str(tmp_path))
+        cache.salvar('k1', {'x': 1})
+        cache.salvar('k1', {'x': 2})
+        assert cache._tamanho_atual == os.path.getsize(tmp_path / 'k1.json')
@@ -0,0 +1,52 @@
+"""
+Testes do escritor de relatórios (gravação em lotes e erros de gravação)
+"""
+
+import json
+
+import pytest
+
+from escritor_relatorios import EscritorRelatorios
+
+RESULTADO = {'aluno': {'nome': 'Aluno', 'ra': '000111222333'}, 'acertos': 1, 'total_questoes': 1, 'nota': 100.0,
+             'detalhes': [], 'questoes_multiplas_marcacoes': [], 'questoes_revisao': {}}
+
+
+@pytest.mark.unit
+class TestEscritorRelatorios:
+    def test_grava_json_e_html(self, tmp_path):
+        chamadas = []
+        with EscritorRelatorios() as escritor:
+            escritor.enviar(str(tmp_path / 'r1_relatorio.json'), RESULTADO, lambda erro=None: chamadas.append(erro))
+
+        assert json.loads((tmp_path / 'r1_relatorio.json').read_text()) == RESULTADO
+        assert (tmp_path / 'r1_relatorio.html').exists()
+        assert not list(tmp_path.glob('*.tmp'))
+        assert chamadas == [None]
+
+    def test_erro_vale_so_para_o_lote(self, tmp_path):
+        # Um arquivo no lugar da pasta: a gravação deste relatório falha
+        (tmp_path / 'arquivo').write_text('')
+        chamadas = []
+        with EscritorRelatorios(tamanho_lote=1) as escritor:
+            escritor.enviar(str(tmp_path / 'arquivo' / 'r1_relatorio.json'), RESULTADO,
+                            lambda erro=None: chamadas.append(('r1', erro)))
+            escritor.enviar(str(tmp_path / 'r2_relatorio.json'), RESULTADO,
+                            lambda erro=None: chamadas.append(('r2', erro)))
+
+        assert [nome for nome, _ in chamadas] == ['r1', 'r2']
+        assert isinstance(chamadas[0][1], OSError) and chamadas[1][1] is None
+        assert (tmp_path / 'r2_relatorio.json').exists()
+        assert (escritor.gravados, escritor.falhas) == (1, 1)
+
+    def test_erro_sem_depois_levantado_ao_fechar(self, tmp_path):
+        (tmp_path / 'arquivo').write_text('')
+        escritor = EscritorRelatorios()
+        escritor.iniciar()
+        escritor.enviar(str(tmp_path / 'arquivo' / 'r1_relatorio.json'), RESULTADO)
+        with pytest.raises(OSError):
+            escritor.fechar()
+        # O erro já foi entregue: um novo uso começa limpo
+        escritor.iniciar()
+        escritor.enviar(str(tmp_path / 'r2_relatorio.json'), RESULTADO)
+        escritor.fechar()
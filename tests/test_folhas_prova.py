@@ -0,0 +1,217 @@
+"""
+Testes das folhas de prova: conteúdo do QR e montagem das provas com várias folhas
+"""
+
+import pytest
+
+from folhas_prova import (MAX_TURMA_QR, MontadorProvas, codificar_qr, decodificar_qr, dividir_questoes, id_prova,
+                          questoes_da_folha, questoes_do_layout)
+
+RA_UM = '000111222333'
+RA_DOIS = '000444555666'
+
+
+# Gabarito personalizado de 2 folhas: 60 de múltipla escolha na primeira, 10 V/F na segunda
+LAYOUT_DUAS_FOLHAS = {
+    'paginas': 2,
+    'questoes': [{'questao': q, 'pagina': 0 if q <= 60 else 1} for q in range(1, 71)],
+}
+
+
+def folha(ra, pagina, paginas=3, prova='MAT', respostas=None):
+    """Leitura de uma folha de 30 questões; pagina None = QR ilegível"""
+    respostas = respostas if respostas is not None else {'1': 'A', '16': 'B'}
+    return {
+        'ra': ra,
+        'turma': None,
+        'folha': {'prova': prova, 'pagina': pagina, 'paginas': paginas, 'quantidade': 30} if pagina else None,
+        'respostas': dict(respostas),
+        'confianca': {q: {'margem': 1.0} for q in respostas},
+        'revisao': {},
+    }
+
+
+@pytest.mark.unit
+class TestDividirQuestoes:
+    @pytest.mark.parametrize('num_questoes, blocos', [
+        (40, [(1, 40)]),
+        (41, [(1, 21), (22, 20)]),
+        (90, [(1, 30), (31, 30), (61, 30)]),
+    ])
+    def test_divisao_equilibrada(self, num_questoes, blocos):
+        assert dividir_questoes(num_questoes) == blocos
+
+
+@pytest.mark.unit
+class TestQR:
+    def test_ida_e_volta(self):
+        texto = codificar_qr(RA_UM, 'MAT', 2, 3, turma='8° ANO A')
+        assert texto.startswith('G1|000111222333|8° ANO A|MAT|2/3|')
+        assert decodificar_qr(texto) == {'ra': RA_UM, 'turma': '8° ANO A', 'prova': 'MAT', 'pagina': 2, 'paginas': 3}
+
+    def test_folha_sem_aluno(self):
+        assert decodificar_qr(codificar_qr(None, 'MAT')) == {
+            'ra': None, 'turma': None, 'prova': 'MAT', 'pagina': 1, 'paginas': 1}
+
+    def test_turma_limpa_e_cortada(self):
+        turma = decodificar_qr(codificar_qr(RA_UM, 'MAT', turma='  8° |ANO\t A ' + 'X' * 40))['turma']
+        assert turma.startswith('8° ANO A X') and '|' not in turma
+        assert len(turma) == MAX_TURMA_QR
+
+    @pytest.mark.parametrize('texto', ['000111222333', '0001112223', ' 000111222333\n'])
+    def test_ra_puro_dos_gabaritos_antigos(self, texto):
+        assert decodificar_qr(texto) == {'ra': texto.strip(), 'turma': None, 'prova': None, 'pagina': 1, 'paginas': 1}
+
+    def test_soma_de_verificacao_errada(self):
+        texto = codificar_qr(RA_UM, 'MAT', 1, 3)
+        assert decodificar_qr(texto.replace('MAT', 'POR')) is None
+        corpo, soma = texto.rsplit('|', 1)
+        assert decodificar_qr(f"{corpo}|{'0000' if soma != '0000' else '0001'}") is None
+
+    @pytest.mark.parametrize('texto', [
+        '', None, '123', 'https://exemplo.com', 'G2|000111222333||MAT|1/1|0000', 'G1|000111222333|MAT|1/1',
+    ])
+    def test_conteudo_de_outra_origem(self, texto):
+        assert decodificar_qr(texto) is None
+
+    @pytest.mark.parametrize('ra, prova, pagina, paginas', [
+        ('123', 'MAT', 1, 1),           # RA curto
+        ('ABCDEFGHIJ', 'MAT', 1, 1),    # RA não numérico
+        (RA_UM, '', 1, 1),              # sem prova
+        (RA_UM, 'MAT', 3, 2),           # folha além do total
+        (RA_UM, 'MAT', 0, 2),
+    ])
+    def test_campos_invalidos_com_soma_correta(self, ra, prova, pagina, paginas):
+        assert decodificar_qr(codificar_qr(ra, prova, pagina, paginas)) is None
+
+    def test_id_prova(self):
+        assert id_prova('MAT 8º/A', 'Prova', 40) == 'MAT8ºA'
+        assert id_prova('x' * 30, 'Prova', 40) == 'x' * 16
+        assert id_prova(None, 'Prova', 40) == id_prova('', 'Prova', 40) != id_prova(None, 'Prova', 41)
+        assert len(id_prova(None, 'Prova', 40)) == 6
+
+    def test_questoes_da_folha(self):
+        assert questoes_da_folha(90, decodificar_qr(codificar_qr(RA_UM, 'MAT', 3, 3))) == 30
+        assert questoes_da_folha(41, decodificar_qr(codificar_qr(RA_UM, 'MAT', 2, 2))) == 20
+        # Sem QR ou com QR de outra divisão: a primeira folha
+        assert questoes_da_folha(41, None) == 21
+        assert questoes_da_folha(41, decodificar_qr(codificar_qr(RA_UM, 'MAT', 2, 3))) == 21
+
+
+@pytest.mark.unit
+class TestMontadorProvas:
+    def test_prova_completa_na_ultima_folha(self):
+        montador = MontadorProvas(90)
+        assert montador.adicionar(folha(RA_UM, 1), 0, 'h0') is None
+        assert montador.aguardando()
+        assert montador.adicionar(folha(RA_UM, 2), 1, 'h1') is None
+        prova = montador.adicionar(folha(RA_UM, 3), 2, 'h2')
+
+        assert prova is not None and prova['ra'] == RA_UM
+        assert sorted(prova['folhas']) == [1, 2, 3]
+        assert not montador.aguardando()
+        assert montador.pendentes() == []
+
+    def test_juntar_na_numeracao_da_prova(self):
+        montador = MontadorProvas(90)
+        for pagina in (1, 2, 3):
+            prova = montador.adicionar(folha(RA_UM, pagina), pagina - 1, f'h{pagina}')
+
+        total = montador.juntar(prova)
+        assert total['respostas'] == {'1': 'A', '16': 'B', '31': 'A', '46': 'B', '61': 'A', '76': 'B'}
+        assert total['faltando'] == []
+        assert [page_num for page_num, _, _ in total['folhas']] == [0, 1, 2]
+        # Questões sem confiança na leitura da folha não foram localizadas
+        assert total['revisao']['2'] == 'nao_localizada'
+
+    def test_alunos_intercalados(self):
+        montador = MontadorProvas(90)
+        paginas = [(RA_UM, 1), (RA_DOIS, 1), (RA_UM, 2), (RA_DOIS, 2), (RA_UM, 3), (RA_DOIS, 3)]
+        prontas = [montador.adicionar(folha(ra, pagina), i, f'h{i}') for i, (ra, pagina) in enumerate(paginas)]
+
+        assert prontas[:4] == [None] * 4
+        assert prontas[4]['ra'] == RA_UM and [f[0] for f in prontas[4]['folhas'].values()] == [0, 2, 4]
+        assert prontas[5]['ra'] == RA_DOIS and [f[0] for f in prontas[5]['folhas'].values()] == [1, 3, 5]
+
+    def test_folha_sem_qr_continua_a_anterior(self):
+        montador = MontadorProvas(90)
+        montador.adicionar(folha(RA_UM, 1), 0, 'h0')
+        montador.adicionar(folha(None, None), 1, 'h1')
+        prova = montador.adicionar(folha(RA_UM, 3), 2, 'h2')
+
+        assert prova is not None
+        assert prova['folhas'][2][0] == 1
+
+    def test_primeira_folha_sem_qr_ligada_pelo_ra_seguinte(self):
+        montador = MontadorProvas(90)
+        montador.adicionar(folha(None, None), 0, 'h0')
+        montador.adicionar(folha(RA_UM, 2), 1, 'h1')
+        prova = montador.adicionar(folha(RA_UM, 3), 2, 'h2')
+
+        assert prova is not None and prova['ra'] == RA_UM
+        assert prova['folhas'][1][0] == 0
+
+    def test_folha_reescaneada_vale_a_mais_recente(self):
+        montador = MontadorProvas(90)
+        montador.adicionar(folha(RA_UM, 1), 0, 'h0')
+        montador.adicionar(folha(RA_UM, 1, respostas={'1': 'C'}), 1, 'h1')
+        montador.adicionar(folha(RA_UM, 2), 2, 'h2')
+        prova = montador.adicionar(folha(RA_UM, 3), 3, 'h3')
+
+        assert prova['folhas'][1][:2] == (1, 'h1')
+        assert montador.juntar(prova)['respostas']['1'] == 'C'
+
+    def test_qr_de_outra_divisao_e_tratado_como_sem_qr(self):
+        montador = MontadorProvas(90)
+        montador.adicionar(folha(RA_UM, 1), 0, 'h0')
+        montador.adicionar(folha(RA_UM, 1, paginas=2), 1, 'h1')
+        assert montador.pendentes()[0]['folhas'][2][0] == 1
+
+    def test_pendentes_no_fim_do_arquivo(self):
+        montador = MontadorProvas(90)
+        montador.adicionar(folha(RA_DOIS, 1), 0, 'h0')
+        montador.adicionar(folha(RA_UM, 1), 1, 'h1')
+        montador.adicionar(folha(RA_UM, 3), 2, 'h2')
+
+        provas = montador.pendentes()
+        assert [p['ra'] for p in provas] == [RA_DOIS, RA_UM]
+        assert montador.pendentes() == []
+
+        total = montador.juntar(provas[1])
+        assert total['faltando'] == [2]
+        assert all(total['revisao'][str(q)] == 'nao_localizada' for q in range(31, 61))
+
+    def test_depois_de_cada_folha(self):
+        montador = MontadorProvas(90)
+        chamadas = []
+        for pagina in (1, 2, 3):
+            prova = montador.adicionar(folha(RA_UM, pagina), pagina - 1, f'h{pagina}',
+                                       depois=lambda pagina=pagina: chamadas.append(pagina))
+        for funcao in prova['depois']:
+            funcao()
+        assert chamadas == [1, 2, 3]
+
+    def test_layout_junta_pelo_numero_impresso(self):
+        montador = MontadorProvas(70, LAYOUT_DUAS_FOLHAS)
+        assert montador.blocos == [(1, 60), (61, 10)]
+        montador.adicionar(folha(RA_UM, 1, paginas=2, respostas={'1': 'A', '60': 'E'}), 0, 'h0')
+        prova = montador.adicionar(folha(RA_UM, 2, paginas=2, respostas={'61': 'V', '70': 'F'}), 1, 'h1')
+
+        total = montador.juntar(prova)
+        assert total['respostas'] == {'1': 'A', '60': 'E', '61': 'V', '70': 'F'}
+        assert total['revisao']['2'] == total['revisao']['62'] == 'nao_localizada'
+        assert '71' not in total['revisao']
+
+    def test_layout_folha_faltando(self):
+        montador = MontadorProvas(70, LAYOUT_DUAS_FOLHAS)
+        montador.adicionar(folha(RA_UM, 2, paginas=2, respostas={'61': 'V'}), 0, 'h0')
+
+        total = montador.juntar(montador.pendentes()[0])
+        assert total['faltando'] == [1]
+        assert sorted(int(q) for q, motivo in total['revisao'].items() if motivo == 'nao_localizada') == \
+            list(range(1, 61)) + list(range(62, 71))
+
+    def test_questoes_do_layout(self):
+        assert [len(q) for q in questoes_do_layout(LAYOUT_DUAS_FOLHAS)] == [60, 10]
+        # Layouts antigos, sem 'paginas': a maior página com questões
+        assert questoes_do_layout({'questoes': [{'questao': 1, 'pagina': 1}]}) == [[], [1]]
@@ -0,0 +1,46 @@
+"""
+Testes da geração dos gabaritos de uma turma (um PDF da turma ou um PDF por aluno)
+"""
+
+import os
+
+import fitz
+import pytest
+
+from gerar_gabaritos_personalizados import gerar_gabaritos_turma
+
+CONFIGURACAO = {'titulo': 'PROVA', 'codigo_prova': 'MAT', 'num_questoes': 60}
+ALUNOS = [
+    {'nome': 'ANA SOUZA', 'ra': '000111222333'},
+    {'nome': 'ANA SOUZA', 'ra': ''},
+    {'nome': 'ANA SOUZA', 'ra': ''},
+    {'nome': 'BRUNO LIMA', 'ra': '000444555666'},
+]
+
+
+def texto(caminho):
+    with fitz.open(caminho) as pdf:
+        return [pagina.get_text() for pagina in pdf]
+
+
+@pytest.mark.pdf
+class TestGerarGabaritosTurma:
+    def test_um_pdf_por_aluno(self, tmp_path):
+        arquivos = gerar_gabaritos_turma('8º A', ALUNOS, CONFIGURACAO, str(tmp_path), modo='individual')
+
+        assert [os.path.basename(p) for p in arquivos] == [
+            'ANA_SOUZA_000111222333.pdf', 'ANA_SOUZA.pdf', 'ANA_SOUZA_2.pdf', 'BRUNO_LIMA_000444555666.pdf']
+        # Só os PDFs dos alunos: o PDF da turma, de onde saem as páginas, não fica na pasta
+        assert sorted(p.name for p in (tmp_path / '8º_A').iterdir()) == sorted(os.path.basename(p) for p in arquivos)
+
+        paginas = texto(arquivos[3])
+        # 60 questões: 2 folhas por aluno, cada uma com o nome do próprio aluno
+        assert len(paginas) == 2
+        assert all('BRUNO LIMA' in pagina and 'ANA SOUZA' not in pagina for pagina in paginas)
+
+    def test_turma_sem_alunos(self, tmp_path):
+        assert gerar_gabaritos_turma('8º A', [], CONFIGURACAO, str(tmp_path), modo='individual') == []
+
+    def test_um_pdf_da_turma(self, tmp_path):
+        arquivos = gerar_gabaritos_turma('8º A', ALUNOS, CONFIGURACAO, str(tmp_path))
+        assert len(arquivos) == 1 and len(texto(arquivos[0])) == 2 * len(ALUNOS)
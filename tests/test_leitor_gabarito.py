@@ -0,0 +1,197 @@
+"""
+Testes do leitor com folhas sintéticas: o GeradorGabarito gera o PDF, a página é
+rasterizada, as bolhas são preenchidas e a leitura tem que devolver as respostas marcadas
+"""
+
+import contextlib
+import dataclasses
+import io
+import json
+
+import cv2
+import fitz
+import pytest
+
+from corrigir_rapido import renderizar_pagina_cinza
+from gerador_gabarito import GeradorGabarito
+from leitor_gabarito import LeitorFinalV2, ResultadoLeitura
+
+ESCALA = 2                                  # render fitz.Matrix(2, 2)
+DPI = 72 * ESCALA                           # pontos do PDF → pixels
+RA = '000111222333'
+
+SECOES_UMA_FOLHA = [
+    {'tipo': 'multipla_escolha', 'num_questoes': 10, 'alternativas': ['A', 'B', 'C', 'D']},
+    {'tipo': 'verdadeiro_falso', 'num_questoes': 5},
+]
+SECOES_DUAS_FOLHAS = [
+    {'tipo': 'multipla_escolha', 'num_questoes': 60, 'alternativas': ['A', 'B', 'C', 'D', 'E']},
+    {'tipo': 'verdadeiro_falso', 'num_questoes': 10},
+]
+
+
+def gerar_folhas(caminho, secoes=None, num_questoes=40):
+    """
+    Gera o PDF de um aluno e preenche as bolhas: cada questão marca a alternativa de índice
+    questao % alternativas; as múltiplas de 7 ficam em branco
+
+    Returns:
+        (páginas em escala de cinza, layout das seções ou None, {questao: resposta esperada})
+    """
+    gerador = GeradorGabarito(str(caminho))
+    with contextlib.redirect_stdout(io.StringIO()):
+        if secoes:
+            layout = gerador.gerar_gabarito_personalizado({
+                'titulo': 'PROVA', 'codigo_prova': 'TESTE', 'ra_aluno': RA, 'secoes': secoes})
+        else:
+            layout = None
+            gerador.gerar_gabaritos_lote([{'nome': 'ALUNO', 'ra': RA}], num_questoes=num_questoes,
+                                         alternativas=['A', 'B', 'C', 'D', 'E'])
+
+    pdf = fitz.open(str(caminho))
+    paginas = [renderizar_pagina_cinza(pagina, ESCALA).copy() for pagina in pdf]
+    pdf.close()
+
+    esperado = {}
+    for questao in gerador.layout_bolhas:
+        if questao['questao'] % 7 == 0:
+            continue
+        letra, x, y = questao['bolhas'][questao['questao'] % len(questao['bolhas'])]
+        centro = (int(round(x * ESCALA)), int(round((gerador.altura - y) * ESCALA)))
+        cv2.circle(paginas[questao['pagina']], centro, int(questao['raio'] * ESCALA * 0.8), 20, -1,
+                   lineType=cv2.LINE_AA)
+        esperado[str(questao['questao'])] = letra
+    return paginas, layout, esperado
+
+
+def girar(imagem, graus):
+    """Folha girada no scanner, com fundo branco"""
+    altura, largura = imagem.shape
+    matriz = cv2.getRotationMatrix2D((largura / 2, altura / 2), graus, 1.0)
+    return cv2.warpAffine(imagem, matriz, (largura, altura), borderValue=255)
+
+
+def sem_faixa(imagem):
+    """Folha sem a faixa de calibração (gerador antigo): o canto superior esquerdo em branco"""
+    px_mm = DPI / 25.4
+    limpa = imagem.copy()
+    limpa[:int(20 * px_mm), :int(40 * px_mm)] = 255
+    return limpa
+
+
+@pytest.fixture(scope='module')
+def folha_padrao(tmp_path_factory):
+    """Prova de 40 questões numa folha (2 colunas de alternativas)"""
+    paginas, _, esperado = gerar_folhas(tmp_path_factory.mktemp('padrao') / 'prova.pdf')
+    return paginas[0], esperado
+
+
+@pytest.fixture(scope='module')
+def uma_folha(tmp_path_factory):
+    return gerar_folhas(tmp_path_factory.mktemp('uma') / 'prova.pdf', SECOES_UMA_FOLHA)
+
+
+@pytest.fixture(scope='module')
+def duas_folhas(tmp_path_factory):
+    return gerar_folhas(tmp_path_factory.mktemp('duas') / 'prova.pdf', SECOES_DUAS_FOLHAS)
+
+
+@pytest.mark.unit
+class TestGeometria:
+    def test_configuracoes_do_hough_em_mm(self):
+        base, dobro = LeitorFinalV2._geometria(144), LeitorFinalV2._geometria(288)
+        assert len(base['configs_hough']) == len(LeitorFinalV2.CONFIGS_HOUGH_MM)
+        for c144, c288 in zip(base['configs_hough'], dobro['configs_hough']):
+            assert c288['minDist'] == pytest.approx(2 * c144['minDist'])
+            assert abs(c288['maxRadius'] - 2 * c144['maxRadius']) <= 1
+            # O acumulador cresce com a raiz do DPI, não linearmente
+            assert c288['param2'] == pytest.approx(c144['param2'] * 2 ** 0.5)
+        assert dobro['passo_linha'] == pytest.approx(2 * base['passo_linha'])
+
+
+@pytest.mark.unit
+class TestResultadoLeitura:
+    def test_imutavel(self):
+        resultado = ResultadoLeitura.criar(
+            {'1': 'A'}, {'1': {'scores': {'A': 0.9}, 'margem': 0.5, 'caixa': [1, 2, 3, 4]}},
+            {'2': 'multipla'}, {'total': 1.0}, {'dpi': 144})
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            resultado.respostas = {}
+        with pytest.raises(TypeError):
+            resultado.respostas['1'] = 'B'
+        with pytest.raises(TypeError):
+            resultado.confianca['1']['scores']['A'] = 0.0
+        assert resultado.questoes_multiplas == (2,)
+
+    def test_para_dict_serializavel(self):
+        resultado = ResultadoLeitura.criar({'1': 'A'}, {}, {}, {}, {'dpi': 144})
+        detalhes = resultado.para_dict()
+        detalhes['respostas']['1'] = 'B'
+        assert resultado.respostas['1'] == 'A'
+        assert json.loads(json.dumps(detalhes))['questoes_multiplas'] == []
+
+
+@pytest.mark.integration
+@pytest.mark.pdf
+class TestLeituraSintetica:
+    def test_folha_padrao(self, folha_padrao):
+        imagem, esperado = folha_padrao
+        resultado = LeitorFinalV2(40).ler(imagem, DPI)
+
+        assert dict(resultado.respostas) == esperado
+        assert resultado.geometria['questoes_localizadas'] == 40
+        assert resultado.geometria['alternativas'] == 5
+        assert resultado.geometria['calibracao']['branco'] - resultado.geometria['calibracao']['preto'] > 200
+        # Folha com a faixa e a grade completa: uma passada só do Hough
+        assert resultado.geometria['hough'] == 1
+        assert not resultado.revisao
+
+    def test_outra_resolucao(self, folha_padrao):
+        imagem, esperado = folha_padrao
+        maior = cv2.resize(imagem, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+        assert dict(LeitorFinalV2(40).ler(maior, 2 * DPI).respostas) == esperado
+
+    def test_folha_girada(self, folha_padrao):
+        imagem, esperado = folha_padrao
+        assert dict(LeitorFinalV2(40).ler(girar(imagem, 1.5), DPI).respostas) == esperado
+
+    def test_folha_sem_faixa_de_calibracao(self, folha_padrao):
+        imagem, esperado = folha_padrao
+        resultado = LeitorFinalV2(40).ler(sem_faixa(imagem), DPI)
+
+        assert dict(resultado.respostas) == esperado
+        assert resultado.geometria['calibracao'] is None
+        # Sem a faixa, todas as configurações do Hough, como antes da passada única
+        assert resultado.geometria['hough'] == len(LeitorFinalV2.CONFIGS_HOUGH_MM)
+
+    def test_leitor_nao_muda_entre_leituras(self, folha_padrao):
+        imagem, esperado = folha_padrao
+        leitor = LeitorFinalV2(40)
+        leitor.ler(sem_faixa(imagem), DPI)
+        assert dict(leitor.ler(imagem, DPI).respostas) == esperado
+        assert leitor.confianca == {} and leitor.revisao == {}
+
+    def test_layout_de_uma_folha(self, uma_folha):
+        paginas, layout, esperado = uma_folha
+        assert len(paginas) == 1 and layout['paginas'] == 1
+
+        resultado = LeitorFinalV2(15).ler(paginas[0], DPI, layout=layout)
+        assert dict(resultado.respostas) == esperado
+        assert resultado.geometria['secoes'] == {'multipla_escolha': 10, 'verdadeiro_falso': 5}
+
+    def test_layout_de_uma_folha_girada(self, uma_folha):
+        paginas, layout, esperado = uma_folha
+        assert dict(LeitorFinalV2(15).ler(girar(paginas[0], -1.5), DPI, layout=layout).respostas) == esperado
+
+    def test_layout_de_duas_folhas(self, duas_folhas):
+        paginas, layout, esperado = duas_folhas
+        assert len(paginas) == layout['paginas'] == 2
+
+        lidas = {}
+        for pagina, imagem in enumerate(paginas):
+            resultado = LeitorFinalV2(70).ler(imagem, DPI, layout=layout, pagina=pagina)
+            # Cada folha na numeração impressa, sem questões da outra folha na revisão
+            assert all(q['pagina'] == pagina for q in layout['questoes'] if str(q['questao']) in resultado.respostas)
+            assert not resultado.revisao
+            lidas.update(resultado.respostas)
+        assert lidas == esperado
@@ -0,0 +1,61 @@
+"""
+Testes do perfil de execução (resumo gravado de um envio com profile=1)
+"""
+
+import json
+import threading
+
+import pytest
+
+import recursos_opencv
+from perfil_execucao import PerfilExecucao
+
+
+def usar_recursos():
+    """Uma página lida numa thread nova: CLAHE criado e reusado, buffer criado"""
+    recursos_opencv.clahe(2.0)
+    recursos_opencv.clahe(2.0)
+    recursos_opencv.buffer('teste', (4, 4))
+
+
+@pytest.mark.unit
+class TestRecursosOpenCV:
+    def test_so_os_da_thread_medida(self):
+        perfil = PerfilExecucao()
+
+        def medida():
+            with perfil.medir():
+                usar_recursos()
+
+        # Outra thread usando recursos ao mesmo tempo não entra no perfil
+        threads = [threading.Thread(target=medida), threading.Thread(target=usar_recursos)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        perfil.encerrar()
+
+        assert perfil.recursos == {
+            'buffer(teste)': {'criados': 1, 'reusos': 0},
+            'clahe(2.0, 8x8)': {'criados': 1, 'reusos': 1},
+        }
+
+    def test_somados_dos_workers_e_gravados_no_resumo(self, tmp_path):
+        # Worker: a leitura da página medida numa thread com o cache de recursos vazio
+        worker = PerfilExecucao()
+
+        def pagina():
+            with worker.medir():
+                usar_recursos()
+
+        thread = threading.Thread(target=pagina)
+        thread.start()
+        thread.join()
+
+        perfil = PerfilExecucao()
+        perfil.somar(worker.exportar())
+        perfil.somar(worker.exportar())
+        resumo = perfil.gravar('lote', str(tmp_path))
+
+        assert resumo['recursos_opencv']['clahe(2.0, 8x8)'] == {'criados': 2, 'reusos': 2}
+        assert json.loads((tmp_path / 'perfil_lote.json').read_text())['recursos_opencv'] == resumo['recursos_opencv']
@@ -0,0 +1,171 @@
+"""
+Testes do roteamento de gabaritos (faixas de páginas e código da prova no QR)
+"""
+
+import json
+
+import pytest
+
+from roteamento_gabaritos import RoteadorGabaritos, SeparadorGabaritos, interpretar_faixas
+
+
+def gravar_gabarito(pasta, nome, num_questoes):
+    caminho = pasta / f'{nome}.json'
+    caminho.write_text(json.dumps({str(q): 'A' for q in range(1, num_questoes + 1)}))
+    return str(caminho)
+
+
+@pytest.fixture
+def pasta(tmp_path):
+    """Pasta de gabaritos: MAT (90 questões, 3 folhas), POR (30) e ING (20, com layout)"""
+    gravar_gabarito(tmp_path, 'MAT', 90)
+    gravar_gabarito(tmp_path, 'POR', 30)
+    gravar_gabarito(tmp_path, 'ING', 20)
+    (tmp_path / 'ING.layout.json').write_text(json.dumps({'altura': 842, 'questoes': []}))
+    return tmp_path
+
+
+def leitura(prova=None, pagina=1, paginas=1, ra='000111222333'):
+    """Leitura de uma folha; sem prova = QR ilegível"""
+    folha = {'prova': prova, 'pagina': pagina, 'paginas': paginas, 'quantidade': 30} if prova else None
+    return {'ra': ra, 'folha': folha, 'respostas': {}, 'confianca': {}, 'revisao': {}}
+
+
+@pytest.mark.unit
+class TestInterpretarFaixas:
+    def test_faixas_ordenadas_a_partir_de_zero(self):
+        assert interpretar_faixas('21-40=portugues; 1-20 = matematica, 41=ingles') == [
+            (0, 19, 'matematica'), (20, 39, 'portugues'), (40, 40, 'ingles')]
+
+    def test_converte_o_nome_no_caminho(self):
+        assert interpretar_faixas('1-2=mat', lambda nome: f'gabaritos/{nome}.json') == [(0, 1, 'gabaritos/mat.json')]
+
+    def test_vazio(self):
+        assert interpretar_faixas('') == []
+        assert interpretar_faixas(None) == []
+
+    @pytest.mark.parametrize('texto', ['1-20', 'a-b=mat', '0-3=mat', '5-3=mat', '1-20=mat, 20-30=por'])
+    def test_faixa_invalida_ou_sobreposta(self, texto):
+        with pytest.raises(ValueError):
+            interpretar_faixas(texto)
+
+
+@pytest.mark.unit
+class TestRoteadorGabaritos:
+    def test_sem_gabarito(self, tmp_path):
+        with pytest.raises(ValueError):
+            RoteadorGabaritos()
+        with pytest.raises(ValueError):
+            RoteadorGabaritos(str(tmp_path / 'nao_existe.json'))
+        with pytest.raises(ValueError):
+            RoteadorGabaritos(por_codigo=True, pasta=str(tmp_path))
+
+    def test_so_o_padrao(self, pasta):
+        por = str(pasta / 'POR.json')
+        roteador = RoteadorGabaritos(por)
+        assert roteador.resolver(0) == por
+        assert roteador.resolver(7, prova='MAT') == por
+        assert roteador.gabaritos == [por]
+        assert not roteador.varias_folhas
+
+    def test_pelo_codigo_da_prova(self, pasta):
+        roteador = RoteadorGabaritos(por_codigo=True, pasta=str(pasta), log=lambda *_: None)
+        assert sorted(roteador.por_prova) == ['ING', 'MAT', 'POR']
+        assert roteador.resolver(0, prova='MAT') == str(pasta / 'MAT.json')
+        assert roteador.resolver(0, prova='ING') == str(pasta / 'ING.json')
+        # Código desconhecido e sem padrão: nenhum gabarito
+        assert roteador.resolver(0, prova='HIS') is None
+        # Folha sem código continua a prova da folha anterior
+        assert roteador.resolver(1, continuacao=str(pasta / 'MAT.json')) == str(pasta / 'MAT.json')
+        assert roteador.resolver(1) is None
+        assert roteador.varias_folhas
+
+    def test_codigo_desconhecido_vai_para_o_padrao(self, pasta):
+        roteador = RoteadorGabaritos(str(pasta / 'POR.json'), por_codigo=True, pasta=str(pasta))
+        assert roteador.resolver(0, prova='HIS') == str(pasta / 'POR.json')
+
+    def test_faixa_vale_mais_que_o_codigo(self, pasta):
+        mat, por = str(pasta / 'MAT.json'), str(pasta / 'POR.json')
+        roteador = RoteadorGabaritos(faixas=[(0, 2, mat), (3, 3, por)], por_codigo=True, pasta=str(pasta))
+        assert roteador.resolver(1, prova='POR') == mat
+        assert roteador.resolver(3, prova='MAT') == por
+        assert roteador.resolver(4, prova='MAT') == mat
+
+    def test_gabarito_ilegivel_na_pasta_e_ignorado(self, pasta):
+        (pasta / 'VAZIO.json').write_text('{}')
+        avisos = []
+        roteador = RoteadorGabaritos(por_codigo=True, pasta=str(pasta), log=avisos.append)
+        assert 'VAZIO' not in roteador.por_prova
+        assert len(avisos) == 1
+
+    def test_opcoes_leitura(self, pasta):
+        mat, por = str(pasta / 'MAT.json'), str(pasta / 'POR.json')
+        roteador = RoteadorGabaritos(por, faixas=[(0, 0, mat)], por_codigo=True, pasta=str(pasta))
+
+        na_faixa = roteador.opcoes_leitura(0)
+        assert na_faixa == {'num_questoes': 90, 'questoes_por_prova': None}
+
+        fora = roteador.opcoes_leitura(1)
+        assert fora['num_questoes'] == 30
+        assert fora['questoes_por_prova'] == {'MAT': 90, 'POR': 30, 'ING': 20}
+        assert list(fora['layouts_por_prova']) == ['ING']
+        assert 'layout' not in fora
+
+    def test_opcoes_leitura_sem_layouts(self, pasta):
+        por = str(pasta / 'POR.json')
+        assert RoteadorGabaritos(por).opcoes_leitura(0) == {'num_questoes': 30, 'questoes_por_prova': None}
+
+    def test_layout_do_gabarito_padrao(self, pasta):
+        roteador = RoteadorGabaritos(str(pasta / 'ING.json'))
+        assert roteador.opcoes_leitura(0)['layout'] == {'altura': 842, 'questoes': []}
+        assert roteador.layout(str(pasta / 'ING.json')) is roteador.opcoes_leitura(5)['layout']
+
+    def test_folhas_pelo_layout(self, pasta):
+        # Personalizado de 20 questões em 2 folhas: o layout vale mais que a divisão padrão
+        (pasta / 'ING.layout.json').write_text(json.dumps({'altura': 842, 'paginas': 2, 'questoes': [
+            {'questao': q, 'pagina': (q - 1) // 10} for q in range(1, 21)]}))
+        roteador = RoteadorGabaritos(por_codigo=True, pasta=str(pasta), log=lambda *_: None)
+        assert roteador.folhas(str(pasta / 'ING.json')) == 2
+        assert roteador.folhas(str(pasta / 'MAT.json')) == 3
+        assert roteador.folhas(str(pasta / 'POR.json')) == 1
+
+
+@pytest.mark.unit
+class TestSeparadorGabaritos:
+    def test_provas_intercaladas(self, pasta):
+        roteador = RoteadorGabaritos(por_codigo=True, pasta=str(pasta), log=lambda *_: None)
+        separador = SeparadorGabaritos(roteador)
+        mat, por = str(pasta / 'MAT.json'), str(pasta / 'POR.json')
+
+        primeira = leitura('MAT', 1, 3)
+        caminho, montador = separador.encaminhar(0, primeira, log=lambda *_: None)
+        assert caminho == mat and montador is not None
+        montador.adicionar(primeira, 0, 'h0')
+        # Folha sem QR: continua a prova de MAT, que espera a folha seguinte
+        assert separador.encaminhar(1, leitura(), log=lambda *_: None) == (mat, montador)
+        # Prova de uma folha só: sem montador
+        assert separador.encaminhar(2, leitura('POR'), log=lambda *_: None) == (por, None)
+        assert separador.paginas == {mat: 2, por: 1}
+
+    def test_montador_do_layout(self, pasta):
+        (pasta / 'ING.layout.json').write_text(json.dumps({'altura': 842, 'paginas': 2, 'questoes': [
+            {'questao': q, 'pagina': (q - 1) // 10} for q in range(1, 21)]}))
+        separador = SeparadorGabaritos(RoteadorGabaritos(por_codigo=True, pasta=str(pasta), log=lambda *_: None))
+        _, montador = separador.encaminhar(0, leitura('ING', 1, 2), log=lambda *_: None)
+        assert montador.blocos == [(1, 10), (11, 10)]
+
+    def test_pagina_sem_gabarito(self, pasta):
+        separador = SeparadorGabaritos(RoteadorGabaritos(por_codigo=True, pasta=str(pasta), log=lambda *_: None))
+        mensagens = []
+        assert separador.encaminhar(0, leitura('HIS'), log=mensagens.append) == (None, None)
+        assert 'HIS' in mensagens[0]
+        assert separador.encaminhar(1, leitura(), log=mensagens.append) == (None, None)
+
+    def test_pendentes_de_todos_os_gabaritos(self, pasta):
+        separador = SeparadorGabaritos(RoteadorGabaritos(por_codigo=True, pasta=str(pasta), log=lambda *_: None))
+        for page_num, dados in enumerate([leitura('MAT', 1, 3), leitura('MAT', 2, 3)]):
+            _, montador = separador.encaminhar(page_num, dados, log=lambda *_: None)
+            montador.adicionar(dados, page_num, f'h{page_num}')
+
+        pendentes = separador.pendentes()
+        assert [(c, sorted(p['folhas'])) for c, _, p in pendentes] == [(str(pasta / 'MAT.json'), [1, 2])]
@@ -0,0 +1,156 @@
+"""
+Testes do upload em partes (/api/upload/iniciar, /parte, /concluir)
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def servidor(tmp_path_factory):
+    """
+    Módulo app importado numa pasta temporária: as pastas que ele cria ao ser importado
+    (uploads, relatórios, gabaritos) e os uploads parciais que retoma não são os do diretório atual
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp('servidor'))
+        monkeypatch.delitem(sys.modules, 'app', raising=False)
+        import app
+        yield app
+
+
+@pytest.fixture
+def cliente(servidor, tmp_path, monkeypatch):
+    """Cliente de teste com as pastas do servidor num diretório temporário"""
+    pasta = tmp_path / 'pdfs'
+    (pasta / '.parciais').mkdir(parents=True)
+    gabaritos = tmp_path / 'gabaritos'
+    gabaritos.mkdir()
+    (gabaritos / 'prova.json').write_text(json.dumps({'1': 'A', '2': 'B'}))
+
+    monkeypatch.setitem(servidor.app.config, 'UPLOAD_FOLDER', str(pasta))
+    monkeypatch.setitem(servidor.app.config, 'GABARITOS_FOLDER', str(gabaritos))
+    monkeypatch.setitem(servidor.app.config, 'REPORTS_FOLDER', str(tmp_path / 'relatorios'))
+    monkeypatch.setattr(servidor, 'uploads_em_andamento', {})
+    monkeypatch.setattr(servidor, 'travas_por_upload', {})
+    monkeypatch.setattr(servidor, 'iniciar_correcao', lambda *args, **kwargs: 'job')
+    return servidor.app.test_client()
+
+
+def iniciar(cliente, nome='prova.pdf', tamanho=10, **extras):
+    return cliente.post('/api/upload/iniciar', json={'nome': nome, 'tamanho': tamanho, 'gabarito': 'prova', **extras})
+
+
+def enviar(cliente, upload_id, dados, offset):
+    return cliente.put(f'/api/upload/{upload_id}/parte', data=dados, headers={'X-Upload-Offset': str(offset)})
+
+
+@pytest.mark.unit
+class TestIniciar:
+    @pytest.mark.parametrize('tamanho', [None, 'abc', '', [1]])
+    def test_tamanho_invalido(self, cliente, tamanho):
+        resposta = cliente.post('/api/upload/iniciar', json={'nome': 'prova.pdf', 'tamanho': tamanho, 'gabarito': 'prova'})
+        assert resposta.status_code == 400
+
+    def test_arquivo_vazio(self, cliente):
+        assert iniciar(cliente, tamanho=0).status_code == 400
+
+    def test_apenas_pdf(self, cliente):
+        assert iniciar(cliente, nome='prova.txt').status_code == 400
+
+    def test_acima_do_limite(self, servidor, cliente):
+        assert iniciar(cliente, tamanho=servidor.app.config['MAX_CHUNKED_UPLOAD_SIZE'] + 1).status_code == 413
+
+    def test_gabarito_inexistente(self, cliente):
+        assert iniciar(cliente, gabarito='outra').status_code == 404
+
+    def test_estado_gravado_ao_lado_do_parcial(self, servidor, cliente):
+        upload_id = iniciar(cliente).get_json()['upload_id']
+        parciais = servidor.pasta_parciais()
+        assert (parciais / f'{upload_id}.part').exists()
+        estado = json.loads((parciais / f'{upload_id}.json').read_text())
+        assert estado['nome'] == 'prova.pdf' and estado['tamanho'] == 10
+        assert 'recebido' not in estado
+
+
+@pytest.mark.unit
+class TestPartes:
+    def test_offset_ausente_ou_invalido(self, cliente):
+        upload_id = iniciar(cliente).get_json()['upload_id']
+        assert cliente.put(f'/api/upload/{upload_id}/parte', data=b'12345').status_code == 400
+        assert enviar(cliente, upload_id, b'12345', 'x').status_code == 400
+
+    def test_offset_fora_de_ordem(self, cliente):
+        upload_id = iniciar(cliente).get_json()['upload_id']
+        resposta = enviar(cliente, upload_id, b'12345', 5)
+        assert resposta.status_code == 409
+        assert resposta.get_json()['recebido'] == 0
+
+    def test_parte_excede_o_tamanho(self, servidor, cliente):
+        upload_id = iniciar(cliente).get_json()['upload_id']
+        assert enviar(cliente, upload_id, b'x' * 11, 0).status_code == 400
+        assert os.path.getsize(servidor.pasta_parciais() / f'{upload_id}.part') == 0
+
+    def test_parte_simultanea_do_mesmo_upload(self, servidor, cliente):
+        upload_id = iniciar(cliente).get_json()['upload_id']
+        with servidor.trava_do_upload(upload_id):
+            resposta = enviar(cliente, upload_id, b'12345', 0)
+            assert resposta.status_code == 409
+            assert cliente.post(f'/api/upload/{upload_id}/concluir').status_code == 409
+        assert enviar(cliente, upload_id, b'12345', 0).get_json()['recebido'] == 5
+
+    def test_retomar_depois_de_reiniciar(self, servidor, cliente):
+        upload_id = iniciar(cliente).get_json()['upload_id']
+        assert enviar(cliente, upload_id, b'12345', 0).get_json()['recebido'] == 5
+
+        # Servidor reiniciado: a lista em memória é refeita a partir de .parciais
+        servidor.uploads_em_andamento.clear()
+        servidor.carregar_uploads_parciais()
+        assert cliente.get(f'/api/upload/{upload_id}').get_json() == {'recebido': 5, 'tamanho': 10}
+        assert enviar(cliente, upload_id, b'67890', 5).get_json()['recebido'] == 10
+
+
+@pytest.mark.unit
+class TestConcluir:
+    def test_incompleto(self, cliente):
+        upload_id = iniciar(cliente).get_json()['upload_id']
+        enviar(cliente, upload_id, b'12345', 0)
+        assert cliente.post(f'/api/upload/{upload_id}/concluir').status_code == 409
+
+    def test_nao_sobrescreve_pdf_existente(self, servidor, cliente):
+        pasta = servidor.app.config['UPLOAD_FOLDER']
+        with open(os.path.join(pasta, 'prova.pdf'), 'wb') as f:
+            f.write(b'anterior')
+
+        upload_id = iniciar(cliente).get_json()['upload_id']
+        enviar(cliente, upload_id, b'0123456789', 0)
+        assert cliente.post(f'/api/upload/{upload_id}/concluir').get_json()['job_id'] == 'job'
+
+        with open(os.path.join(pasta, 'prova.pdf'), 'rb') as f:
+            assert f.read() == b'anterior'
+        with open(os.path.join(pasta, 'prova_2.pdf'), 'rb') as f:
+            assert f.read() == b'0123456789'
+        assert upload_id not in servidor.uploads_em_andamento
+        assert not list(servidor.pasta_parciais().iterdir())
+
+
+@pytest.mark.unit
+class TestExpiracao:
+    def test_upload_parado_e_descartado(self, servidor, cliente):
+        upload_id = iniciar(cliente).get_json()['upload_id']
+        os.utime(servidor.pasta_parciais() / f'{upload_id}.part', (0, 0))
+
+        iniciar(cliente, nome='outra.pdf')
+        assert upload_id not in servidor.uploads_em_andamento
+        assert not (servidor.pasta_parciais() / f'{upload_id}.part').exists()
+        assert not (servidor.pasta_parciais() / f'{upload_id}.json').exists()
+
+    def test_parcial_sem_estado_e_descartado_na_subida(self, servidor, cliente):
+        orfao = servidor.pasta_parciais() / 'orfao.part'
+        orfao.write_bytes(b'123')
+        servidor.carregar_uploads_parciais()
+        assert not orfao.exists()
+        assert 'orfao' not in servidor.uploads_em_andamento
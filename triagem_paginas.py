@@ -0,0 +1,100 @@
+"""
+Triagem Rápida de Páginas
+Separa, numa miniatura, as folhas de resposta das páginas em branco, capas e folhas de
+instruções que vêm misturadas nos lotes escaneados, antes da leitura completa
+"""
+
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+# Muda quando a regra de classificação muda (entra na chave do cache de leituras)
+VERSAO_TRIAGEM = '1'
+
+# Resolução da miniatura usada na triagem
+DPI_TRIAGEM = 50
+
+# Fração mínima de pixels com tinta para a página não ser considerada em branco
+LIMIAR_TINTA = 0.002
+
+# Bolhas vazias (anéis de ~6mm) mínimas para uma página ser folha de resposta.
+# Uma folha tem de 2 a 5 por questão; texto corrido quase não tem componentes desse tamanho.
+MIN_BOLHAS = 20
+
+# Marcadores de alinhamento (quadrados cheios de 5mm) que bastam para reconhecer a folha,
+# mesmo quando as bolhas estão quase todas preenchidas ou borradas
+MIN_MARCADORES = 2
+
+
+def _mm(valor_mm: float, dpi: float) -> float:
+    return valor_mm * dpi / 25.4
+
+
+def miniatura(cinza: np.ndarray, dpi: float) -> Tuple[np.ndarray, float]:
+    """Reduz a página para DPI_TRIAGEM (não amplia páginas de resolução menor)"""
+    if dpi <= DPI_TRIAGEM:
+        return cinza, dpi
+    fator = DPI_TRIAGEM / dpi
+    pequena = cv2.resize(cinza, None, fx=fator, fy=fator, interpolation=cv2.INTER_AREA)
+    return pequena, DPI_TRIAGEM
+
+
+def classificar_pagina(cinza: np.ndarray, dpi: float) -> Tuple[str, Dict]:
+    """
+    Classifica a página pelo que dá para ver numa miniatura de 50 DPI
+
+    Critérios (do mais barato para o mais caro):
+      - tinta: fração de pixels escuros em relação ao papel; abaixo de LIMIAR_TINTA
+        a página está em branco (verso, folha separadora)
+      - bolhas: componentes do tamanho e formato de uma bolha de resposta
+      - marcadores: quadrados cheios do tamanho dos marcadores de alinhamento
+
+    Returns:
+        (tipo, métricas), tipo em 'gabarito', 'em_branco' ou 'outra'
+    """
+    pequena, dpi_mini = miniatura(cinza, dpi)
+
+    # Papel = tom claro predominante; tinta = bem mais escuro que o papel, o que
+    # não confunde papel reciclado ou iluminação irregular com conteúdo. Texto miúdo
+    # fica cinza na miniatura, por isso o limiar é relativo e não "quase preto".
+    papel = float(np.percentile(pequena, 90))
+
+    # A borda (sombra do scanner, furos de fichário) não conta como tinta
+    margem = int(round(_mm(8, dpi_mini)))
+    miolo = pequena[margem:-margem, margem:-margem]
+    fracao_tinta = float(np.count_nonzero(miolo < papel * 0.8)) / max(miolo.size, 1)
+
+    metricas = {'tinta': round(fracao_tinta, 4), 'bolhas': 0, 'marcadores': 0}
+    if fracao_tinta < LIMIAR_TINTA:
+        return 'em_branco', metricas
+
+    # Para as formas, só o traço bem escuro: separa o anel da bolha da letra dentro dela
+    tracos = (pequena < papel * 0.6).astype(np.uint8)
+    _, _, stats, centros = cv2.connectedComponentsWithStats(tracos, connectivity=8)
+    larguras = stats[1:, cv2.CC_STAT_WIDTH]
+    alturas = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    centros = centros[1:]
+    proporcao = larguras / np.maximum(alturas, 1)
+    preenchimento = areas / np.maximum(larguras * alturas, 1)
+    quadrados = (proporcao > 0.7) & (proporcao < 1.4)
+
+    # Bolhas: 6mm de diâmetro (anel vazio ou preenchido), com outra bolha ao lado
+    # no passo de 13mm do gerador. Letras grandes de um título têm o mesmo tamanho,
+    # mas não ficam espaçadas assim.
+    tamanho_bolha = (larguras >= _mm(4.0, dpi_mini)) & (larguras <= _mm(8.5, dpi_mini))
+    candidatas = centros[quadrados & tamanho_bolha]
+    if len(candidatas):
+        dx = np.abs(candidatas[:, None, 0] - candidatas[None, :, 0])
+        dy = np.abs(candidatas[:, None, 1] - candidatas[None, :, 1])
+        vizinha = (dy < _mm(2.0, dpi_mini)) & (dx > _mm(11.0, dpi_mini)) & (dx < _mm(15.0, dpi_mini))
+        metricas['bolhas'] = int(np.count_nonzero(vizinha.any(axis=1)))
+
+    # Marcadores de alinhamento: 5mm, praticamente todo preto
+    tamanho_marcador = (larguras >= _mm(3.5, dpi_mini)) & (larguras <= _mm(7.0, dpi_mini))
+    metricas['marcadores'] = int(np.count_nonzero(quadrados & tamanho_marcador & (preenchimento > 0.85)))
+
+    if metricas['bolhas'] >= MIN_BOLHAS or metricas['marcadores'] >= MIN_MARCADORES:
+        return 'gabarito', metricas
+    return 'outra', metricas
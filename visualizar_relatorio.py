@@ -10,16 +10,30 @@ import os
 from datetime import datetime
 
 
-def gerar_html_relatorio(caminho_json):
-    """Gera HTML do relatório a partir do JSON"""
+def gerar_html_relatorio(caminho_json, dados=None):
+    """Gera HTML do relatório a partir do JSON (ou dos dados já em memória, sem reler o arquivo)"""
 
     # Carregar JSON
-    try:
-        with open(caminho_json, 'r') as f:
-            dados = json.load(f)
-    except FileNotFoundError:
-        print(f"✗ Arquivo não encontrado: {caminho_json}")
-        return
+    if dados is None:
+        try:
+            with open(caminho_json, 'r') as f:
+                dados = json.load(f)
+        except FileNotFoundError:
+            print(f"✗ Arquivo não encontrado: {caminho_json}")
+            return
+
+    html = montar_html_relatorio(dados)
+
+    # Salvar HTML
+    nome_html = caminho_json.replace('.json', '.html')
+    with open(nome_html, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+    print(f"✓ Relatório HTML gerado: {nome_html}")
+
+
+def montar_html_relatorio(dados):
+    """Monta o HTML do relatório a partir do resultado da correção"""
 
     # Extrair dados
     identificacao = dados.get('identificacao', {})
@@ -372,12 +386,7 @@ def gerar_html_relatorio(caminho_json):
     </html>
     """
 
-    # Salvar HTML
-    nome_html = caminho_json.replace('.json', '.html')
-    with open(nome_html, 'w', encoding='utf-8') as f:
-        f.write(html)
-
-    print(f"✓ Relatório HTML gerado: {nome_html}")
+    return html
 
 
 if __name__ == '__main__':